@@ -0,0 +1,191 @@
+#################################################
+#                   Run: 3D                     #
+#    players for games without a human, batch   #
+#################################################
+
+# imports
+import random
+import importlib
+import numpy as np
+import world as simulation
+from world import Bound, Cube_size, Probe_low, Probe_high
+
+# globals
+Reach = 0.05                # largest distance an agent moves in x and in y in a tick
+Steps = 15                  # positions on each axis an agent plans with
+Horizon = 60                # ticks ahead the search agent looks
+Greedy_horizon = 8          # ticks ahead the greedy agent looks, about one obstacle
+Margin = 0.02               # added around cubes when planning, for the steps between planned positions
+Hold = 40                   # ticks the wandering agent keeps a target
+
+
+def toward(position, target, reach):
+    """Distance to move on one axis to get closer to a target.
+    :param position: current position.
+    :param target: the target.
+    :param reach: largest distance to move.
+    :return: distance to move."""
+
+    return min(max(target - position, -reach), reach)
+
+
+class Still:
+    """Never moves. The obstacles it survives are the ones with a hole in the middle."""
+
+    def __init__(self, world, seed):
+        pass
+
+    def act(self, world):
+        """Input of a tick.
+        :param world: the game.
+        :return: dx, dy."""
+
+        return 0.0, 0.0
+
+
+class Wander:
+    """Moves to random targets, without looking at the obstacles. A baseline for how much dodging helps."""
+
+    def __init__(self, world, seed, reach=Reach):
+        self.random = random.Random(seed)
+        self.reach = reach
+        self.target = (0.0, 0.0)
+        # ticks left until the next target
+        self.left = 0
+
+    def act(self, world):
+        """Input of a tick.
+        :param world: the game.
+        :return: dx, dy."""
+
+        if not self.left:
+            self.target = (self.random.uniform(-Bound, Bound), self.random.uniform(-Bound, Bound))
+            self.left = Hold
+        self.left -= 1
+        return toward(world.x, self.target[0], self.reach), toward(world.y, self.target[1], self.reach)
+
+
+class Search:
+    """Plans a way through the obstacles ahead on a grid of positions. The bounds of the cubes are predicted
+    for every tick up to the horizon, from their velocity, the same way World.place moves them. Ticks in which
+    the player is within some cube in z are layers; a position of a layer is free if no probe of the player there
+    is in a cube. The agent finds the last layer it can reach through free positions moving at most reach a tick,
+    then moves towards the nearest position of the first layer on a way to it."""
+
+    def __init__(self, world, seed, horizon=Horizon, reach=Reach, steps=Steps):
+        self.horizon, self.reach = horizon, reach
+        # positions on each axis, the player is kept in the same bounds
+        self.grid = np.linspace(-Bound, Bound, steps)
+        # probes in x or y of each position, shape (steps, 2), the collision test takes all pairs of them
+        self.probes = -self.grid[:, None] + (Probe_low, Probe_high)
+        # ticks ahead, from 1 for the next tick
+        self.ahead = np.arange(1, horizon + 1)
+        # increase of speed until each tick ahead, summed: the distance moved up to it is speed * ahead + this.
+        # Read when the agent is made, a batch may change the acceleration
+        self.gained = simulation.Acceleration * np.cumsum(self.ahead)
+        # positions reachable from each position in n ticks, for n up to the horizon, as matrices to dilate with
+        distance = abs(self.grid[:, None] - self.grid[None, :])
+        self.bands = [(distance <= n * reach + 1e-9).astype(float) for n in range(horizon + 1)]
+
+    def layers(self, world):
+        """Free positions in each tick ahead in which the player is within some cube in z, anywhere on its way from
+        the tick before in a swept world.
+        :param world: the game.
+        :return: list of (ticks ahead, boolean array of free positions of shape (steps, steps))."""
+
+        rows = np.flatnonzero(world.live)
+        if not len(rows):
+            return []
+        base, velocity = world.base[rows], world.velocity[rows]
+        # z of the player in the collision test of each tick ahead, and of this tick first
+        depth = world.gap_z - world.z - world.speed * self.ahead - self.gained
+        depth = np.concatenate(((world.gap_z - world.z,), depth))
+        # ticks each cube has moved at those tests, collide uses the bounds of the previous tick
+        moved = np.maximum(world.ticks + self.ahead[None, :] - 1 - world.start_move[rows, :1], 0)
+        moved = np.concatenate((np.maximum(world.ticks - 1 - world.start_move[rows, :1], 0), moved), 1)
+        third = Cube_size / 3.0
+        z1 = base[:, 4:5] + velocity[:, 4:5] * moved
+        z2 = base[:, 5:6] + velocity[:, 5:6] * moved
+        if world.swept:
+            # within a cube on the way from the tick before, the way in the frame of a cube only goes towards it
+            relevant = (z1[:, :-1] + third <= depth[:-1]) & (depth[1:] <= z2[:, 1:] - third)
+        else:
+            relevant = (z1[:, 1:] + third <= depth[1:]) & (depth[1:] <= z2[:, 1:] - third)
+        moved = moved[:, 1:]
+        layers = []
+        for k in np.flatnonzero(relevant.any(0)).tolist():
+            cubes = relevant[:, k]
+            bounds = base[cubes, :4] + velocity[cubes, :4] * moved[cubes, k:k + 1]
+            # a position is hit in x if any of its two probes is within the cube, the same in y
+            x1, x2 = bounds[:, 0] - Margin, bounds[:, 1] + Margin
+            y1, y2 = bounds[:, 2] - Margin, bounds[:, 3] + Margin
+            probes = self.probes[:, :, None]
+            x = ((x1 <= probes) & (probes <= x2)).any(1)
+            y = ((y1 <= probes) & (probes <= y2)).any(1)
+            layers.append((k + 1, ~(x[:, None, :] & y[None, :, :]).any(2)))
+        return layers
+
+    def dilate(self, free, ticks):
+        """Positions reachable from a set of positions.
+        :param free: boolean array of positions of shape (steps, steps).
+        :param ticks: ticks to move.
+        :return: boolean array of the positions reachable."""
+
+        band = self.bands[min(ticks, self.horizon)]
+        return np.dot(np.dot(band, free), band) > 0
+
+    def act(self, world):
+        """Input of a tick.
+        :param world: the game.
+        :return: dx, dy."""
+
+        layers = self.layers(world)
+        if not layers:
+            return 0.0, 0.0
+        # positions reachable in each layer from the current position through free positions
+        first, free = layers[0]
+        near = first * self.reach + 1e-9
+        reached = [(abs(self.grid - world.x) <= near)[:, None] & (abs(self.grid - world.y) <= near)[None, :] & free]
+        for (previous, _), (ticks, free) in zip(layers, layers[1:]):
+            if not reached[-1].any():
+                break
+            reached.append(self.dilate(reached[-1], ticks - previous) & free)
+        while len(reached) > 1 and not reached[-1].any():
+            reached.pop()
+        if not reached[0].any():
+            # nowhere to go
+            return 0.0, 0.0
+        # back from the last layer reached, keep the positions on a way to it
+        way = reached[-1]
+        for i in range(len(reached) - 2, -1, -1):
+            way = reached[i] & self.dilate(way, layers[i + 1][0] - layers[i][0])
+        # nearest position of the first layer on the way
+        x, y = np.nonzero(way)
+        x, y = self.grid[x], self.grid[y]
+        i = np.argmin(np.maximum(abs(x - world.x), abs(y - world.y)))
+        return toward(world.x, x[i], self.reach), toward(world.y, y[i], self.reach)
+
+
+class Greedy(Search):
+    """Dodges only the nearest obstacle, the search agent with a short horizon."""
+
+    def __init__(self, world, seed, reach=Reach, steps=Steps):
+        Search.__init__(self, world, seed, Greedy_horizon, reach, steps)
+
+
+# agents by name
+Agents = {"still": Still, "wander": Wander, "greedy": Greedy, "search": Search}
+
+
+def load(name):
+    """Find an agent class by name. Any class with the same methods can be used as "module:Class".
+    An agent is made for every game with the world and a seed, and act gives the input of each tick.
+    :param name: name of one of Agents, or module and class.
+    :return: the class."""
+
+    if name in Agents:
+        return Agents[name]
+    if ":" not in name:
+        raise ValueError("unknown agent %s, not one of %s or module:Class" % (name, ", ".join(sorted(Agents))))
+    module, attribute = name.split(":", 1)
+    return getattr(importlib.import_module(module), attribute)
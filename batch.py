@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+#################################################
+#                   Run: 3D                     #
+#      many seeded games played by agents       #
+#################################################
+
+# imports
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+import numpy as np
+import world
+import agents
+
+# globals
+Chunk = 8                   # games a worker plays before it sends the results back
+Max_ticks = 20000           # ticks after which a game is stopped if nothing was hit
+Near_miss = 0.05            # clearance below which a passed obstacle is a near miss
+Columns = ("seed", "score", "ticks", "hit", "spawned", "moving", "passed", "near_misses", "killer")
+Types = dict(seed=np.uint32, score=np.int32, ticks=np.int32, hit=bool, spawned=np.int32, moving=np.int32,
+             passed=np.int32, near_misses=np.int32, killer=np.int16)   # type of each column
+Worker = None               # state of a worker process, set up by setup
+
+
+class Tally:
+    """Counts the obstacles of a game: which patterns were spawned, which moved, which were passed and how close.
+    Obstacles are told apart by their block of rows, which an obstacle keeps while it is reused."""
+
+    def __init__(self, game):
+        self.game = game
+        # index of each pattern in the library
+        self.index = dict((pattern, i) for i, pattern in enumerate(game.patterns.patterns))
+        # spawns of each pattern
+        self.mix = np.zeros(len(self.index), np.int32)
+        # pattern of the obstacle each block was last given to, -1 for none
+        self.owners = np.full(len(game.blocks), -1, np.int16)
+        # nearest the player came to the obstacle of each block in the collision test, in x or y
+        self.closest = np.full(len(game.blocks), np.inf)
+        self.spawned = self.moving = self.passed = self.near_misses = 0
+        self.killer = -1
+
+    def finish(self, block):
+        """Count the obstacle of a block as passed.
+        :param block: number of the block.
+        :return: nothing."""
+
+        self.passed += 1
+        if self.closest[block] < Near_miss:
+            self.near_misses += 1
+        self.owners[block] = -1
+
+    def spawn(self, obstacle):
+        """Count a new obstacle. Its block was freed when the obstacle before it in the block was passed.
+        :param obstacle: the obstacle.
+        :return: nothing."""
+
+        block = obstacle.block.first // self.game.cubes
+        if block >= len(self.owners):
+            # the world made more blocks
+            grow = len(self.game.blocks) - len(self.owners)
+            self.owners = np.concatenate((self.owners, np.full(grow, -1, np.int16)))
+            self.closest = np.concatenate((self.closest, np.full(grow, np.inf)))
+        elif self.owners[block] >= 0:
+            self.finish(block)
+        self.owners[block] = pattern = self.index[obstacle.pattern]
+        self.closest[block] = np.inf
+        self.mix[pattern] += 1
+        self.spawned += 1
+        self.moving += bool(obstacle.block.velocity.any())
+
+    def tick(self, hit):
+        """Measure how close the player came to the cubes of the collision test of the last tick.
+        :param hit: True if the tick hit an obstacle.
+        :return: nothing."""
+
+        game = self.game
+        if hit:
+            self.killer = self.owners[np.flatnonzero(game.hit)[0] // game.cubes]
+            return
+        # cubes the player was within in z, from the buffer of the collision test
+        rows = np.flatnonzero(game.near[:len(self.owners) * game.cubes])
+        if not len(rows):
+            return
+        # distance from the probes of the player to the bounds of each cube, in x and in y, 0 within them
+        boxes = game.boxes[rows]
+        x = np.array((-game.x + world.Probe_low, -game.x + world.Probe_high))[:, None]
+        y = np.array((-game.y + world.Probe_low, -game.y + world.Probe_high))[:, None]
+        dx = np.maximum(np.maximum(boxes[:, 0] - x, x - boxes[:, 1]), 0).min(0)
+        dy = np.maximum(np.maximum(boxes[:, 2] - y, y - boxes[:, 3]), 0).min(0)
+        # a cube is hit when some probe is within it in x and some in y
+        np.minimum.at(self.closest, rows // game.cubes, np.maximum(dx, dy))
+
+    def end(self):
+        """Count the obstacles passed since they were last reused.
+        :return: nothing."""
+
+        ahead = set(obstacle.block.first // self.game.cubes for obstacle in self.game.obstacles)
+        for block in np.flatnonzero(self.owners >= 0).tolist():
+            if block not in ahead:
+                self.finish(block)
+
+
+def setup(settings):
+    """Set up a worker process: change the rules of the game to the ones of the batch, and make its world.
+    :param settings: dictionary of speed, acceleration, gap_low, gap_high, density, agent and max_ticks.
+    :return: nothing."""
+
+    global Worker
+    world.Speed, world.Acceleration = settings["speed"], settings["acceleration"]
+    world.Gap_low, world.Gap_high = settings["gap_low"], settings["gap_high"]
+    Worker = dict(settings, game=world.World(density=settings["density"]), agent=agents.load(settings["agent"]))
+
+
+def play(seed):
+    """Play a game to the end, or to the most ticks of the batch.
+    :param seed: seed of the game.
+    :return: tuple of the values of Columns, and the spawns of each pattern."""
+
+    game, limit = Worker["game"], Worker["max_ticks"]
+    game.reset(seed)
+    agent = Worker["agent"](game, seed)
+    tally = Tally(game)
+    newest = hit = None
+    while game.ticks < limit and not hit:
+        dx, dy = agent.act(game)
+        hit = game.tick(dx, dy)
+        # a new obstacle is added at the end. Obstacles are reused, and their z moves with the origin
+        if game.obstacles and (game.obstacles[-1], game.obstacles[-1].tick) != newest:
+            newest = (game.obstacles[-1], game.obstacles[-1].tick)
+            tally.spawn(newest[0])
+        tally.tick(hit)
+    tally.end()
+    return (seed, game.score, game.ticks, bool(hit), tally.spawned, tally.moving, tally.passed, tally.near_misses,
+            tally.killer), tally.mix
+
+
+def play_chunk(chunk):
+    """Play the games of a chunk, in a worker.
+    :param chunk: index of the first game and the seeds of the games.
+    :return: index of the first game, the columns of the games and the spawns of each pattern in each game."""
+
+    first, seeds = chunk
+    results = [play(seed) for seed in seeds]
+    columns = dict((name, np.array([r[0][i] for r in results], Types[name])) for i, name in enumerate(Columns))
+    return first, columns, np.array([r[1] for r in results])
+
+
+def run(args):
+    """Play the games of the batch on a pool of processes and merge the results into one file of columns.
+    :param args: parsed command line arguments.
+    :return: exit status."""
+
+    settings = dict(speed=args.speed, acceleration=args.acceleration, gap_low=args.gap[0], gap_high=args.gap[1],
+                    density=args.density, agent=args.agent, max_ticks=args.max_ticks)
+    # fail here rather than in every worker
+    agents.load(args.agent)
+    seeds = [(args.seed + i) & 0xFFFFFFFF for i in range(args.games)]
+    chunks = [(i, seeds[i:i + args.chunk]) for i in range(0, args.games, args.chunk)]
+    columns = dict((name, np.zeros(args.games, Types[name])) for name in Columns)
+    patterns = world.Patterns.patterns
+    mix = np.zeros((args.games, len(patterns)), np.int32)
+    workers = args.workers or os.cpu_count() or 1
+    t = time.time()
+    if workers == 1:
+        # in this process, for profiling
+        setup(settings)
+        results = map(play_chunk, chunks)
+    else:
+        pool = multiprocessing.Pool(workers, setup, (settings,))
+        results = pool.imap_unordered(play_chunk, chunks)
+    done = 0
+    for first, chunk, spawns in results:
+        count = len(spawns)
+        for name in Columns:
+            columns[name][first:first + count] = chunk[name]
+        mix[first:first + count] = spawns
+        done += count
+        if args.progress:
+            sys.stderr.write("\r%d/%d games" % (done, args.games))
+    if workers > 1:
+        pool.close()
+        pool.join()
+    t = time.time() - t
+    if args.progress:
+        sys.stderr.write("\n")
+    np.savez(args.out, mix=mix, patterns=np.array([pattern.name for pattern in patterns]),
+             **dict(columns, **dict((name, np.array(value)) for name, value in settings.items())))
+    summary(columns, mix, patterns, t, workers)
+    print("written to %s" % args.out)
+    return 0
+
+
+def summary(columns, mix, patterns, t, workers):
+    """Print statistics of a batch.
+    :param columns: the columns of the games.
+    :param mix: spawns of each pattern in each game.
+    :param patterns: the patterns of the library.
+    :param t: seconds the batch took.
+    :param workers: number of processes.
+    :return: nothing."""
+
+    games, ticks = len(columns["score"]), columns["ticks"].sum()
+    print("%d games, %d ticks in %.1f s on %d processes: %.1f games, %.0f ticks per second" %
+          (games, ticks, t, workers, games / t, ticks / t))
+    print("score: mean %.1f, median %.0f, 10th percentile %.0f, 90th percentile %.0f, max %d" %
+          (columns["score"].mean(), np.median(columns["score"]), np.percentile(columns["score"], 10),
+           np.percentile(columns["score"], 90), columns["score"].max()))
+    passed = max(columns["passed"].sum(), 1)
+    print("%.1f%% of games hit an obstacle, %.1f%% of obstacles moved, %.2f%% of passed obstacles were near misses" %
+          (100.0 * columns["hit"].mean(), 100.0 * columns["moving"].sum() / max(columns["spawned"].sum(), 1),
+           100.0 * columns["near_misses"].sum() / passed))
+    spawns, killed = mix.sum(0), np.bincount(columns["killer"][columns["hit"]], minlength=len(patterns))
+    print("pattern             spawned   share  hits  hits per 1000 spawned")
+    for pattern, n, k in zip(patterns, spawns.tolist(), killed.tolist()):
+        print("%-18s %8d  %5.1f%%  %4d  %6.1f" % (pattern.name, n, 100.0 * n / max(spawns.sum(), 1), k,
+                                                   1000.0 * k / max(n, 1)))
+
+
+def parse(argv):
+    """Parse command line arguments.
+    :param argv: list of arguments.
+    :return: parsed arguments."""
+
+    parser = argparse.ArgumentParser(description="Play many seeded games of Run: 3D with an agent, on all cores")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1, help="seed of the first game, the next games count up")
+    parser.add_argument("--agent", default="search",
+                        help="one of %s, or module:Class of an agent of your own" % ", ".join(sorted(agents.Agents)))
+    parser.add_argument("--workers", type=int, default=0, help="processes to play on, all cores by default")
+    parser.add_argument("--chunk", type=int, default=Chunk, help="games a worker plays at a time")
+    parser.add_argument("--max-ticks", type=int, default=Max_ticks, help="ticks after which a game is stopped")
+    parser.add_argument("--density", type=float, default=1, help="obstacles in a distance, relative to the normal game")
+    parser.add_argument("--speed", type=float, default=world.Speed, help="speed at the start of a game")
+    parser.add_argument("--acceleration", type=float, default=world.Acceleration, help="increase in speed every tick")
+    parser.add_argument("--gap", type=int, nargs=2, default=(world.Gap_low, world.Gap_high), metavar=("LOW", "HIGH"),
+                        help="range of the time between obstacles, in distances moved in a tick")
+    parser.add_argument("--out", default="batch.npz", help="file to write the columns of all games to")
+    parser.add_argument("--progress", action="store_true", help="show the games done")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(run(parse(sys.argv[1:])))
@@ -0,0 +1,1200 @@
+#!/usr/bin/env python
+#################################################
+#                   Run: 3D                     #
+#                  benchmarks                   #
+#################################################
+
+# imports
+import os
+import sys
+import time
+import json
+import gc
+import types
+import tracemalloc
+import itertools
+import platform
+import argparse
+import numpy as np
+
+# globals
+Timer = getattr(time, "perf_counter", time.time)    # most precise clock there is
+Baseline = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")  # stored results
+Densities = [1, 4, 16]      # obstacles in a distance, relative to the normal game
+Speeds = [0.1, 0.25, 0.4]   # speed at the start, after 3000 ticks and after 6000 ticks
+Tolerances = {"lookahead": 0.5}     # slow down allowed for benchmarks that vary more between runs, by name
+Spare_floats = 100          # freed floats the interpreter keeps to make new ones from, at most
+
+
+def open_window(size, offscreen=False):
+    """Open a small OpenGL window and set up the game state for drawing into it.
+    Software rendering is requested from Mesa unless LIBGL_ALWAYS_SOFTWARE is already set.
+    :param size: size of the window.
+    :param offscreen: True to draw into a buffer of Mesa without a display instead, see open_egl.
+    :return: the main module."""
+
+    os.environ.setdefault("LIBGL_ALWAYS_SOFTWARE", "1")
+    if offscreen:
+        open_egl(size)
+        import main
+    else:
+        import pygame as pg
+        import main
+        pg.display.init()
+        pg.display.set_mode(size, pg.OPENGL | pg.DOUBLEBUF)
+    main.Size = size
+    # drawn to the window, the pixels of the paths are compared. Shaders are a path of their own
+    main.Scale = 1
+    main.Shaded = False
+    main.init_gl()
+    return main
+
+
+def run_frames(main, retained, instanced, frames, seed, density=1, shading=None):
+    """Play a fixed number of frames with a fixed input and the given drawing path.
+    :param main: the main module, set up by open_window.
+    :param retained: True to draw from vertex buffers, False to draw in immediate mode.
+    :param instanced: True to draw obstacles with hardware instancing.
+    :param frames: number of frames to play.
+    :param seed: seed for the world.
+    :param density: obstacles in a distance, relative to the normal game.
+    :param shading: shaders to draw boundary and obstacles with, None for the glow texture.
+    :return: frame times in milliseconds and the pixels of the last frame."""
+
+    from OpenGL.GL import glFinish, glReadPixels, GL_RGB, GL_UNSIGNED_BYTE
+    from world import World
+    main.Retained, main.Instanced, main.Shading = retained, instanced, shading
+    # same start for all paths
+    main.Game = World(seed, density=density)
+    main.set_defaults()
+    times = []
+    for i in range(frames):
+        t = time.time()
+        # same steps as play, with a slow steady drift instead of the mouse
+        dx = dy = 0.002 if (i // 100) % 2 else -0.002
+        main.Game.tick(dx, dy)
+        main.clear()
+        main.draw_boundaries()
+        main.draw_obstacles()
+        # wait for the frame to be drawn, swapping would sync to the display
+        glFinish()
+        times.append((time.time() - t) * 1000)
+    pixels = glReadPixels(0, 0, main.Size[0], main.Size[1], GL_RGB, GL_UNSIGNED_BYTE)
+    return np.array(times), np.frombuffer(pixels, np.uint8)
+
+
+def render(args):
+    """Compare frame times of immediate mode, vertex buffer, instanced and shaded drawing, and check all draw the same
+    image. Shaders make the glow for each pixel instead of sampling the texture, they may differ by more.
+    :param args: parsed command line arguments.
+    :return: exit status."""
+
+    main = open_window((args.width, args.height), args.offscreen)
+    from OpenGL.GL import glGetString, GL_RENDERER
+    print("Renderer: %s" % glGetString(GL_RENDERER).decode())
+    main.Split = args.split
+    paths = [("immediate", False, False, None), ("retained", True, False, None)]
+    if main.Obstacle_instances:
+        paths.append(("instanced", True, True, None))
+    else:
+        print("Instancing is not supported")
+    shading = main.render.Shading()
+    if shading.supported:
+        # the boundary and obstacles from vertex buffers with the shaders
+        paths.append(("shaded", True, False, shading))
+    else:
+        print("Shaders are not supported")
+    results = {}
+    for name, retained, instanced, shaded in paths:
+        # one untimed run to warm up caches and the driver
+        run_frames(main, retained, instanced, 50, args.seed, args.density, shaded)
+        results[name] = run_frames(main, retained, instanced, args.frames, args.seed, args.density, shaded)
+        times = results[name][0]
+        print("%-10s mean %7.3f ms  median %7.3f ms  p95 %7.3f ms  speed up %5.2fx" %
+              (name, times.mean(), np.median(times), np.percentile(times, 95),
+               np.median(results["immediate"][0]) / np.median(times)))
+    # all paths must produce the same image
+    status = 0
+    for name, retained, instanced, shaded in paths[1:]:
+        difference = np.abs(results["immediate"][1].astype(int) - results[name][1].astype(int))
+        print("Image difference of %s: max %d, pixels differing %d" %
+              (name, difference.max(), np.count_nonzero(difference)))
+        if difference.max() > (args.shaded_tolerance if shaded else args.tolerance):
+            status = 1
+    shading.release()
+    return status
+
+
+def headless(args):
+    """Play games without a display and count ticks per second.
+    :param args: parsed command line arguments.
+    :return: exit status."""
+
+    from world import World
+    game = World(args.seed)
+    ticks = games = 0
+    t = time.time()
+    while ticks < args.ticks:
+        # drift from corner to corner so that some obstacles are dodged
+        dx = dy = 0.01 if (game.ticks // 50) % 2 else -0.01
+        if game.tick(dx, dy):
+            print("Game %d: score %d, hit at tick %d" % (games, game.score, game.collision_tick))
+            ticks += game.ticks
+            games += 1
+            game.reset(args.seed + games)
+    t = time.time() - t
+    print("%d ticks in %.2f s, %.0f ticks per second" % (ticks, t, ticks / t))
+    return 0
+
+
+def allocations(args):
+    """Play a long game and check that ticks after warm up allocate nothing.
+    :param args: parsed command line arguments.
+    :return: exit status, 1 if any tick allocates more than a tick that only counts itself, or memory leaks."""
+
+    from world import World, Segment, Segments
+    game = World(args.seed, density=args.density)
+
+    def tick():
+        # drift from corner to corner. Collisions are ignored, so that the game goes on and gets faster
+        dx = dy = 0.01 if (game.ticks // 50) % 2 else -0.01
+        game.tick(dx, dy)
+    # the thread making obstacles allocates, and is traced too. Let it make all the ticks of the game, then rest:
+    # with no space for segments, taking one does not wake it. The first segments are short, the extra ones cover them
+    tick()
+    lookahead = game.lookahead
+    lookahead.resize((args.warmup + args.ticks) // Segment + 4)
+    while len(lookahead.queue) < lookahead.segments:
+        time.sleep(0.01)
+    lookahead.resize(0)
+    time.sleep(0.05)
+    for i in range(args.warmup - Segment):
+        tick()
+    # the least a tick does: count itself with an integer above 256, which is a new object in Python each time. The
+    # same measure of it is the floor of the ticks of the game
+    counter = types.SimpleNamespace(ticks=game.ticks)
+
+    def count():
+        counter.ticks += 1
+    # count collections by the garbage collector
+    collections = []
+    gc.callbacks.append(lambda phase, info: phase == "start" and collections.append(info["generation"]))
+    # bytes of each, the halves of the game and the end of the warm up, made before tracing
+    floor, sizes = np.zeros((2, args.ticks), int)
+    first, second = sizes[:args.ticks // 2], sizes[args.ticks // 2:]
+    warm = np.zeros(Segment, int)
+    tracemalloc.start()
+    # the first calls after tracing starts allocate once, in the interpreter and numpy. The last segment of the warm
+    # up is traced and not counted
+    traced(count, warm)
+    traced(tick, warm)
+    traced(count, floor)
+    traced(tick, first)
+    # memory grows in the first half as counters pass 256 and are traced for the first time. In the second half the
+    # blocks kept are counted by the line that made them: a counter made before and replaced in it is one block, a
+    # leak keeps more. The blocks of the check and of tracemalloc are not counted
+    own = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+    # the first filter fills caches of its own, after the snapshot
+    tracemalloc.take_snapshot().filter_traces(own)
+    start = tracemalloc.take_snapshot().filter_traces(own)
+    traced(tick, second)
+    kept = tracemalloc.take_snapshot().filter_traces(own).compare_to(start, "lineno")
+    tracemalloc.stop()
+    growth = sum(stat.size_diff for stat in kept)
+    most = max(kept, key=lambda stat: stat.count_diff)
+    gc.callbacks.pop()
+    lookahead.resize(Segments)
+    over = np.count_nonzero(sizes > floor.max())
+    print("%d ticks after %d to warm up, %d obstacles, speed %.3f" %
+          (args.ticks, args.warmup, len(game.obstacles), game.speed))
+    print("bytes allocated by a tick that only counts itself: median %d, max %d" % (np.median(floor), floor.max()))
+    print("bytes allocated in a tick: median %d, max %d, %d ticks over the floor" %
+          (np.median(sizes), sizes.max(), over))
+    print("memory grew by %d bytes in the second half, at most %d blocks kept by %s" %
+          (growth, most.count_diff, most.traceback))
+    print("%d garbage collections" % len(collections))
+    return 1 if over or np.median(sizes) > np.median(floor) or most.count_diff > 1 or collections else 0
+
+
+def traced(function, sizes):
+    """Call a function and measure the bytes it allocates, at the peak of each call. tracemalloc must be tracing.
+    :param function: function without arguments.
+    :param sizes: buffer for the bytes of each call, as many calls as it has.
+    :return: nothing."""
+
+    for i in range(len(sizes)):
+        # floats are made from freed ones kept by the interpreter, and from memory when there are none left. Between
+        # calls only a few are left, and a call that needs one more at a time takes it from memory and frees it at
+        # the end. Keep as many as there can be, outside the measure. A float that is kept by the call is still
+        # counted, as a block kept
+        spare = [j + 0.5 for j in range(Spare_floats)]
+        del spare
+        # the memory before the call is kept in the buffer, not in a new integer that would be traced in the call
+        sizes[i] = -tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        function()
+        sizes[i] += tracemalloc.get_traced_memory()[1]
+
+
+def timed(function, repeat):
+    """Time a function.
+    :param function: function without arguments.
+    :param repeat: number of calls.
+    :return: mean time of a call in microseconds."""
+
+    t = Timer()
+    for i in range(repeat):
+        function()
+    return (Timer() - t) * 1e6 / repeat
+
+
+def collision(args):
+    """Time collision tests of one frame as the number of obstacles grows.
+    :param args: parsed command line arguments.
+    :return: exit status."""
+
+    from world import World, Obstacle, Spawn, collide_cube
+    print("%10s %8s %16s %16s %16s" % ("obstacles", "cubes", "per cube (us)", "vectorized (us)", "swept (us)"))
+    for n in args.obstacles:
+        # the point test, to compare with collide_cube
+        game = World(args.seed, swept=False)
+        # obstacles every 0.5 units ahead, the player is near the first of them
+        game.ring_z = -2.0
+        for i in range(n):
+            obstacle = Obstacle(game)
+            obstacle.reset(game, Spawn(game.ticks, game.patterns, game.random))
+            game.obstacles.append(obstacle)
+            game.ring_z -= 0.5
+        game.z = 1.0
+        cubes = game.cube_faces()
+        # both must agree before they are compared
+        assert game.collide() == any(collide_cube(cube, game) for cube in cubes)
+        repeat = max(10, args.repeat // n)
+        old = timed(lambda: any(collide_cube(cube, game) for cube in cubes), repeat)
+        new = timed(game.collide, args.repeat)
+        # the way from the start to the player, through the first obstacle
+        game.swept = True
+        swept = timed(game.collide, args.repeat)
+        print("%10d %8d %16.1f %16.1f %16.1f" % (n, len(cubes), old, new, swept))
+    return 0
+
+
+def tunnel(args):
+    """Time moving through the tunnel for tunnels of different length.
+    :param args: parsed command line arguments.
+    :return: exit status."""
+
+    from world import World
+    print("%10s %16s" % ("rings", "per tick (us)"))
+    for rings in args.rings:
+        game = World(args.seed, rings)
+
+        def move():
+            # the part of a tick that moves through the tunnel
+            game.z += game.speed
+            game.update_boundaries()
+        print("%10d %16.2f" % (rings, timed(move, args.repeat)))
+    return 0
+
+
+def pygame_textures(size):
+    """The textures as they were generated before, with pygame drawing, for comparison.
+    :param size: width and height in pixels.
+    :return: nothing."""
+
+    import pygame as pg
+    size = (size, size)
+    t = pg.Surface(size)
+    t.fill((255, 255, 255))
+    m = pg.Surface(size, pg.SRCALPHA)
+    for i in range(9, 31):
+        m.fill((0, 0, 0, 0))
+        pg.draw.rect(m, (0, 0, 0, 30 + i // 2), (i * size[0] / 100.0, i * size[1] / 100.0,
+                                                 size[0] - size[0] / 50.0 * i, size[1] - size[1] / 50.0 * i), 0)
+        t.blit(m, (0, 0))
+    pg.image.tostring(t, "RGBA", True)
+    t = pg.Surface(size, pg.SRCALPHA)
+    t.fill((0, 0, 0, 0))
+    pg.draw.circle(t, (200, 200, 200, 200), (size[0] // 2, size[1] // 2), size[0] * 2 // 5, size[0] // 10)
+    pg.draw.polygon(t, (200, 200, 200, 200), [(x * size[0] // 100, y * size[1] // 100)
+                                              for x, y in ((70, 50), (40, 70), (40, 30))], 0)
+    pg.image.tostring(t, "RGBA", True)
+
+
+def texture_times(args):
+    """Time generating the textures, with pygame as before, with NumPy, and loading them from the cache.
+    Uploading is not included.
+    :param args: parsed command line arguments.
+    :return: exit status."""
+
+    import shutil
+    import tempfile
+    import textures
+    # a cache of its own, so that the first load always generates
+    textures.Cache = tempfile.mkdtemp()
+    print("%6s %14s %18s %14s" % ("size", "pygame (ms)", "generate (ms)", "cached (ms)"))
+    try:
+        for size in args.sizes:
+            old = timed(lambda: pygame_textures(size), 3) / 1000
+            t = time.time()
+            for name in textures.Generators:
+                textures.levels(name, size)
+            new = (time.time() - t) * 1000
+            cached = timed(lambda: [textures.levels(name, size)[0].sum() for name in textures.Generators], 3) / 1000
+            print("%6d %14.2f %18.2f %14.2f" % (size, old, new, cached))
+    finally:
+        shutil.rmtree(textures.Cache)
+    return 0
+
+
+def null_gl(modules):
+    """Replace all OpenGL functions with a function that does nothing, to time everything but the driver.
+    :param modules: modules that imported OpenGL functions by name.
+    :return: nothing."""
+
+    import OpenGL.GL
+    import OpenGL.GLU
+
+    def null(*args):
+        pass
+    for module in [OpenGL.GL, OpenGL.GLU] + list(modules):
+        for name in dir(module):
+            if name.startswith("gl") and callable(getattr(module, name)):
+                setattr(module, name, null)
+
+
+def open_null(size):
+    """Set up the game state for drawing with OpenGL functions that do nothing. Needs no display.
+    :param size: size of the screen it would draw to.
+    :return: the main module."""
+
+    import main
+    import render
+    import text
+    null_gl([main, render, text])
+    # there are no shaders to instance or shade with, and no framebuffers to scale
+    main.Instanced = False
+    main.Shaded = False
+    main.Scale = 1
+    main.Size = size
+    main.init_gl()
+    return main
+
+
+class StrictQueries:
+    """Timer queries and framebuffers for the null OpenGL functions, that fail the way a driver does when a query
+    that is running is started again or one that is not running is ended."""
+
+    def __init__(self):
+        # the query that is running, None for none
+        self.running = None
+        self.begun = 0
+
+    def install(self, module):
+        """Put the functions in place of the null ones.
+        :param module: module that imported OpenGL functions by name.
+        :return: nothing."""
+
+        from OpenGL.GL import GL_FRAMEBUFFER_COMPLETE
+        module.glGenQueries = lambda n: list(range(1, n + 1))
+        module.glBeginQuery = self.begin
+        module.glEndQuery = self.end
+        module.glGetQueryObjectuiv = lambda query, name: 1
+        module.glGetQueryObjectui64v = lambda query, name: 2000000
+        module.glGenFramebuffers = lambda n: 1
+        module.glGenRenderbuffers = lambda n: [1, 2]
+        module.glCheckFramebufferStatus = lambda target: GL_FRAMEBUFFER_COMPLETE
+
+    def begin(self, target, query):
+        from OpenGL.error import GLError
+        from OpenGL.GL import GL_INVALID_OPERATION
+        if self.running is not None:
+            raise GLError(GL_INVALID_OPERATION, description=b"query %d is running" % self.running)
+        self.running = query
+        self.begun += 1
+
+    def end(self, target):
+        from OpenGL.error import GLError
+        from OpenGL.GL import GL_INVALID_OPERATION
+        if self.running is None:
+            raise GLError(GL_INVALID_OPERATION, description=b"no query is running")
+        self.running = None
+
+
+def game_over(args):
+    """Play a game to its end and through the game over screen, drawing with the resolution scaled to the frame
+    time by the GPU timer like the default game does. OpenGL functions do nothing, except timer queries that fail
+    like a driver when they are misused. pygame draws to its dummy video driver, so no display is needed.
+    :param args: parsed command line arguments.
+    :return: exit status, 1 if a frame fails or the game does not end."""
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame as pg
+    from timestep import Stepper
+    from world import World
+    size = (320, 240)
+    pg.display.init()
+    pg.display.set_mode(size)
+    main = open_null(size)
+    import render
+    queries = StrictQueries()
+    queries.install(render)
+    # the scale follows the time of frames, measured on the GPU
+    main.Scale = None
+    main.Framebuffer = render.Framebuffer(size)
+    main.Gpu_timer = render.GpuTimer()
+    main.Late_input = False
+    main.Game_over_time = args.seconds
+    main.Steps = Stepper(main.Tick_rate * args.speedup)
+    main.Game = World(args.seed)
+    frames = 0
+    state = 1
+    while state == 1 and frames < args.frames:
+        state = main.play()
+        frames += 1
+    print("%d frames, hit at tick %s, %d timer queries, game over returned %d" % (
+        frames, main.Game.collision_tick, queries.begun, state))
+    return 0 if main.Game.collision_tick is not None and queries.running is None and queries.begun else 1
+
+
+def open_egl(size=(64, 64)):
+    """Make an OpenGL context with Mesa and no display, through its surfaceless EGL platform, to compile shaders with
+    the GLSL compiler of a driver or draw without a window. Nothing it draws is seen. OpenGL must not have been
+    imported yet.
+    :param size: width and height of the buffer drawn into.
+    :return: nothing. RuntimeError if there is no context."""
+
+    import ctypes
+    if "OpenGL" in sys.modules:
+        raise RuntimeError("OpenGL is imported already, its platform can not be chosen")
+    os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+    os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+    os.environ.setdefault("LIBGL_ALWAYS_SOFTWARE", "1")
+    from OpenGL import EGL
+    display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+    major, minor = EGL.EGLint(), EGL.EGLint()
+    if not EGL.eglInitialize(display, ctypes.pointer(major), ctypes.pointer(minor)):
+        raise RuntimeError("EGL can not be initialized")
+    attributes = (EGL.EGLint * 5)(EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT, EGL.EGL_RENDERABLE_TYPE,
+                                  EGL.EGL_OPENGL_BIT, EGL.EGL_NONE)
+    config, count = EGL.EGLConfig(), EGL.EGLint()
+    chosen = EGL.eglChooseConfig(display, attributes, ctypes.pointer(config), 1, ctypes.pointer(count))
+    if not chosen or not count.value:
+        raise RuntimeError("no EGL configuration for OpenGL")
+    # the compatibility profile, the game draws with the fixed pipeline too
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, None)
+    extent = (EGL.EGLint * 5)(EGL.EGL_WIDTH, size[0], EGL.EGL_HEIGHT, size[1], EGL.EGL_NONE)
+    surface = EGL.eglCreatePbufferSurface(display, config, extent)
+    if not EGL.eglMakeCurrent(display, surface, surface, context):
+        raise RuntimeError("the EGL context can not be made current")
+
+
+def shaders(args):
+    """Build the shader programs of render with the GLSL compiler of Mesa, without a display, and check that each has
+    the uniforms it is drawn with. Then build the game with a fragment shader that does not compile, and check that
+    it draws with the fixed pipeline and reports the info log of the compiler.
+    :param args: parsed command line arguments.
+    :return: exit status, 1 if a program is not built or lacks a uniform, or the fallback is wrong."""
+
+    try:
+        open_egl()
+    except Exception as error:
+        print("no OpenGL context without a display: %s" % error)
+        return 1
+    import io
+    import contextlib
+    from OpenGL.GL import glGetString, glGetUniformLocation, glIsShader, GL_RENDERER, GL_SHADING_LANGUAGE_VERSION
+    import render
+    from world import Cube, Cube_size
+    print("%s, GLSL %s" % (glGetString(GL_RENDERER).decode(), glGetString(GL_SHADING_LANGUAGE_VERSION).decode()))
+    failed = 0
+    mesh = Cube[..., :3] / Cube_size
+    palette = ("start", "end", "progress")
+    for name, built, uniforms in (("shading", render.Shading(), ("image", "fog") + palette),
+                                  ("instances", render.CubeInstances(mesh), ("image", "fog")),
+                                  ("shaded instances", render.CubeInstances(mesh, render.Shaded_fragment),
+                                   ("image", "fog") + palette)):
+        if not built.supported:
+            print("%-18s FAILED: %s" % (name, built.error))
+            failed += 1
+            continue
+        # a uniform the compiler found unused has no location, and setting it does nothing
+        missing = [uniform for uniform in uniforms if glGetUniformLocation(built.program, uniform) < 0]
+        print("%-18s built%s" % (name, ", no uniform " + ", ".join(missing) if missing else ""))
+        failed += bool(missing)
+    # a fragment shader with an error, in place of both that use the palette
+    import main
+    shaded = render.Shaded_fragment
+    render.Shaded_fragment = shaded.replace("uniform float progress;", "uniform float progress")
+    main.Size, main.Scale, main.Shaded, main.Instanced = (64, 64), 1, True, True
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        main.init_gl()
+    render.Shaded_fragment = shaded
+    report = output.getvalue()
+    print(report.rstrip())
+    fallback = main.Shading is None and "error" in report
+    print("fixed pipeline after a failed compile: %s" % ("yes, info log reported" if fallback else "NO"))
+
+    def alive():
+        # shader objects by their names, which drivers count up from 1
+        return sum(bool(glIsShader(name)) for name in range(1, 1024))
+    # the vertex shader is compiled before the fragment shader fails, and must be deleted with it
+    before = alive()
+    try:
+        render.program(render.Quad_vertex_shader, shaded.replace("uniform float progress;", "uniform float progress"))
+    except RuntimeError:
+        pass
+    leaked = alive() - before
+    print("shaders left by a failed program: %d" % leaked)
+    return 1 if failed or not fallback or leaked else 0
+
+
+def steady_world(density, speed, seed):
+    """A game that has been played long enough for the number of obstacles to settle, at a fixed speed.
+    :param density: obstacles in a distance, relative to the normal game.
+    :param speed: speed of the player.
+    :param seed: seed for the world.
+    :return: the world."""
+
+    from world import World, Rings, Ring_gap
+    game = World(seed, density=density)
+    game.speed = speed
+    # the first obstacles reach the player after moving through the whole tunnel
+    advance(game, int(2 * Rings * Ring_gap / speed) + 100)
+    return game
+
+
+def prefill(game, ticks):
+    """Make the obstacles of the next ticks of a game in this thread, the way the thread of the game makes them, and
+    leave that thread resting, so that its work is not timed with the parts of the game and waking it is not timed
+    with its work. The frame thread only takes what was made.
+    :param game: the world, playing.
+    :param ticks: number of ticks.
+    :return: microseconds it took to make a tick, the median over the segments: a slow spell of the machine in a few
+    of them does not count."""
+
+    from world import Segment
+    lookahead = game.lookahead
+    times = []
+    # no space for more: the thread ends the segment it is making, and taking a segment does not wake it
+    lookahead.resize(0)
+    while True:
+        with lookahead.condition:
+            # resting, it cannot leave its wait while the lock is held here
+            if lookahead.idle:
+                # whole segments, all of the length they have once a game has started
+                for i in range(ticks // Segment + 1):
+                    t = Timer()
+                    lookahead.queue.append(lookahead.segment())
+                    times.append((Timer() - t) * 1e6 / Segment)
+                return np.median(times)
+        time.sleep(0.001)
+
+
+def advance(game, ticks):
+    """Play ticks like World.tick at a fixed speed and without stopping at collisions, timing each part.
+    :param game: the world.
+    :param ticks: number of ticks.
+    :return: seconds spent in update_boundaries, update_obstacles and place."""
+
+    times = np.zeros(3)
+    for i in range(ticks):
+        # the swept collision test goes from the position before the tick
+        game.save_position()
+        game.z += game.speed
+        t1 = Timer()
+        game.update_boundaries()
+        t2 = Timer()
+        game.update_obstacles()
+        t3 = Timer()
+        game.ticks += 1
+        game.place()
+        t4 = Timer()
+        times += (t2 - t1, t3 - t2, t4 - t3)
+    return times
+
+
+def suite_world(density, speed, args):
+    """Time the parts of a tick in a game with the given density of obstacles, at the given speed.
+    :param density: obstacles in a distance, relative to the normal game.
+    :param speed: speed of the player.
+    :param args: parsed command line arguments.
+    :return: dictionary of name: microseconds per call."""
+
+    from world import Ring_gap, Spawn, Segments, collide_cube
+    game = steady_world(density, speed, args.seed)
+    results = {}
+    # obstacles made ahead as the thread makes them, for all the ticks played below
+    results["lookahead"] = prefill(game, args.ticks * args.rounds)
+    # parts of a tick, in a game that goes on
+    times = [advance(game, args.ticks) * 1e6 / args.ticks for i in range(args.rounds)]
+    for name, t in zip(("update_boundaries", "update_obstacles", "place"), np.min(times, axis=0)):
+        results[name] = t
+    # collision tests at the present position, against all cubes at once and one cube at a time
+    cubes = game.cube_faces()
+    results["collide"] = np.min([timed(game.collide, args.ticks) for i in range(args.rounds)])
+    results["collide_cube"] = np.min([timed(lambda: [collide_cube(cube, game) for cube in cubes], 100)
+                                      for i in range(args.rounds)])
+
+    # reuse an obstacle like update_obstacles does, with obstacles drawn before
+    spawns = itertools.cycle([Spawn(game.ticks, game.patterns, game.random) for i in range(64)])
+
+    def create():
+        game.delete_obstacle(game.obstacles.pop())
+        game.add_obstacle(next(spawns))
+    results["obstacle_init"] = np.min([timed(create, args.ticks) for i in range(args.rounds)])
+
+    # move the nearest ring to the far end
+    def recycle():
+        game.ring_z -= Ring_gap
+        game.tunnel.recycle(game.ring_z)
+    results["ring_recycle"] = np.min([timed(recycle, args.ticks) for i in range(args.rounds)])
+    results["obstacles"] = len(game.obstacles)
+    game.lookahead.resize(Segments)
+    return results
+
+
+def suite_frames(main, density, speed, args):
+    """Time complete frames: a tick and drawing the tunnel and obstacles.
+    :param main: the main module, set up by open_null or open_window.
+    :param density: obstacles in a distance, relative to the normal game.
+    :param speed: speed of the player.
+    :param args: parsed command line arguments.
+    :return: microseconds per frame."""
+
+    from OpenGL.GL import glFinish
+    from world import Segments
+    main.Game = game = steady_world(density, speed, args.seed)
+    frames = max(args.ticks // 10, 10)
+    prefill(game, frames * args.rounds)
+    main.Tunnel_source = None
+    main.set_defaults()
+
+    def frame():
+        advance(game, 1)
+        main.clear()
+        main.draw_boundaries()
+        main.draw_obstacles()
+        # wait for the frame to be drawn. Does nothing with the null driver
+        glFinish()
+    t = np.min([timed(frame, frames) for i in range(args.rounds)])
+    game.lookahead.resize(Segments)
+    return t
+
+
+def suite(args):
+    """Time the hot paths of the simulation and of drawing at several obstacle densities and speeds.
+    :param args: parsed command line arguments.
+    :return: exit status."""
+
+    import world
+    main = open_null((800, 600)) if args.gl == "null" else open_window((800, 600))
+    # the games of the suite play at a fixed speed, and so must the copies of them that make their obstacles ahead:
+    # a copy that speeds up makes obstacles closer together in ticks
+    acceleration, world.Acceleration = world.Acceleration, 0
+    results = {}
+    obstacles = {}
+    # passes over all of them, keeping the fastest of each. A slow spell of the machine lasts seconds, long enough
+    # for all rounds of one benchmark, but is only in one pass
+    for i in range(args.passes):
+        for density in args.densities:
+            for speed in args.speeds:
+                times = suite_world(density, speed, args)
+                times["frame"] = suite_frames(main, density, speed, args)
+                obstacles[density, speed] = times.pop("obstacles")
+                for name in times:
+                    key = "%s density=%g speed=%g" % (name, density, speed)
+                    results[key] = min(results.get(key, np.inf), round(float(times[name]), 3))
+    world.Acceleration = acceleration
+    print("%-20s %8s %6s %10s %10s" % ("benchmark", "density", "speed", "obstacles", "us / call"))
+    for density in args.densities:
+        for speed in args.speeds:
+            for name in sorted(times):
+                print("%-20s %8g %6g %10d %10.2f" % (name, density, speed, obstacles[density, speed],
+                                                     results["%s density=%g speed=%g" % (name, density, speed)]))
+    report = {"gl": args.gl,
+              "units": "us",
+              "python": platform.python_version(),
+              "numpy": np.__version__,
+              "machine": platform.platform(),
+              "tolerances": Tolerances,
+              "results": results}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+    return 0
+
+
+def compare(args):
+    """Compare results of the suite with the stored baseline and flag the ones that got slower.
+    :param args: parsed command line arguments.
+    :return: exit status, 1 if any benchmark is slower than the threshold allows."""
+
+    with open(args.baseline) as f:
+        report = json.load(f)
+    baseline = report["results"]
+    # benchmarks recorded as varying more between runs are allowed more, never less
+    tolerances = report.get("tolerances", {})
+    with open(args.results) as f:
+        results = json.load(f)["results"]
+    regressions = 0
+    print("%-40s %12s %12s %8s" % ("benchmark", "baseline", "now", "ratio"))
+    for key in sorted(set(baseline) & set(results)):
+        ratio = results[key] / baseline[key] if baseline[key] else 1.0
+        slower = ratio > 1 + max(args.threshold, tolerances.get(key.split()[0], 0))
+        regressions += slower
+        print("%-40s %12.2f %12.2f %7.2fx%s" % (key, baseline[key], results[key], ratio, "  SLOWER" if slower else ""))
+    for key in sorted(set(baseline) ^ set(results)):
+        print("%-40s only in %s" % (key, "baseline" if key in baseline else "results"))
+    print("%d of %d benchmarks slower by more than %d%%%s" %
+          (regressions, len(set(baseline) & set(results)), args.threshold * 100,
+           "".join(", %s by more than %d%%" % (name, max(args.threshold, tolerances[name]) * 100)
+                   for name in sorted(tolerances))))
+    return 1 if regressions else 0
+
+
+def leaderboard(args):
+    """Save scores and upload them to a stub leaderboard that is slow and fails some posts, then to one that cannot
+    be reached. Check that submitting never waits, that every score arrives in order, and that the index gives the
+    same best scores as reading the whole log.
+    :param args: parsed command line arguments.
+    :return: exit status, 1 if any check fails."""
+
+    import random
+    import shutil
+    import socket
+    import tempfile
+    import scores
+    rng = random.Random(args.seed)
+    players = ("ann", "bob", "cy")
+    items = [scores.entry(rng.choice(players), rng.getrandbits(32), rng.randint(0, 2000), rng.randint(1, 9000), 1,
+                          "replay-%d.rpl" % i) for i in range(args.scores)]
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "scores.log")
+    failures = []
+
+    def check(ok, message):
+        print("%-4s %s" % ("ok" if ok else "FAIL", message))
+        if not ok:
+            failures.append(message)
+
+    def submit(store, batch):
+        # longest time a frame would wait for a submit, in ms
+        longest = 0.0
+        for item in batch:
+            t = Timer()
+            store.submit(item)
+            longest = max(longest, (Timer() - t) * 1e3)
+        return longest
+
+    def wait(condition):
+        end = time.time() + args.timeout
+        while not condition() and time.time() < end:
+            time.sleep(0.01)
+        return condition()
+    try:
+        stub = scores.Stub(args.delay, 1)
+        url = stub.start()
+        half = len(items) // 2
+        store = scores.Scores(path, url)
+        longest = submit(store, items[:half])
+        check(longest < args.budget, "longest submit with a slow server %.3f ms" % longest)
+        check(wait(lambda: len(stub.scores) == half), "%d of %d scores uploaded, %d posts failed on purpose" %
+              (len(stub.scores), half, stub.posts - len(stub.scores)))
+        t = Timer()
+        store.close()
+        check(stub.scores == items[:half], "uploaded in order, closed in %.1f ms" % ((Timer() - t) * 1e3))
+        # a port no one listens on
+        closed = socket.socket()
+        closed.bind(("127.0.0.1", 0))
+        down = "http://127.0.0.1:%d/scores" % closed.getsockname()[1]
+        closed.close()
+        store = scores.Scores(path, down)
+        longest = submit(store, items[half:])
+        check(longest < args.budget, "longest submit with no server %.3f ms" % longest)
+        t = Timer()
+        store.close()
+        check((Timer() - t) * 1e3 < args.budget * 100, "closed with uploads pending in %.1f ms" % ((Timer() - t) * 1e3))
+        # the next game with a leaderboard sends the rest
+        store = scores.Scores(path, url)
+        check(wait(lambda: len(stub.scores) == len(items)) and stub.scores == items,
+              "%d of %d scores uploaded when the server is back" % (len(stub.scores), len(items)))
+        store.close()
+        log = scores.Log(path)
+        every = [log.read(i) for i in range(log.count)]
+        check(every == items, "%d scores in the log" % log.count)
+
+        def best(player=None):
+            return sorted((item for item in every if player in (None, item["player"])),
+                          key=lambda item: -item["score"])[:10]
+        t = Timer()
+        top = log.top(10)
+        t = Timer() - t
+        check(top == best() and all(log.top(10, player) == best(player) for player in players),
+              "best scores from the index in %.2f ms" % (t * 1e3))
+        log.close()
+        # an index lost, and an entry cut short when the game stopped
+        os.remove(path + ".idx")
+        with open(path, "ab") as f:
+            f.write(b"\0" * 17)
+        log = scores.Log(path)
+        check(log.count == len(items) and log.top(10) == best(), "index made again, entry cut short dropped")
+        log.close()
+    finally:
+        shutil.rmtree(directory)
+    return 1 if failures else 0
+
+
+def scaling(args):
+    """Run the resolution controller against frames whose time is a fixed part and a part that grows with the
+    pixels drawn, with noise, through changes of the load. Check that it reaches the target and stays there.
+    :param args: parsed command line arguments.
+    :return: exit status, 1 if the scale does not settle where frames take at most the target time."""
+
+    import render
+    rng = np.random.RandomState(args.seed)
+    # ms of the fixed part and of filling all pixels, in each phase of the run
+    loads = [(3.0, 10.0), (3.0, 40.0), (3.0, 120.0), (3.0, 25.0), (3.0, 8.0)]
+    resolution = render.Resolution(args.target_ms)
+    failed = 0
+    print("%8s %8s %8s %10s %8s %8s" % ("fixed", "fill", "scale", "frame ms", "changes", "settled"))
+    for fixed, fill in loads:
+        scales, times = np.zeros(args.frames), np.zeros(args.frames)
+        for i in range(args.frames):
+            scales[i] = scale = resolution.scale
+            times[i] = (fixed + fill * scale ** 2) * (1 + args.noise * rng.randn())
+            resolution.update(times[i])
+        last = slice(args.frames // 2, None)
+        # in the second half the scale changes at most twice, and frames keep to the target unless the scale can
+        # go no lower. A light load keeps the full resolution
+        changes = np.count_nonzero(np.diff(scales[last]))
+        median = np.median(times[last])
+        best = fixed + fill * render.Min_scale ** 2
+        settled = changes <= 2 and (median <= args.target_ms * render.Over or best > args.target_ms)
+        if fixed + fill <= args.target_ms * render.Headroom:
+            settled = settled and scales[-1] == 1
+        failed += not settled
+        print("%8.1f %8.1f %8.3f %10.2f %8d %8s" % (fixed, fill, scales[-1], median, changes, settled))
+    return 1 if failed else 0
+
+
+def ghost_race(args):
+    """Race packs of ghosts of long games and time looking up and drawing all of them in a frame, with OpenGL
+    functions that do nothing. Check that the largest pack fits in the budget, and that the ghosts are where their
+    paths say.
+    :param args: parsed command line arguments.
+    :return: exit status, 1 if a frame takes longer than the budget or a ghost is misplaced."""
+
+    import shutil
+    import tempfile
+    import ghosts
+    from world import World, Bound
+    main = open_null((800, 600))
+    rng = np.random.RandomState(args.seed)
+    directory = tempfile.mkdtemp()
+    status = 0
+    print("%8s %10s %12s %12s" % ("ghosts", "pack (kB)", "median (ms)", "p95 (ms)"))
+    try:
+        for count in args.ghosts:
+            # random walks within the bounds, of games that end at different ticks
+            paths = []
+            for i in range(count):
+                ticks = rng.randint(args.ticks // 2, args.ticks)
+                steps = rng.uniform(-0.05, 0.05, (ticks + 1, 2))
+                steps[0] = 0
+                header = dict(seed=args.seed, density=1, score=ticks // 10, collision_tick=ticks)
+                paths.append((header, np.clip(np.cumsum(steps, 0), -Bound, Bound).astype(np.float16)))
+            path = os.path.join(directory, "%d.pack" % count)
+            ghosts.pack(path, paths)
+            main.Game = World(args.seed)
+            main.Ghosts = ghosts.Ghosts(ghosts.Pack(path), args.seed)
+            # the race at a tick most ghosts are still in
+            main.Game.ticks = args.ticks // 3
+            main.Game.speed = 0.5
+            times = []
+            for frame in range(args.frames):
+                t = Timer()
+                main.draw_ghosts(frame / float(args.frames))
+                times.append((Timer() - t) * 1e3)
+            # a ghost between ticks is between its points, the best one is the first
+            best = max(range(count), key=lambda k: (paths[k][0]["score"], -k))
+            tick = main.Game.ticks + 0.25
+            expected = paths[best][1][int(tick)] * 0.75 + paths[best][1][int(tick) + 1] * 0.25
+            found = main.Ghosts.positions(tick)[0]
+            if np.abs(found - expected).max() > 1e-3:
+                print("ghost at %s, its path is at %s" % (found, expected))
+                status = 1
+            print("%8d %10.1f %12.3f %12.3f" % (count, os.path.getsize(path) / 1024.0, np.median(times),
+                                               np.percentile(times, 95)))
+            main.Ghosts = None
+        if np.median(times) > args.budget:
+            print("%d ghosts take %.3f ms, over %.1f ms" % (count, np.median(times), args.budget))
+            status = 1
+    finally:
+        shutil.rmtree(directory)
+    return status
+
+
+def input_latency(args):
+    """Compare the latency from input to swap of the classic loop, which reads input right after the last swap, and
+    the late loop, which waits until the frame has to start, on a display with vsync made of sleeps: a swap waits for
+    the next refresh. The work of a frame is slept too, with noise. The time the classic loop draws behind the input
+    in between ticks is not part of it.
+    :param args: parsed command line arguments.
+    :return: exit status, 1 if the late loop is not faster at the median or misses more refreshes."""
+
+    import latency
+    rng = np.random.RandomState(args.seed)
+    interval = 1.0 / args.refresh
+    print("%-8s %10s %10s %10s %8s" % ("loop", "p50 (ms)", "p95 (ms)", "p99 (ms)", "missed"))
+    results = {}
+    for loop in ("classic", "late"):
+        pacer, meter = latency.Pacer(), latency.Meter()
+        start = latency.Timer()
+        swaps = []
+        for frame in range(args.frames):
+            if loop == "late":
+                pacer.wait()
+            meter.sample()
+            time.sleep(max(rng.normal(args.work_ms, args.work_ms * args.noise), 0) / 1000.0)
+            pacer.submitted()
+            # the swap waits for the next refresh
+            now = latency.Timer() - start
+            time.sleep((np.floor(now / interval) + 1) * interval - now)
+            pacer.swapped()
+            meter.swapped()
+            swaps.append(latency.Timer())
+        # refreshes a frame was not swapped on
+        missed = int(np.sum(np.round(np.diff(swaps) / interval) - 1))
+        records = meter.records()
+        p50, p95, p99 = np.percentile(records, latency.Percentiles)
+        results[loop] = p50, missed
+        print("%-8s %10.2f %10.2f %10.2f %8d" % (loop, p50, p95, p99, missed))
+    faster = results["late"][0] < results["classic"][0]
+    on_time = results["late"][1] <= results["classic"][1] + args.frames // 50
+    return 0 if faster and on_time else 1
+
+
+def origin(args):
+    """Play a long game twice, with the origin moving with the player and standing still, without stopping at
+    collisions. Check that every collision test and the score agree, and that positions stay near the origin.
+    :param args: parsed command line arguments.
+    :return: exit status, 1 if any tick differs or positions grow."""
+
+    from world import World, Origin_shift
+    games = [World(args.seed, floating=True), World(args.seed, floating=False)]
+    hits = np.zeros((2, args.ticks), bool)
+    farthest = np.zeros(2)
+    t = time.time()
+    for i in range(args.ticks):
+        # drift from corner to corner so that some obstacles are hit and some are not
+        dx = dy = 0.01 if (i // 50) % 2 else -0.01
+        for k, game in enumerate(games):
+            hits[k, i] = game.tick(dx, dy)
+            if i % 100 == 0:
+                # largest coordinate drawn or tested
+                live = game.live
+                farthest[k] = max(farthest[k], abs(game.gap_z - game.z), abs(game.tunnel.vertices).max(),
+                                  abs(game.base[live]).max() if live.any() else 0)
+    t = time.time() - t
+    floating, still = games
+    differ = np.flatnonzero(hits[0] != hits[1])
+    print("%d ticks in %.2f s, distance %.0f, speed %.2f" % (args.ticks, t, floating.distance, floating.speed))
+    print("ticks hit: %d and %d, ticks differing %d %s" % (hits[0].sum(), hits[1].sum(), len(differ),
+                                                          differ[:10].tolist()))
+    print("scores: %d and %d" % (floating.score, still.score))
+    print("farthest coordinate: %.1f with the origin moving, %.1f standing still" % tuple(farthest))
+    # the player is at most Origin_shift from the origin, and sees the tunnel ahead of it
+    near = farthest[0] <= 2 * Origin_shift + floating.tunnel.rings * 2
+    return 0 if not len(differ) and floating.score == still.score and near else 1
+
+
+def sweeping(args):
+    """Check the swept collision test. At each speed, play two games on the same obstacles, one testing the way
+    the player moved in each tick and one testing where it is at the end of each tick, without stopping at
+    collisions: every hit of the point test must be hit by the swept test too, in the same tick, and the ticks only
+    the swept test hits are obstacles the player went through. A fast speed is the same as a low tick rate. Then
+    test random ways past moving cubes against the positions of a hundred steps along each way.
+    :param args: parsed command line arguments.
+    :return: exit status, 1 if the swept test misses a hit or a time of impact is wrong."""
+
+    from world import World, Probe, Cube_size
+    missed = 0
+    print("%8s %10s %10s %12s %12s %12s" % ("speed", "swept", "point", "only swept", "point (us)", "swept (us)"))
+    for speed in args.speeds:
+        # obstacles are not checked to be passable, that depends on the test
+        games = [World(args.seed, solvable=False, swept=True), World(args.seed, solvable=False, swept=False)]
+        hits = np.zeros((2, args.ticks), bool)
+        times = np.zeros(2)
+        for game in games:
+            game.speed = speed
+        for i in range(args.ticks):
+            # drift from corner to corner so that some obstacles are hit and some are not
+            dx = dy = 0.01 if (i // 50) % 2 else -0.01
+            for k, game in enumerate(games):
+                t = Timer()
+                hits[k, i] = game.tick(dx, dy)
+                times[k] += Timer() - t
+                if k == 0 and hits[k, i] and not 0 <= game.impact <= 1:
+                    missed += 1
+        lost = np.count_nonzero(hits[1] & ~hits[0])
+        missed += lost
+        print("%8.2f %10d %10d %12d %12.1f %12.1f" % (speed, hits[0].sum(), hits[1].sum(), np.count_nonzero(
+            hits[0] & ~hits[1]), times[1] * 1e6 / args.ticks, times[0] * 1e6 / args.ticks))
+    # ways of random length and direction ending near a random cube, at random ticks so that cubes have moved
+    rng = np.random.RandomState(args.seed)
+    game = World(args.seed, solvable=False)
+    for i in range(500):
+        game.tick(0, 0)
+    steps = np.linspace(0, 1, args.steps)[:, None, None]
+    wrong = found = 0
+    for i in range(args.ways):
+        game.ticks = rng.randint(500, 2000)
+        # the bounds of the tick before are kept by place
+        game.place(game.ticks - 1)
+        game.place()
+        row = rng.choice(np.flatnonzero(game.live))
+        depth = game.boxes[row, 4:].mean() + rng.uniform(-1.5, 1.0)
+        game.gap_z, game.z = 0.0, -depth
+        game.previous = tuple(rng.uniform(-0.35, 0.35, 2)) + (-depth - rng.uniform(0.05, 2.5),)
+        game.x, game.y = rng.uniform(-0.35, 0.35, 2)
+        hit = game.collide()
+        # cubes and probes at each step, cubes move from the bounds of the previous tick
+        before = game.base + game.velocity * np.maximum(game.ticks - 1 - game.start_move, 0)
+        boxes = before + (game.boxes - before) * steps
+        x, y, z = game.previous
+        way = np.array((x, y, z)) + np.array((game.x - x, game.y - y, game.z - game.gap_z - z)) * steps[..., 0]
+        depths = -way[:, 2:]
+        inside = (boxes[..., 4] + Cube_size / 3.0 <= depths) & (depths <= boxes[..., 5] - Cube_size / 3.0)
+        inside &= game.live
+        probes = np.zeros(inside.shape, bool)
+        for px in Probe:
+            for py in Probe:
+                probes |= ((boxes[..., 0] <= -way[:, :1] + px) & (-way[:, :1] + px <= boxes[..., 1]) &
+                           (boxes[..., 2] <= -way[:, 1:2] + py) & (-way[:, 1:2] + py <= boxes[..., 3]))
+        stepped = (inside & probes).any(1)
+        if stepped.any():
+            found += 1
+            # the impact is before the first step in a cube, and after the step before it
+            first = np.argmax(stepped) / (args.steps - 1.0)
+            wrong += not hit or not first - 1.0 / (args.steps - 1) <= game.impact <= first
+    print("%d ways, %d hit in steps, %d missed or hit at the wrong time" % (args.ways, found, wrong))
+    print("%d hits of the point test missed by the swept test" % missed)
+    return 0 if not missed and not wrong else 1
+
+
+def parse(argv):
+    """Parse command line arguments.
+    :param argv: list of arguments.
+    :return: parsed arguments."""
+
+    parser = argparse.ArgumentParser(description="Benchmarks for Run: 3D")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+    p = commands.add_parser("render", help="frame times of immediate mode vs retained mode drawing")
+    p.add_argument("--frames", type=int, default=500, help="frames to time for each path")
+    p.add_argument("--width", type=int, default=800)
+    p.add_argument("--height", type=int, default=600)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--tolerance", type=int, default=2, help="largest allowed difference of a pixel channel")
+    p.add_argument("--shaded-tolerance", type=int, default=24,
+                   help="largest allowed difference of a pixel channel drawn with shaders")
+    p.add_argument("--density", type=float, default=1, help="obstacles in a distance, relative to the normal game")
+    p.add_argument("--split", type=int, default=1, help="draw each obstacle cube as SPLIT ** 3 smaller cubes")
+    p.add_argument("--offscreen", action="store_true", help="draw with Mesa through EGL, without a display")
+    p.set_defaults(run=render)
+    p = commands.add_parser("headless", help="ticks per second of the simulation without a display")
+    p.add_argument("--ticks", type=int, default=100000, help="ticks to play")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(run=headless)
+    p = commands.add_parser("alloc", help="check that ticks of a long game allocate no memory")
+    p.add_argument("--ticks", type=int, default=20000, help="ticks to check")
+    p.add_argument("--warmup", type=int, default=2000, help="ticks to play first, to fill the pools")
+    p.add_argument("--density", type=float, default=1, help="obstacles in a distance, relative to the normal game")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(run=allocations)
+    p = commands.add_parser("collision", help="collision test time of a frame against the number of obstacles")
+    p.add_argument("--obstacles", type=int, nargs="+", default=[5, 20, 80, 320, 1280])
+    p.add_argument("--repeat", type=int, default=2000, help="calls to time for each count")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(run=collision)
+    p = commands.add_parser("tunnel", help="tunnel update time of a tick against the length of the tunnel")
+    p.add_argument("--rings", type=int, nargs="+", default=[20, 200, 2000, 20000])
+    p.add_argument("--repeat", type=int, default=20000, help="ticks to time for each length")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(run=tunnel)
+    p = commands.add_parser("textures", help="time to generate or load the textures at startup")
+    p.add_argument("--sizes", type=int, nargs="+", default=[100, 256, 512, 1024])
+    p.set_defaults(run=texture_times)
+    p = commands.add_parser("suite", help="time the hot paths at several densities and speeds, for regressions")
+    p.add_argument("--gl", choices=("null", "mesa"), default="null",
+                   help="draw with OpenGL functions that do nothing, or with Mesa software rendering in a window")
+    p.add_argument("--densities", type=float, nargs="+", default=Densities,
+                   help="obstacles in a distance, relative to the normal game")
+    p.add_argument("--speeds", type=float, nargs="+", default=Speeds)
+    p.add_argument("--ticks", type=int, default=1000, help="calls to time in each round")
+    p.add_argument("--rounds", type=int, default=3, help="rounds to take the fastest of, noise only adds time")
+    p.add_argument("--passes", type=int, default=12, help="passes over all benchmarks to take the fastest of")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--out", help="file to write the results to, as JSON")
+    p.set_defaults(run=suite)
+    p = commands.add_parser("compare", help="compare results of suite with the baseline")
+    p.add_argument("results", help="results written by suite --out")
+    p.add_argument("--baseline", default=Baseline)
+    p.add_argument("--threshold", type=float, default=0.25, help="slow down allowed, 0.25 is 25%%")
+    p.set_defaults(run=compare)
+    p = commands.add_parser("scale", help="check that the resolution scale settles at the target frame time")
+    p.add_argument("--frames", type=int, default=1000, help="frames of each load")
+    p.add_argument("--target-ms", type=float, default=16.0)
+    p.add_argument("--noise", type=float, default=0.1, help="deviation of frame times, relative to them")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(run=scaling)
+    p = commands.add_parser("ghosts", help="time looking up and drawing hundreds of ghosts in a frame")
+    p.add_argument("--ghosts", type=int, nargs="+", default=[10, 100, 300, 1000], help="ghosts in each race")
+    p.add_argument("--ticks", type=int, default=6000, help="longest game of a ghost")
+    p.add_argument("--frames", type=int, default=200, help="frames to time for each race")
+    p.add_argument("--budget", type=float, default=2.0, help="ms the largest race may take in a frame")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(run=ghost_race)
+    p = commands.add_parser("latency", help="compare the input latency of the classic and the late loop with vsync")
+    p.add_argument("--frames", type=int, default=300, help="frames of each loop")
+    p.add_argument("--refresh", type=float, default=60.0, help="refresh rate of the display it makes of sleeps")
+    p.add_argument("--work-ms", type=float, default=4.0, help="time to play and draw a frame")
+    p.add_argument("--noise", type=float, default=0.2, help="deviation of the work, relative to it")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(run=input_latency)
+    p = commands.add_parser("origin", help="check that moving the origin changes no collision in a long game")
+    p.add_argument("--ticks", type=int, default=100000, help="ticks to play, the speed grows with them")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(run=origin)
+    p = commands.add_parser("sweep", help="check that the swept collision test hits all the point test hits, and more")
+    p.add_argument("--speeds", type=float, nargs="+", default=[0.1, 0.5, 2.0],
+                   help="speeds at the start, 2.0 is the speed of 0.1 at a twentieth of the tick rate")
+    p.add_argument("--ticks", type=int, default=5000, help="ticks to play at each speed")
+    p.add_argument("--ways", type=int, default=1000, help="random ways to test against steps")
+    p.add_argument("--steps", type=int, default=100, help="steps along each way")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(run=sweeping)
+    p = commands.add_parser("gameover", help="check that a game and its game over screen draw with the GPU timer")
+    p.add_argument("--seconds", type=float, default=0.5, help="seconds the game over screen waits for a click")
+    p.add_argument("--speedup", type=int, default=10, help="ticks played in the time of one, to get to the end")
+    p.add_argument("--frames", type=int, default=100000, help="frames after which the game is taken as stuck")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(run=game_over)
+    p = commands.add_parser("shaders", help="compile and link the shaders without a display, and check the fallback")
+    p.set_defaults(run=shaders)
+    p = commands.add_parser("scores", help="check that saving and uploading scores never makes a frame wait")
+    p.add_argument("--scores", type=int, default=60, help="scores to save")
+    p.add_argument("--delay", type=float, default=0.05, help="seconds the stub leaderboard waits to answer")
+    p.add_argument("--budget", type=float, default=1.0, help="ms a submit may take")
+    p.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for the uploads")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(run=leaderboard)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse(sys.argv[1:])
+    sys.exit(arguments.run(arguments))
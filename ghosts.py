@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+#################################################
+#                   Run: 3D                     #
+#        ghosts of recorded games to race       #
+#################################################
+
+# imports
+import os
+import sys
+import struct
+import argparse
+import numpy as np
+import replay
+from world import World, Cube_size
+
+# globals
+Magic = b"RUN3DGST"         # first bytes of a ghost pack
+Version = 1                 # version of the file format
+# magic, version, number of ghosts, number of points of all ghosts
+Header = struct.Struct("<8sHIQ")
+# seed and density of the game of each ghost, its first point and number of points, its score and the tick it hit
+# an obstacle, -1 for none
+Table = np.dtype([("seed", "<u4"), ("density", "<f4"), ("offset", "<u8"), ("length", "<u4"), ("score", "<i4"),
+                  ("collision_tick", "<i4")])
+# x and y of a ghost before the first tick and after each tick. Positions are within 0.35 of the center, where
+# float16 is precise to 1/4000. z is not kept, it follows from the tick: the speed does not depend on the player
+Point = np.dtype(("<f2", 2))
+Lead = 1.5                  # ghosts are shown where they crossed this far ahead of the player
+Alpha = 0.35                # opacity of ghosts
+Marker = Cube_size / 3      # half the size of the cube that marks a ghost
+
+
+def path(header, pairs, world):
+    """Positions of the player in each tick of a recorded game, found by moving as the game did. Obstacles do not
+    move the player, so they are not played.
+    :param header: header of the replay.
+    :param pairs: inputs and events of the replay.
+    :param world: a world to move in, its position is reset.
+    :return: array of Point, the position before the first tick and after each tick up to the end of the game."""
+
+    # pairs of NaN are events, the rest are the input of a tick
+    ticks = pairs[pairs[:, 0] == pairs[:, 0]][:header["ticks"]].tolist()
+    points = np.zeros(len(ticks) + 1, Point)
+    world.x = world.y = 0
+    for i, (dx, dy) in enumerate(ticks):
+        world.steer(dx, dy)
+        points[i + 1] = world.x, world.y
+    return points
+
+
+def pack(out, paths):
+    """Write ghosts to a pack: a header, a table of the ghosts and the points of all of them one after another.
+    :param out: name of the file.
+    :param paths: list of (header of the replay, points from path).
+    :return: nothing."""
+
+    table = np.zeros(len(paths), Table)
+    offset = 0
+    for i, (header, points) in enumerate(paths):
+        collision_tick = -1 if header["collision_tick"] is None else header["collision_tick"]
+        table[i] = (header["seed"], header["density"], offset, len(points), header["score"], collision_tick)
+        offset += len(points)
+    with open(out, "wb") as f:
+        f.write(Header.pack(Magic, Version, len(paths), offset))
+        f.write(table.tobytes())
+        for header, points in paths:
+            f.write(points.tobytes())
+
+
+class Pack:
+    """Ghosts in a pack file. The table and the points are mapped from the file, not read, so that a pack of many
+    long games opens at once and only the points looked up are read from the disk."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            header = f.read(Header.size)
+        if len(header) < Header.size or Header.unpack(header)[:2] != (Magic, Version):
+            raise ValueError("%s is not a ghost pack of version %d" % (path, Version))
+        count, points = Header.unpack(header)[2:]
+        self.table = np.memmap(path, Table, "r", Header.size, (count,))
+        self.points = np.memmap(path, Point, "r", Header.size + count * Table.itemsize, (points,))
+
+    def seed(self):
+        """The seed most ghosts were played with, the one to race them on.
+        :return: the seed, None for an empty pack."""
+
+        if not len(self.table):
+            return None
+        seeds, counts = np.unique(self.table["seed"], return_counts=True)
+        return int(seeds[np.argmax(counts)])
+
+
+class Ghosts:
+    """The ghosts of a pack that race a game: the ones of the same seed and density, at most a number of them, the
+    best first. Their positions at a tick are looked up for all of them at once."""
+
+    def __init__(self, pack, seed, density=1, most=None):
+        table = pack.table
+        rows = np.flatnonzero((table["seed"] == seed) & (table["density"] == np.float32(density)))
+        # the best scores race, of equal ones the first packed
+        rows = rows[np.argsort(-table["score"][rows].astype(np.int64), kind="stable")][:most]
+        self.points = pack.points
+        self.offsets = table["offset"][rows].astype(np.int64)
+        self.lengths = table["length"][rows].astype(np.int64)
+        # the two points to interpolate between, from the first point of a ghost
+        self.pair = np.arange(2)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def positions(self, tick):
+        """Positions of the ghosts still racing at a tick, in between ticks by linear interpolation. A ghost races
+        until its game ended.
+        :param tick: the tick, may be fractional.
+        :return: array of shape (ghosts, 2), x and y of each ghost that is racing."""
+
+        i = int(np.floor(tick))
+        racing = (i >= 0) & (self.lengths > i + 1)
+        # both points of all ghosts in one lookup, (ghosts, 2 points, x y)
+        points = self.points[(self.offsets[racing] + i)[:, None] + self.pair].astype(float)
+        fraction = tick - i
+        return points[:, 0] + (points[:, 1] - points[:, 0]) * fraction
+
+
+def build(args):
+    """Make a pack from replays.
+    :param args: parsed command line arguments.
+    :return: exit status."""
+
+    world = World()
+    paths = []
+    for name in args.replays:
+        header, pairs = replay.read(name)
+        paths.append((header, path(header, pairs, world)))
+    pack(args.out, paths)
+    print("%d ghosts, %d points, %d bytes" % (len(paths), sum(len(p) for h, p in paths), os.path.getsize(args.out)))
+    return 0
+
+
+def show(args):
+    """Print the ghosts of a pack.
+    :param args: parsed command line arguments.
+    :return: exit status."""
+
+    ghosts = Pack(args.pack)
+    print("%10s %8s %8s %8s %8s" % ("seed", "density", "ticks", "score", "hit"))
+    for row in ghosts.table:
+        print("%10d %8.1f %8d %8d %8s" % (row["seed"], row["density"], row["length"] - 1, row["score"],
+                                         row["collision_tick"] if row["collision_tick"] >= 0 else "-"))
+    return 0
+
+
+def parse(argv):
+    """Parse command line arguments.
+    :param argv: list of arguments.
+    :return: parsed arguments."""
+
+    parser = argparse.ArgumentParser(description="Ghosts of Run: 3D")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+    p = commands.add_parser("pack", help="make a pack of ghosts from replays, to race with main.py --ghosts")
+    p.add_argument("out", help="file to write the pack to")
+    p.add_argument("replays", nargs="+", help="replays recorded with main.py --record")
+    p.set_defaults(run=build)
+    p = commands.add_parser("show", help="list the ghosts of a pack")
+    p.add_argument("pack")
+    p.set_defaults(run=show)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse(sys.argv[1:])
+    sys.exit(arguments.run(arguments))
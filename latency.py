@@ -0,0 +1,165 @@
+#################################################
+#                   Run: 3D                     #
+#     late input and input to photon latency    #
+#################################################
+
+# imports
+import csv
+import time
+import numpy as np
+
+# globals
+Timer = getattr(time, "perf_counter", time.time)    # most precise clock there is
+Window = 60                 # frames the refresh interval and the work of a frame are estimated from
+Margin = 0.002              # seconds left free before a swap is due, for work the estimate missed
+Capacity = 4096             # frames of latency kept, older frames are overwritten
+Percentiles = (50, 95, 99)  # percentiles of latency that are reported
+
+
+class Pointer:
+    """Positions of the mouse in the ticks of a frame. Motion events since the last frame are kept, and a frame that
+    plays several ticks gives each one the position the mouse had about when the tick was due, instead of giving all
+    of them the position after the last event. Events carry no time, so they are taken as spread evenly over the
+    frame. The last tick reads the mouse itself, the freshest position there is."""
+
+    def __init__(self):
+        # positions of the motion events since the last frame, in order
+        self.moves = []
+
+    def motion(self, position):
+        """Keep the position of a motion event.
+        :param position: x and y of the mouse.
+        :return: nothing."""
+
+        self.moves.append(position)
+
+    def sample(self, i, ticks):
+        """Position of the mouse in a tick of the frame.
+        :param i: the tick, from 0 for the first tick of the frame.
+        :param ticks: ticks played in the frame.
+        :return: x and y, None to read the mouse."""
+
+        if i == ticks - 1 or not self.moves:
+            return None
+        return self.moves[max(len(self.moves) * (i + 1) // ticks - 1, 0)]
+
+    def clear(self):
+        """Forget the events, at the end of a frame.
+        :return: nothing."""
+
+        del self.moves[:]
+
+
+class Pacer:
+    """Starts the work of a frame as late as it can and still be done before the next swap, so that input is read
+    just before the frame is drawn instead of right after the last swap. The refresh interval is the median time
+    between the last swaps, the work of a frame the longest of the last frames. Without vsync swaps do not wait,
+    the interval is the work itself, and there is nothing to wait for."""
+
+    def __init__(self, window=Window, margin=Margin):
+        self.margin = margin
+        # seconds between swaps, and from the start of the work of a frame to its swap, of the last frames
+        self.intervals = np.zeros(window)
+        self.work = np.zeros(window)
+        self.frames = 0
+        # time of the last swap, None after a pause, and time the work of this frame started
+        self.swap = None
+        self.start = Timer()
+
+    def reset(self):
+        """Forget the last swap, after a pause.
+        :return: nothing."""
+
+        self.swap = None
+
+    def wait(self):
+        """Sleep until the work of the frame has to start, then start it.
+        :return: seconds slept."""
+
+        delay = 0.0
+        if self.swap is not None and self.frames >= len(self.work):
+            delay = self.swap + np.median(self.intervals) - self.work.max() - self.margin - Timer()
+            if delay > 0:
+                time.sleep(delay)
+        self.start = Timer()
+        return max(delay, 0.0)
+
+    def submitted(self):
+        """The frame is drawn, right before it is swapped.
+        :return: nothing."""
+
+        self.work[self.frames % len(self.work)] = Timer() - self.start
+
+    def swapped(self):
+        """The frame has been swapped.
+        :return: nothing."""
+
+        t = Timer()
+        if self.swap is not None:
+            self.intervals[self.frames % len(self.intervals)] = t - self.swap
+            self.frames += 1
+        self.swap = t
+
+
+class Meter:
+    """Measures the latency from input to photon of each frame: the time from reading the newest input the frame
+    shows to the end of its swap, plus how far behind that input the frame is drawn. The swap is waited for with
+    glFinish while measuring, which may lower the frame rate. The scanout of the display after the swap is not
+    included, it is the same for every loop."""
+
+    def __init__(self, capacity=Capacity):
+        # seconds of latency of the last frames
+        self.latency = np.zeros(capacity)
+        self.frames = 0
+        # time the newest input was read, None before the first
+        self.sampled = None
+
+    def sample(self):
+        """The input was read.
+        :return: nothing."""
+
+        self.sampled = Timer()
+
+    def swapped(self, behind=0.0):
+        """The frame has been swapped and finished.
+        :param behind: seconds of game time the frame is drawn behind the newest input, when it is drawn in between
+            the previous tick and the current one.
+        :return: nothing."""
+
+        if self.sampled is None:
+            return
+        self.latency[self.frames % len(self.latency)] = Timer() - self.sampled + behind
+        self.frames += 1
+
+    def records(self):
+        """Latency of the recorded frames, oldest first.
+        :return: array of milliseconds."""
+
+        n = len(self.latency)
+        if self.frames <= n:
+            return self.latency[:self.frames] * 1000
+        i = self.frames % n
+        return np.concatenate((self.latency[i:], self.latency[:i])) * 1000
+
+    def report(self):
+        """Distribution of the latency.
+        :return: a line of text."""
+
+        records = self.records()
+        if not len(records):
+            return "input to photon: no frames"
+        return "input to photon over %d frames: mean %.2f ms, %s" % (len(records), records.mean(), ", ".join(
+            "p%d %.2f ms" % (p, t) for p, t in zip(Percentiles, np.percentile(records, Percentiles))))
+
+    def dump(self, path):
+        """Write the latency of the recorded frames to a CSV file.
+        :param path: name of the file.
+        :return: nothing."""
+
+        records = self.records()
+        with open(path, "w") as f:
+            writer = csv.writer(f)
+            writer.writerow(("frame", "latency"))
+            first = self.frames - len(records)
+            for i, t in enumerate(records):
+                writer.writerow([first + i, "%.4f" % t])
@@ -1,225 +1,128 @@
-#!/usr/bin/env python2
+#!/usr/bin/env python3
 
 #################################################
 #                   Run: 3D                     #
 #################################################
 
 # imports
+import time
+# time at which each phase of startup ended, printed with --profile-startup
+Phases = [("interpreter", time.time())]
+import os
+import sys
+import argparse
+import getpass
+import random
 import numpy as np
 import pygame as pg
-from pygame.locals import *
-from OpenGL.GL import *
-from OpenGL.GLU import *
-from collections import deque
-import random
+from pygame.locals import (QUIT, KEYDOWN, K_ESCAPE, K_F3, MOUSEBUTTONDOWN, MOUSEMOTION, ACTIVEEVENT, OPENGL, DOUBLEBUF,
+                           FULLSCREEN)
+Phases.append(("import pygame", time.time()))
+from OpenGL.GL import (glBegin, glEnd, glBindTexture, glBlendFunc, glClear, glClearColor, glColor, glDepthMask,
+                       glDisable, glEnable, glFinish, glFogf, glFogfv, glFogi, glFrontFace, glGetFloatv, glHint,
+                       glLoadIdentity, glLoadMatrixf, glMatrixMode, glPopMatrix, glPushMatrix, glTexCoord2fv,
+                       glTranslatef, glVertex3fv, GL_BLEND, GL_COLOR_BUFFER_BIT, GL_CULL_FACE, GL_CW,
+                       GL_DEPTH_BUFFER_BIT, GL_DEPTH_TEST, GL_FALSE, GL_FOG, GL_FOG_COLOR, GL_FOG_END, GL_FOG_HINT,
+                       GL_FOG_MODE, GL_FOG_START, GL_LINEAR, GL_MODELVIEW, GL_MODELVIEW_MATRIX, GL_NICEST,
+                       GL_ONE_MINUS_SRC_ALPHA, GL_PROJECTION, GL_QUADS, GL_SRC_ALPHA, GL_TEXTURE_2D, GL_TRUE)
+from OpenGL.GLU import gluPerspective
+Phases.append(("import OpenGL", time.time()))
+import ghosts
+import latency
+import profiler
+import render
+import replay
+import scores
+import text
+import textures
+from timestep import Stepper
+from world import World, Cube, Cube_size, Rings, Ring_gap
+Phases.append(("import game", time.time()))
 
 # globals
 Size = None                 # size of display
 Active = True               # check if current window is in focus
-FPS = 40                    # speed of execution
-Speed = 0.1                 # speed of Z movement
+Tick_rate = 40              # ticks of the game in a second, the game plays the same at any frame rate
+Frame_limit = 0             # most frames in a second, 0 for no limit. Swapping waits for vsync where it can
+Grow_rate = 18              # rings added in a second while the tunnel is set up on restart
+Menu_rate = 15              # ticks in a second in the menu
+Game_over_time = 30         # seconds to wait for a click after game over
 # Angle = 0                   # angle made by actual tunnel with current view
-Cube_size = 0.25            # size of Cube
-Clock = pg.time.Clock()     # Clock to control speed of execution
+Clock = pg.time.Clock()     # Clock to limit the frame rate
+Steps = None                # time steps of the game while playing
 Default_matrix = None       # restore settings at the beginning of the game
-
-# vertices of cube
-R_U_F = (Cube_size, Cube_size, Cube_size, 1)        # R = Right
-R_U_B = (Cube_size, Cube_size, -Cube_size, 1)       # U = Up
-R_D_F = (Cube_size, -Cube_size, Cube_size, 1)       # F = Front
-R_D_B = (Cube_size, -Cube_size, -Cube_size, 1)      # B = Back
-L_U_F = (-Cube_size, Cube_size, Cube_size, 1)       # D = Down
-L_U_B = (-Cube_size, Cube_size, -Cube_size, 1)      # L = Left
-L_D_F = (-Cube_size, -Cube_size, Cube_size, 1)
-L_D_B = (-Cube_size, -Cube_size, -Cube_size, 1)
-
-# faces of cube
-R_Face = np.array((R_U_F, R_U_B, R_D_B, R_D_F))
-L_Face = np.array((L_U_F, L_D_F, L_D_B, L_U_B))
-U_Face = np.array((R_U_F, L_U_F, L_U_B, R_U_B))
-D_Face = np.array((R_D_F, R_D_B, L_D_B, L_D_F))
-F_Face = np.array((R_U_F, R_D_F, L_D_F, L_U_F))
-B_Face = np.array((R_U_B, L_U_B, L_D_B, R_D_B))
-
-# cube
-Cube = np.array((R_Face, L_Face, U_Face, D_Face, F_Face, B_Face))
+Field_of_view = 90          # vertical field of view in degrees
+Near = 0.1                  # distance of the near clipping plane
+View_depth = 10.0           # distance to the end of the view, the far clipping plane. Fog hides what is farther
+Fog_start = 0.6             # fraction of View_depth where fog starts
+Obstacle_depth = 8.5        # obstacles appear about this far ahead, they come out of the fog here
+Retained = True             # draw tunnel and obstacles from vertex buffers. False draws in immediate mode
+Game = World()              # state of the game
+Profile_startup = False     # print how long each phase of startup took, after the first frame
+Windowed = None             # size of the window, None for full screen at the size of the desktop
+Scale = None                # fixed scale of the resolution the scene is drawn at, None to adjust it to Target_ms
+Target_ms = 16.0            # time of a frame the scale is adjusted to keep, in ms
+Window_size = (1280, 720)   # size of the window when no size is given
+Framebuffer = None          # the scene is drawn into it and scaled up to the window, None to draw to the window
+Gpu_timer = None            # time the GPU takes to draw the scene, None if it is not known
+Resolution = None           # scale of the resolution the scene is drawn at, adjusted to frame times
+Shaded = True               # make color and fog of boundary and obstacles in shaders where they are supported
+Shading = None              # shaders of boundary and obstacles, None to draw them with the glow texture and glColor
 
 # texture mapping
 Texture_corners = ((0, 0), (0, 1), (1, 1), (1, 0))
 texture = None
 Play_button_texture = None
-
-Boundaries = deque()                    # update and delete boundaries
-Bound = Cube_size * 7 / 5.0             # limit value
-x_low = y_low = -Bound                  # limits for viewing
-x_high = y_high = Bound
-Current_X = Current_Y = Current_Z = 0   # viewing position
-Gap_Z = 0                               # gap between beginning of the game and scoring
-Obstacles = deque()                     # update and delete from front when passed
-Deleted_obstacles = []                  # to reuse
-Next_Obstacle = random.randint(0, 5)    # time for the next obstacle
-
-# colors
-game_color = np.array((0.0, 0.3, 0.8))      # color of boundary and obstacles
-Color_change = random.randint(100, 200)     # time for next color
-Next_color = random.randint(50, 100)        # time for transition from current color to next
-# the amount by which the color must change each time
-Color_difference = ((random.random() - game_color[0]) / Next_color,
-                    (random.random() - game_color[1]) / Next_color,
-                    (random.random() - game_color[2]) / Next_color)
+Texture_size = textures.Size    # width and height of generated textures
+Tunnel_batch = None         # quads of all boundaries, only rings that change are uploaded again
+Tunnel_source = None        # tunnel in Tunnel_batch
+Obstacle_batch = None       # quads of all obstacles, uploaded every frame
+Obstacle_instances = None   # obstacles drawn with hardware instancing, None if it is not supported
+Instanced = True            # draw obstacles with hardware instancing where it is supported
+Cube_mesh = Cube[..., :3] / Cube_size   # faces of a cube from -1 to 1, the mesh of all obstacle cubes
+Split = 1                   # obstacle cubes are drawn as Split ** 3 smaller cubes, the game hits whole cubes
+Dense_split = 3             # Split in dense mode, unless --split is given
+Dense_density = 2           # obstacles in a distance in dense mode, relative to the normal game
+Labels = None               # draws strings from glyph atlases
+Hud = True                  # show the score while playing
+Hud_font = 2                # font of the score while playing
+Overlay = False             # show frame times while playing, toggled by F3
+Overlay_lines = []          # lines of frame times shown, updated every Overlay_interval frames
+Overlay_interval = 20       # frames between updates of the frame times shown
+Overlay_font = 0            # font of the frame times
+Record_directory = None     # directory to record games to, None to not record
+Recorder = None             # records the game being played
+Replay_name = ""            # file name of the replay of the game being played, empty if it is not recorded
+Player = "player"           # name of the player in the score log
+Scores = None               # saves scores and uploads them in the background, None to not save them
+Ghost_pack = None           # recorded games to race, every game is played on their seed. None to play alone
+Ghosts = None               # the ghosts of Ghost_pack racing the player
+Ghost_batch = None          # quads of all ghosts, uploaded every frame
+Late_input = True           # read the mouse as late as the frame allows and draw the view ahead with it
+Pointer = latency.Pointer()     # positions of the mouse in the ticks of a frame, from its motion events
+Pacer = latency.Pacer()     # starts the work of a frame as late as it can still be on time
+Latency = None              # measures the latency from input to photon, None to not measure it
+Ahead = None                # input read right before drawing to draw the view ahead with, None to draw between ticks
 
 
 def set_defaults():
-    """Set the default values for all global variables on restart.
+    """Set the default values of the drawing state on restart.
     :return: nothing."""
 
-    global Default_matrix, Gap_Z, Current_X, Current_Y, Current_Z, FPS, Next_Obstacle, texture, Speed
-    global x_low, x_high, y_low, y_high
     glLoadMatrixf(Default_matrix)               # reset MODEL VIEW MATRIX
-    Speed = 0.1                                 # reset speed
-    Next_Obstacle = random.randint(0, 5)        # reset time for next obstacle
-    Boundary.X = Boundary.Y = Boundary.Z = 0    # reset boundary parameters
-    Current_X = Current_Y = Current_Z = 0       # reset player position
-    Gap_Z = 0                                   # gap between beginning of the game and scoring
-    x_low = y_low = -Bound                      # set bounds
-    x_high = y_high = Bound
     glBindTexture(GL_TEXTURE_2D, texture)       # bind the texture to 2D surface
     glEnable(GL_TEXTURE_2D)                     # enable the texture
 
 
-class Obstacle:
-    """Each object of this class is a static or moving obstacle that the player has to dodge.
-    It is a collection of cubes."""
-
-    def __init__(self):
-        # store x, y, z for creating obstacle and deleting after it is passed
-        self.x, self.y, self.z = Boundary.X, Boundary.Y, Boundary.Z + 1
-        # type of obstacle
-        self.type = random.randint(1, 15)
-        # moving cubes if any
-        self.moving_faces = []
-        # when to start move
-        self.start_move = 0
-        # transformation matrix for animating moving obstacles
-        self.move = translation_matrix((0, 0, 0))
-        # static cubes
-        self.faces = []
-        # bool to check if object has passed
-        self.has_passed = False
-
-        if self.type < 16:  # checking so that if any new obstacle is added, this code won't be executed for them
-            # bitwise: 1-15 are all 4 bit numbers b3,b2,b1,b0
-            # create Cubes for all bits that are 1's
-            if self.type & 1:
-                self.faces.append(Cube.dot(translation_matrix((self.x - Cube_size,  # b0 - bottom left
-                                                               self.y - Cube_size, self.z))))
-            if self.type & 2:
-                self.faces.append(Cube.dot(translation_matrix((self.x - Cube_size,  # b1 - top left
-                                                               self.y + Cube_size, self.z))))
-            if self.type & 4:
-                self.faces.append(Cube.dot(translation_matrix((self.x + Cube_size,  # b2 - top right
-                                                               self.y + Cube_size, self.z))))
-            if self.type & 8:
-                self.faces.append(Cube.dot(translation_matrix((self.x + Cube_size,  # b3 - bottom right
-                                                               self.y - Cube_size, self.z))))
-        if self.type == 15:
-            # if all 4 are blocked, set it to open as player approaches.
-            self.start_move = 16    # starts opening after these many update calls from the time of creation
-            k = random.randint(0, 3)    # choose the block to move
-            # choose the direction for it to move out of view. Only 2 ways to move out from corner
-            l = random.randint(0, 1)
-            # set the direction and speed at which it should move out
-            dx, dy = [[0, -Speed / 6], [-Speed / 6, 0], [0, Speed / 6], [Speed / 6, 0]][(k + l) & 3]
-            # set that face as moving and choose the corresponding transformation matrix
-            self.moving_faces.append(self.faces.pop(k))
-            self.move = translation_matrix((dx, dy, 0))
-        elif random.random() > 0.7:
-            # set moving obstacles
-            self.start_move = 12
-            self.move = translation_matrix((0, 0, Speed / 2))
-            # set the moving faces and make them reach the position on time
-            while self.faces:
-                self.moving_faces.append(self.faces.pop().dot(translation_matrix((0, 0, -13.0 * Speed))))
-            # add gap after current object
-            global Next_Obstacle
-            Next_Obstacle += 3
-
-    def update(self):
-        """Update the status of the obstacle, used to delete.
-        :return: nothing."""
-
-        global Gap_Z, Current_Z
-        self.has_passed = self.z > Gap_Z - Current_Z - Cube_size * 2 / 3
-
-    def draw(self):
-        """Draw the obstacle.
-        Requires glBegin(GL_QUADS) before call and glEnd() after call for the drawing to actually take place.
-        :return: nothing."""
-
-        # move the moving_faces
-        if self.start_move:
-            self.start_move -= 1
-        else:
-            self.moving_faces = [face.dot(self.move) for face in self.moving_faces]
-        # draw all cubes
-        for cube in self.faces + self.moving_faces:
-            draw_cube(cube)
-
-    def collide(self):
-        """Check if the current position collides with the obstacle.
-        :return: True if collision takes place, false otherwise."""
-
-        return any(collide_cube(cube) for cube in self.faces + self.moving_faces)
-
-
-class Boundary:
-    """Each Boundary object has 8 quads / squares, 2 on each of the 4 sides (Right, Left, Up, Down)"""
-    # variables to store the X, Y, Z positions of last boundary
-    X = Y = Z = 0
-
-    def __init__(self):
-        # update location for current boundary
-        Boundary.Z -= 0.5
-        # store the positions for future use
-        self.x, self.y, self.z = Boundary.X, Boundary.Y, Boundary.Z
-        # use the defined faces and multiply with transformation matrix to get the required faces
-        self.faces = [R_Face.dot(translation_matrix((self.x - 3 * Cube_size, self.y - Cube_size, self.z))),
-                      R_Face.dot(translation_matrix((self.x - 3 * Cube_size, self.y + Cube_size, self.z))),
-                      L_Face.dot(translation_matrix((self.x + 3 * Cube_size, self.y - Cube_size, self.z))),
-                      L_Face.dot(translation_matrix((self.x + 3 * Cube_size, self.y + Cube_size, self.z))),
-                      U_Face.dot(translation_matrix((self.x - Cube_size, self.y - 3 * Cube_size, self.z))),
-                      U_Face.dot(translation_matrix((self.x + Cube_size, self.y - 3 * Cube_size, self.z))),
-                      D_Face.dot(translation_matrix((self.x - Cube_size, self.y + 3 * Cube_size, self.z))),
-                      D_Face.dot(translation_matrix((self.x + Cube_size, self.y + 3 * Cube_size, self.z)))]
-        # helps to check if the boundary is out of the frame
-        self.z -= Cube_size
-        # boolean value which is True when the boundary is behind the current position
-        self.has_passed = False
-
-    def update(self):
-        """Update the status of the boundary, used to delete.
-        :return: nothing."""
-
-        global Current_Z, Gap_Z
-        self.has_passed = self.z > Gap_Z - Current_Z
-
-    def draw(self):
-        """Draw the boundary.
-        Requires glBegin(GL_QUADS) before call and glEnd() after call for the drawing to actually take place.
-        :return: nothing."""
-
-        # draw_cube draws the quads in the list irrespective of size. so, it can be used
-        draw_cube(self.faces)
-
-
 def start(title):
     """Initialize the game.
     :param title: Caption to be set for the window.
     :return: nothing."""
 
-    global Size, Boundaries, Speed, Gap_Z, Default_matrix
-    # initialize
-    pg.init()
+    global Size, Steps
+    # initialize only the display. Fonts are initialized by the first text drawn, sound and joysticks never
+    pg.display.init()
+    Phases.append(("display init", time.time()))
     # avoid unnecessary events
     pg.event.set_allowed(None)
     pg.event.set_allowed((QUIT, KEYDOWN, MOUSEBUTTONDOWN, ACTIVEEVENT))
@@ -231,24 +134,59 @@ def start(title):
     # pg.display.set_mode(Size, OPENGL | DOUBLEBUF)
 
     # Full screen
+    # screen, at the size of the desktop. Cheaper than listing all modes
+    size, flags = ((0, 0), OPENGL | DOUBLEBUF | FULLSCREEN) if Windowed is None else (Windowed, OPENGL | DOUBLEBUF)
+    try:
+        # swap at the refresh rate of the monitor, drawing faster than that is wasted
+        pg.display.set_mode(size, flags, vsync=1)
+    except (TypeError, pg.error):
+        # vsync is not supported by this version of pygame or by the driver
+        pg.display.set_mode(size, flags)
     # size
-    Size = pg.display.list_modes()[0]
-    # screen
-    pg.display.set_mode(Size, OPENGL | DOUBLEBUF | FULLSCREEN)
+    Size = pg.display.get_surface().get_size()
 
     # caption
     pg.display.set_caption(title)
+    Phases.append(("window", time.time()))
+    # set up OpenGL state, textures and vertex buffers
+    init_gl()
+    # the game ticks at a fixed rate, frames are drawn in between
+    Steps = Stepper(Tick_rate)
+
+
+def init_gl():
+    """Set up the OpenGL state for the game. Requires a display with an OpenGL context.
+    :return: nothing."""
+
+    global Default_matrix, Tunnel_batch, Obstacle_batch, Obstacle_instances, Labels, Framebuffer, Gpu_timer, Resolution
+    global Shading, Ghost_batch
     # view (field of view in degrees, aspect ratio, near clipping plane, far clipping plane)
     # only the objects that lie in between the clipping planes are drawn
-    gluPerspective(90, float(Size[0]) / Size[1], 0.1, 50)
+    glMatrixMode(GL_PROJECTION)
+    glLoadIdentity()
+    gluPerspective(Field_of_view, float(Size[0]) / Size[1], Near, View_depth)
+    glMatrixMode(GL_MODELVIEW)
+    glLoadIdentity()
+    # linear fog to the end of the view, black like the background, so that the tunnel fades away
+    glFogi(GL_FOG_MODE, GL_LINEAR)
+    glFogfv(GL_FOG_COLOR, (0, 0, 0, 1))
+    glHint(GL_FOG_HINT, GL_NICEST)
+    set_fog(View_depth)
+    glEnable(GL_FOG)
     # background color when cleared - black, opaque
     glClearColor(0, 0, 0, 1)
     # set game color (color of whatever is drawn till it is changed)
-    glColor(game_color)
-    # generate the play button
-    generate_play_button()
-    # generate, bind and enable textured drawing
+    glColor(Game.palette.color)
+    # shaders make the color from the palette, without them it is glColor
+    Shading = render.Shading() if Shaded else None
+    if Shading and not Shading.supported:
+        if Shading.error:
+            print("the shaders failed, drawing with the fixed pipeline: %s" % Shading.error)
+        Shading = None
+    # generate, bind and enable textured drawing. The play button is generated when the menu is first shown. The
+    # shaders sample the glow texture too, filtered by its mipmaps
     generate_texture()
+    Phases.append(("textures", time.time()))
     glBindTexture(GL_TEXTURE_2D, texture)
     glEnable(GL_TEXTURE_2D)
     # front face. decides which of the 2 sides of the plane is front side. Clockwise = left hand rule
@@ -261,48 +199,65 @@ def start(title):
     Default_matrix = glGetFloatv(GL_MODELVIEW_MATRIX)
     # function to decide transparency values
     glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-    # generate boundary
-    for i in range(20):
-        Boundaries.append(Boundary())
+    # vertex buffers for retained mode drawing
+    Tunnel_batch = render.QuadBatch()
+    Obstacle_batch = render.QuadBatch()
+    Ghost_batch = render.QuadBatch()
+    fragment = render.Shaded_fragment if Shading else render.Fragment_shader
+    Obstacle_instances = render.CubeInstances(Cube_mesh, fragment) if Instanced else None
+    if Obstacle_instances and not Obstacle_instances.supported:
+        # the cubes of obstacles are put together in Obstacle_batch instead
+        if Obstacle_instances.error:
+            print("the instancing shaders failed, drawing obstacles without instancing: %s" % Obstacle_instances.error)
+        Obstacle_instances = None
+    # text, fonts are loaded when first used
+    Labels = text.Text()
+    # the scene at a lower resolution, scaled up. At a fixed scale of 1 it is drawn to the window
+    Resolution = render.Resolution(Target_ms, 1.0 if Scale is None else Scale)
+    if Scale != 1:
+        Framebuffer = render.Framebuffer(Size)
+        if not Framebuffer.supported:
+            print("no framebuffer objects, drawing at the resolution of the window")
+            Framebuffer = None
+        elif Scale is None:
+            Gpu_timer = render.GpuTimer()
+            if not Gpu_timer.supported:
+                # frame times are taken from the clock, which waits for vsync too
+                Gpu_timer = None
+    Phases.append(("OpenGL state", time.time()))
 
 
 def restart():
     """Restart the game. Similar to start, but some parameters are already set.
     :return: nothing."""
 
-    global Gap_Z, Speed, Boundaries, Obstacles, Deleted_obstacles, texture, Play_button_texture
-    # set the default values of game and animation parameters
+    # set the default values of drawing parameters
     set_defaults()
-    # delete all Boundary objects. Remove from deque and reinitialise and reuse later
-    deleted_boundaries = []
-    while Boundaries:
-        deleted_boundaries.append(Boundaries.pop())
-    # delete obstacles. will be reused from Deleted_obstacles while updating and creating obstacles
-    while Obstacles:
-        Deleted_obstacles.append(Obstacles.pop())
-    # set some boundaries
-    for i in range(6):
-        Boundaries.append(deleted_boundaries.pop())
-        Boundary.__init__(Boundaries[-1])
+    # new game with some boundaries, the rest are added while moving. Ghosts are raced on the same obstacles
+    Game.reset(Ghost_pack.seed() if Ghost_pack else None, rings=6)
+    record_game(6)
     # set all the boundaries while moving
-    while deleted_boundaries:
-        Clock.tick(18)
-        # append from deleted
-        Boundaries.append(deleted_boundaries.pop())
-        # initialize
-        Boundary.__init__(Boundaries[-1])
-        # move, set Gap_Z so that scoring starts only at the end of this function
-        glTranslatef(0, 0, Speed)
-        Gap_Z -= Speed
+    steps = Stepper(Grow_rate)
+    growing = True
+    while growing:
+        Clock.tick(Frame_limit)
+        for i in range(steps.advance()):
+            growing = Game.grow()
+            if not growing:
+                break
+            if Recorder:
+                Recorder.event(replay.Grow)
         # clear display and draw boundaries in the new view
         clear()
-        update_boundaries()
+        draw_boundaries(steps.alpha)
+        present()
         # update display
         pg.display.flip()
     # get mouse button click to start playing
+    steps = Stepper(Menu_rate)
     while True:
-        # limit execution speed
-        Clock.tick(15)
+        # limit frame rate
+        Clock.tick(Frame_limit)
         # check events
         for event in pg.event.get():
             # quit
@@ -310,32 +265,45 @@ def restart():
                 return 0
             # check if mouse click
             if event.type == MOUSEBUTTONDOWN:
+                if Recorder:
+                    Recorder.event(replay.Click)
+                # the time in the menu is not played or profiled
+                Steps.reset()
+                Pacer.reset()
+                profiler.frame(False)
                 return 1
         clear()
-        # move and set Gap_Z
-        glTranslatef(0, 0, Speed)
-        Gap_Z -= Speed
-        # get new color, apply it and update boundaries
-        change_color()
-        glColor(game_color)
-        update_boundaries()
-        # enable transparency for background for button
+        # move and get new color
+        for i in range(steps.advance()):
+            Game.idle()
+            if Recorder:
+                Recorder.event(replay.Idle)
+        # update boundaries
+        draw_boundaries(steps.alpha)
+        # distance of the camera from the start of the tunnel
+        z = -Game.position(steps.alpha)[2] - 2
+        # enable transparency for background for button, no fog over it
         glEnable(GL_BLEND)
-        # set texture
+        glDisable(GL_FOG)
+        # set texture, generated the first time the menu is shown
+        if Play_button_texture is None:
+            generate_play_button()
         glBindTexture(GL_TEXTURE_2D, Play_button_texture)
         # negative color to enhance visibility
-        glColor((1, 1, 1) - game_color)
+        glColor(Game.palette.negative)
         # draw a quad with Play button texture
         glBegin(GL_QUADS)
-        draw_quad([(-0.5, -0.5, Gap_Z - 2),
-                   (-0.5, +0.5, Gap_Z - 2),
-                   (+0.5, +0.5, Gap_Z - 2),
-                   (+0.5, -0.5, Gap_Z - 2)])
+        draw_quad([(-0.5, -0.5, z),
+                   (-0.5, +0.5, z),
+                   (+0.5, +0.5, z),
+                   (+0.5, -0.5, z)])
         glEnd()
         # disable transparency for next loop
         glDisable(GL_BLEND)
+        glEnable(GL_FOG)
         # retain the texture
         glBindTexture(GL_TEXTURE_2D, texture)
+        present()
         # update display
         pg.display.flip()
 
@@ -344,9 +312,13 @@ def play():
     """Main game loop. Handles all game parameters.
     :return: State of the game. 0 for quit, 1 for continue, 2 for restart."""
 
-    global Current_Z, Speed, Active
-    # limit execution speed
-    Clock.tick(FPS)
+    global Active, Profile_startup, Overlay, Ahead
+    # limit frame rate
+    Clock.tick(Frame_limit)
+    if Late_input:
+        # and start as late as the frame can still be swapped on time
+        Pacer.wait()
+    profiler.mark("wait")
     # check events
     for event in pg.event.get():
         # quit
@@ -355,28 +327,87 @@ def play():
         # check if current event lost focus (gain=0 and state=2)
         if event.type == ACTIVEEVENT:
             Active = not (event.gain == 0 and event.state == 2)
+            if Recorder:
+                Recorder.event(replay.Focus_gained if Active else replay.Focus_lost)
+        # show or hide frame times, recording starts the first time they are shown
+        if event.type == KEYDOWN and event.key == K_F3:
+            Overlay = not Overlay
+            if profiler.Active is None:
+                profiler.enable()
+        if event.type == MOUSEMOTION:
+            Pointer.motion(event.pos)
+    profiler.mark("events")
 
     # do not continue if this game is not active
     if not Active:
+        # the time out of focus is not played
+        Steps.reset()
+        Pacer.reset()
+        Pointer.clear()
+        pg.time.wait(1000 // Tick_rate)
         return 1
-    # increase speed with time
-    Speed += 5e-5
-    # get new color and apply it
-    change_color()
-    glColor(game_color)
-    # get camera movement and apply it. always move in Z direction
-    dx, dy = get_dx_dy()
-    glTranslatef(dx, dy, Speed)
-    Current_Z += Speed
+    # play the ticks due by now, each with the camera movement of its time in the frame
+    collided = False
+    ticks = Steps.advance()
+    for i in range(ticks):
+        dx, dy = get_dx_dy(Pointer.sample(i, ticks) if Late_input else None)
+        if Latency:
+            Latency.sample()
+        if Recorder:
+            Recorder.tick(dx, dy)
+        profiler.mark("input")
+        collided = Game.tick(dx, dy)
+        if collided:
+            break
+    Pointer.clear()
+    # draw in between the last two ticks, or when the obstacle was hit
+    alpha = Game.impact if collided else Steps.alpha
+    Ahead = None
+    if Late_input and not collided:
+        # the freshest input moves the view from the last tick, the next tick moves the same way
+        Ahead = get_dx_dy()
+        if Latency:
+            Latency.sample()
+        profiler.mark("input")
     # clear display
     clear()
-    # update boundaries and obstacles
-    update_boundaries()
-    if update_obstacles():
+    # draw boundaries and obstacles
+    draw_boundaries(alpha)
+    draw_obstacles(alpha)
+    if Ghosts:
+        draw_ghosts(alpha)
+    present()
+    profiler.mark("draw")
+    if collided:
         # collided with an obstacle :'(
+        profiler.frame()
+        stop_recording()
         return game_over()
+    if Hud:
+        draw_hud()
+    draw_overlay()
+    profiler.mark("hud")
     # update display
+    if Late_input:
+        Pacer.submitted()
     pg.display.flip()
+    if Late_input:
+        Pacer.swapped()
+    if Latency:
+        # until the frame is on screen. Drawn in between ticks, it is behind the input of the last tick
+        glFinish()
+        Latency.swapped(0.0 if Ahead else (1 - alpha) * Steps.step)
+    profiler.mark("flip")
+    if Profile_startup:
+        # wait until the first frame is drawn, then show where the time went
+        glFinish()
+        Phases.append(("first frame", time.time()))
+        print_startup()
+        Profile_startup = False
+    if Hud and Hud_font not in Labels.atlases:
+        # the font of the score is loaded once the first frame is on screen
+        Labels.atlas(Hud_font)
+    profiler.frame()
     # repeat this loop
     return 1
 
@@ -385,15 +416,18 @@ def game_over():
     """Game over. Ask the user for restart or quit.
     :return: integer 0 for quit and 2 for restart."""
 
-    global Current_Z
     # display all obstacles and boundaries updated at the time of collision
     pg.display.flip()
     pg.time.delay(500)
-    clear()
     # display score in console
-    print("Score:", int(Current_Z))
-    # create a texture containing score
-    t1, r1 = string_to_texture(str(int(Current_Z)))
+    print("Score:", Game.score)
+    if Scores:
+        # written and uploaded by threads, the screen below does not wait for them
+        Scores.submit(scores.entry(Player, Game.seed, Game.score, Game.ticks, Game.density, Replay_name))
+    # choose fonts for the score, "again" and "quit"
+    f1, f2, f3 = [random.randint(0, len(text.Fonts) - 1) for i in range(3)]
+    score = str(Game.score)
+    r1 = Labels.aspect(score, f1)
     # adjust the width and height of texture to fit in a 1x1 box
     if r1 > 1:
         # height is greater. set it to max and adjust width to maintain ratio
@@ -403,62 +437,51 @@ def game_over():
         # width is greater. set it to max and adjust height to maintain ratio
         rx = 0.5
         ry = rx * r1
-    # create a texture containing the text "again" and "quit"
-    t2, r2 = string_to_texture("again")
-    t3, r3 = string_to_texture("quit")
 
     # definite loop (30 seconds), to avoid the game to stay idle in this screen
-    for i in range(FPS * 30):
-        # limit execution speed
-        Clock.tick(FPS)
+    steps = Stepper(Tick_rate)
+    ticks = 0
+    while ticks < Tick_rate * Game_over_time:
+        # limit frame rate
+        Clock.tick(Frame_limit)
         # clear screen
         clear()
-        # change the color and set it for the boundary
-        change_color()
-        glColor(game_color)
-        # get movement and move the camera
-        dx, dy = get_dx_dy()
-        glTranslatef(dx, dy, Speed)
-        # change current location (X & Y changed in get_dx_dy)
-        Current_Z += Speed
+        # get movement, move the camera and change the color
+        for i in range(steps.advance()):
+            Game.coast(*get_dx_dy())
+            ticks += 1
         # bind the glowing box texture and draw boundaries
         glBindTexture(GL_TEXTURE_2D, texture)
-        update_boundaries()
-        # enable transparency for background for score and messages
+        draw_boundaries(steps.alpha)
+        # distance of the player from the start of the tunnel
+        z = -Game.position(steps.alpha)[2]
+        # enable transparency for background for score and messages, no fog over them
         glEnable(GL_BLEND)
-        # set texture (score)
-        glBindTexture(GL_TEXTURE_2D, t1)
+        glDisable(GL_FOG)
         # negative color to enhance visibility
-        glColor((1, 1, 1) - game_color)
-        # draw a quad with score texture
-        glBegin(GL_QUADS)
-        draw_quad([(-rx, -ry, Gap_Z - Current_Z - 5),
-                   (-rx, +ry, Gap_Z - Current_Z - 5),
-                   (+rx, +ry, Gap_Z - Current_Z - 5),
-                   (+rx, -ry, Gap_Z - Current_Z - 5)])
-        glEnd()
+        glColor(Game.palette.negative)
+        # draw the score in a quad
+        Labels.draw(score, [(-rx, -ry, z - 5),
+                            (-rx, +ry, z - 5),
+                            (+rx, +ry, z - 5),
+                            (+rx, -ry, z - 5)], f1)
         # green color for "again"
         glColor((0.1, 0.9, 0.2))
-        # set texture
-        glBindTexture(GL_TEXTURE_2D, t2)
-        # draw quad with "again" texture
-        glBegin(GL_QUADS)
-        draw_quad([(-0.49,   -0.49,   Gap_Z - Current_Z - 0.5),
-                   (-0.49,   0,      Gap_Z - Current_Z - 0.5),
-                   (-0.49,   0,      Gap_Z - Current_Z - 1.5),
-                   (-0.49,   -0.49,   Gap_Z - Current_Z - 1.5)])
-        glEnd()
+        # draw "again" on the left wall
+        Labels.draw("again", [(-0.49,   -0.49,   z - 0.5),
+                              (-0.49,   0,      z - 0.5),
+                              (-0.49,   0,      z - 1.5),
+                              (-0.49,   -0.49,   z - 1.5)], f2)
         # draw "quit" in red, similar to "again"
         glColor((0.9, 0.1, 0.2))
-        glBindTexture(GL_TEXTURE_2D, t3)
-        glBegin(GL_QUADS)
-        draw_quad([(0.49,   0,   Gap_Z - Current_Z - 1.5),
-                   (0.49,   0.49, Gap_Z - Current_Z - 1.5),
-                   (0.49,   0.49, Gap_Z - Current_Z - 0.5),
-                   (0.49,   0,   Gap_Z - Current_Z - 0.5)])
-        glEnd()
+        Labels.draw("quit", [(0.49,   0,   z - 1.5),
+                             (0.49,   0.49, z - 1.5),
+                             (0.49,   0.49, z - 0.5),
+                             (0.49,   0,   z - 0.5)], f3)
         # disable transparency for next loop
         glDisable(GL_BLEND)
+        glEnable(GL_FOG)
+        present()
         # update display
         pg.display.flip()
         # check for key press
@@ -485,93 +508,260 @@ def stop():
     pg.quit()
 
 
-def get_dx_dy():
+def process_age():
+    """Time since the process was started, from /proc on Linux.
+    :return: seconds, or None if it is not known."""
+
+    try:
+        # start time of the process in clock ticks after boot is the 22nd field, the name before it may have spaces
+        with open("/proc/self/stat") as f:
+            started = float(f.read().rsplit(")", 1)[1].split()[19]) / os.sysconf("SC_CLK_TCK")
+        with open("/proc/uptime") as f:
+            return float(f.read().split()[0]) - started
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+
+
+def print_startup():
+    """Print how long each phase of startup took, from the start of the process to the first frame.
+    :return: nothing."""
+
+    age = process_age()
+    # start of the process, or the first line of this module if that is not known
+    start_time = time.time() - age if age is not None else Phases[0][1]
+    print("Startup, ms since the %s" % ("process started" if age is not None else "first import"))
+    t = start_time
+    for name, end in Phases:
+        print("  %-16s %8.1f %8.1f" % (name, (end - t) * 1000, (end - start_time) * 1000))
+        t = end
+
+
+def get_dx_dy(position=None):
     """Get a weak vector to decide how the camera must move in the current frame.
+    The world keeps the position in bounds.
+    :param position: position of the mouse, None to read it.
     :returns : dx, dy indicating the distance to be moved in x and y directions respectively."""
 
-    global Current_X, Current_Y, Size, x_low, x_high, y_low, y_high
     # current mouse pointer position
-    x, y = pg.mouse.get_pos()
+    x, y = pg.mouse.get_pos() if position is None else position
 
     # center of screen is reference
     # Note that y axis of pygame and OpenGL are opposite to each other. So minus not required
     dx = -round((x - Size[0] // 2) / (2.0 * Size[0]), 4)
     dy = round((y - Size[1] // 2) / (2.0 * Size[1]), 4)
+    # as precise as a float32, so that recorded games play the same
+    return float(np.float32(dx)), float(np.float32(dy))
+
+
+def record_game(rings):
+    """Start recording the game, if games are recorded. Called right after the world is reset.
+    :param rings: rings set up by the reset, the rest are added by grow.
+    :return: nothing."""
+
+    global Recorder, Replay_name
+    stop_recording()
+    Replay_name = ""
+    if Record_directory is None:
+        return
+    if not os.path.isdir(Record_directory):
+        os.makedirs(Record_directory)
+    Replay_name = "%s-%d.rpl" % (time.strftime("%Y%m%d-%H%M%S"), Game.seed)
+    Recorder = replay.Recorder(os.path.join(Record_directory, Replay_name), Game, rings, Tick_rate)
+
+
+def stop_recording():
+    """Finish the recording of the game, if it is recorded.
+    :return: nothing."""
+
+    global Recorder
+    if Recorder:
+        Recorder.close()
+        Recorder = None
+
+
+def set_view(alpha=1.0):
+    """Set the camera at the position of the player.
+    :param alpha: fraction of the way from the previous tick to the current one.
+    :return: nothing."""
+
+    glLoadMatrixf(Default_matrix)
+    glTranslatef(*Game.position(alpha, Ahead))
+
+
+def draw_boundaries(alpha=1.0):
+    """Draw the boundaries from the position of the player, in the current color.
+    :param alpha: fraction of the way from the previous tick to the current one.
+    :return: nothing."""
+
+    global Tunnel_source
+    set_view(alpha)
+    if Shading:
+        Shading.begin(Game.palette)
+    else:
+        glColor(Game.palette.color)
+    tunnel = Game.tunnel
+    # rings in view, the nearest rings from head. Rings end at z + Cube_size, tunnel.z is z - Cube_size
+    player_z = -Game.position(alpha)[2]
+    visible = np.count_nonzero(tunnel.z > player_z - View_depth - 2 * Cube_size)
+    # the rings are in one or two parts of the buffer
+    first = min(visible, tunnel.rings - tunnel.head)
+    ranges = [(tunnel.head * 8, first * 8), (0, (visible - first) * 8)]
+    if Retained:
+        if Tunnel_source is not tunnel:
+            # new tunnel, upload all of it
+            Tunnel_batch.set(tunnel.vertices)
+            Tunnel_source = tunnel
+        elif tunnel.changed.any():
+            # rings change only when they are recycled, upload those
+            for i in np.flatnonzero(tunnel.changed):
+                Tunnel_batch.update(i * 8, tunnel.vertices[i])
+        tunnel.changed.fill(False)
+        Tunnel_batch.draw(ranges)
+    else:
+        glBegin(GL_QUADS)
+        for i in range(visible):
+            draw_cube(tunnel.vertices[(tunnel.head + i) % tunnel.rings])
+        glEnd()
+    if Shading:
+        Shading.end()
+
+
+def draw_hud():
+    """Draw the score in the top left corner of the screen.
+    :return: nothing."""
+
+    if Hud_font not in Labels.atlases:
+        # not loaded before the first frame, to show it sooner
+        return
+    # height of the text is 1/20 of the screen
+    draw_screen_text([str(Game.score)], -0.95, 0.95, 0.1, Hud_font)
+
+
+def draw_overlay():
+    """Draw the percentiles of frame times in the top right corner of the screen, if they are shown.
+    :return: nothing."""
+
+    global Overlay_lines
+    if not Overlay or profiler.Active is None:
+        return
+    recorder = profiler.Active
+    if recorder.frames % Overlay_interval == 0 or not Overlay_lines:
+        # percentiles of the last frames, not worth computing every frame
+        summary = recorder.percentiles()
+        Overlay_lines = ["ms  " + "  ".join("p%d" % p for p in profiler.Percentiles)]
+        for name, times in zip(("frame",) + profiler.Phases, summary.T):
+            Overlay_lines.append("%s  %s" % (name, "  ".join("%.2f" % t for t in times)))
+    draw_screen_text(Overlay_lines, 0.5, 0.95, 0.04, Overlay_font)
+
+
+def draw_screen_text(lines, x, y, h, font):
+    """Draw lines of text over the game, in screen coordinates, -1 to 1 in both directions.
+    :param lines: list of strings, the first at the top.
+    :param x: left of the text.
+    :param y: top of the text.
+    :param h: height of a line, the width keeps the aspect ratio of the text.
+    :param font: index of the font.
+    :return: nothing."""
+
+    # no perspective, no fog
+    glMatrixMode(GL_PROJECTION)
+    glPushMatrix()
+    glLoadIdentity()
+    glMatrixMode(GL_MODELVIEW)
+    glLoadIdentity()
+    glDisable(GL_DEPTH_TEST)
+    glDisable(GL_FOG)
+    glEnable(GL_BLEND)
+    glColor(Game.palette.negative)
+    for s in lines:
+        y -= h
+        w = h * Size[1] / Size[0] / Labels.aspect(s, font)
+        Labels.draw(s, [(x, y, 0), (x, y + h, 0), (x + w, y + h, 0), (x + w, y, 0)], font)
+    glDisable(GL_BLEND)
+    glEnable(GL_FOG)
+    glEnable(GL_DEPTH_TEST)
+    glMatrixMode(GL_PROJECTION)
+    glPopMatrix()
+    glMatrixMode(GL_MODELVIEW)
+    glBindTexture(GL_TEXTURE_2D, texture)
+
 
-    # keep Current_X and Current_Y in bounds
-    # moving left
-    if dx < 0 and Current_X + dx < x_low:
-        dx = x_low - Current_X
-    # moving right
-    if dx > 0 and Current_X + dx > x_high:
-        dx = x_high - Current_X
-    # moving down
-    if dy < 0 and Current_Y + dy < y_low:
-        dy = y_low - Current_Y
-    # moving up
-    if dy > 0 and Current_Y + dy > y_high:
-        dy = y_high - Current_Y
-
-    # update current position
-    Current_X += dx
-    Current_Y += dy
-    return dx, dy
-
-
-def update_boundaries():
-    """Update the boundaries and draw them.
+def draw_obstacles(alpha=1.0):
+    """Draw the obstacles, in the current color.
+    :param alpha: fraction of the way from the previous tick to the current one.
     :return: nothing."""
 
-    global Boundaries
-    # update boundaries to check if the player has crossed them
-    for boundary in Boundaries:
-        boundary.update()
-    # delete passed boundaries and initialize them to new ones
-    while Boundaries[0].has_passed:
-        Boundaries.append(Boundaries.popleft())
-        Boundary.__init__(Boundaries[-1])
-    # draw all boundaries
-    glBegin(GL_QUADS)
-    for boundary in Boundaries:
-        boundary.draw()
-    glEnd()
-
-
-def update_obstacles():
-    """Update the obstacles and delete the ones that are behind and check if any obstacle is hit.
-    :return: True if any obstacle is hit, False otherwise."""
-
-    global Obstacles, Next_Obstacle, Deleted_obstacles
-    if abs(Next_Obstacle) < Speed / 2:
-        # set timer for next obstacle
-        Next_Obstacle = random.randint(2, 5)
-        # create a new obstacle
-        if not Deleted_obstacles:
-            # no obstacle available to reuse, create new
-            Obstacles.append(Obstacle())
-        else:
-            # reinitialise and use a deleted obstacle
-            Obstacle.__init__(Deleted_obstacles[-1])
-            Obstacles.append(Deleted_obstacles.pop())
+    # moving obstacles are drawn in between ticks too
+    centers = Game.cube_centers() if alpha >= 1 else Game.cube_centers(Game.ticks - 1 + alpha)
+    # only cubes in view and in front of the fog, tested in eye space with a sphere around each cube
+    depth = min(View_depth, Obstacle_depth)
+    tangent = np.tan(np.radians(Field_of_view) / 2)
+    eye = centers + Game.position(alpha, Ahead)
+    # cubes of patterns with larger grids are smaller
+    sizes = Game.cube_sizes()
+    visible = render.in_view(eye, sizes * np.sqrt(3), (tangent * Size[0] / Size[1], tangent), Near, depth)
+    centers, sizes = centers[visible], sizes[visible]
+    # smaller and more of them with --split, only drawn
+    centers, size = render.subdivide(centers, sizes, Split)
+    # obstacles appear nearer than the end of the tunnel, they come out of a fog of their own
+    set_fog(depth)
+    instanced = Retained and Instanced and Obstacle_instances
+    if Shading and not instanced:
+        # instances have shaders of their own
+        Shading.begin(Game.palette)
+    if instanced:
+        # only the centers go to the GPU
+        Obstacle_instances.set(centers, size, Game.palette.color)
+        Obstacle_instances.draw(True, Game.palette if Shading else None)
+    elif Retained:
+        Obstacle_batch.set(render.cube_faces(Cube_mesh, centers, size))
+        Obstacle_batch.draw()
     else:
-        # reduce waiting time
-        Next_Obstacle -= Speed
-    k = False
-    for obstacle in Obstacles:
-        # check if current position collides with an obstacle
-        if obstacle.collide():
-            k = True
-        # update the obstacle
-        obstacle.update()
-    while Obstacles and Obstacles[0].has_passed:
-        # it's out of the field of view, delete
-        Deleted_obstacles.append(Obstacles.popleft())
-    # draw all obstacles
-    glBegin(GL_QUADS)
-    for obstacle in Obstacles:
-        obstacle.draw()
-    glEnd()
-    return k
+        glBegin(GL_QUADS)
+        for cube in render.cube_faces(Cube_mesh, centers, size):
+            draw_cube(cube)
+        glEnd()
+    if Shading and not instanced:
+        Shading.end()
+    set_fog(View_depth)
+
+
+def draw_ghosts(alpha=1.0):
+    """Draw the ghosts, translucent, all in one batch. A ghost is at the same z as the player in every tick, so
+    each is shown where it crossed ghosts.Lead ahead of the player, the way it took through what is coming.
+    :param alpha: fraction of the way from the previous tick to the current one.
+    :return: nothing."""
+
+    # ticks to move ghosts.Lead at the current speed
+    positions = Ghosts.positions(Game.ticks - 1 + alpha + ghosts.Lead / Game.speed)
+    if not len(positions):
+        return
+    centers = np.empty((len(positions), 3))
+    centers[:, :2] = -positions
+    centers[:, 2] = -Game.position(alpha)[2] - ghosts.Lead
+    # seen through each other and through obstacles, in the negative of the color
+    glEnable(GL_BLEND)
+    glDepthMask(GL_FALSE)
+    glColor(tuple(Game.palette.negative) + (ghosts.Alpha,))
+    if Retained:
+        Ghost_batch.set(render.cube_faces(Cube_mesh, centers, ghosts.Marker))
+        Ghost_batch.draw()
+    else:
+        glBegin(GL_QUADS)
+        for cube in render.cube_faces(Cube_mesh, centers, ghosts.Marker):
+            draw_cube(cube)
+        glEnd()
+    glDepthMask(GL_TRUE)
+    glDisable(GL_BLEND)
+
+
+def set_fog(depth):
+    """Set the linear fog to end at a distance.
+    :param depth: distance where everything is the color of the fog.
+    :return: nothing."""
+
+    glFogf(GL_FOG_START, depth * Fog_start)
+    glFogf(GL_FOG_END, depth)
 
 
 def generate_play_button():
@@ -579,26 +769,8 @@ def generate_play_button():
     :return: nothing."""
 
     global Play_button_texture
-    # set size and create surface
-    size = (100, 100)
-    t = pg.Surface(size, SRCALPHA)
-    # clear background
-    t.fill((0, 0, 0, 0))
-    # draw circle and triangle
-    pg.draw.circle(t, (200, 200, 200, 200), (50, 50), 40, 10)
-    pg.draw.polygon(t, (200, 200, 200, 200), ((70, 50), (40, 70), (40, 30)), 0)
-    
-    # convert image to string
-    t = pg.image.tostring(t, "RGBA", True)
-    # create new texture
-    Play_button_texture = glGenTextures(1)
-    # bind it
-    glBindTexture(GL_TEXTURE_2D, Play_button_texture)
-    # set parameters
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-    # add image to texture
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, size[0], size[1], 0, GL_RGBA, GL_UNSIGNED_BYTE, t)
+    # generated once and cached on disk, with mipmaps
+    Play_button_texture = textures.load("play", Texture_size)
 
 
 def generate_texture():
@@ -606,86 +778,38 @@ def generate_texture():
     :return: nothing."""
 
     global texture
-    # size
-    size = (100, 100)
-    # white surface reflects the color indicated by glColor
-    t = pg.Surface(size)
-    t.fill((255, 255, 255))
-    # another surface to draw patterns with transparency
-    m = pg.Surface(size, SRCALPHA)
-    # draw black transparent squares to get shades
-    for i in range(9, 31):
-        m.fill((0, 0, 0, 0))
-        pg.draw.rect(m, (0, 0, 0, 30 + i / 2.0),
-                     (i * size[0] / 100.0, i * size[1] / 100.0,
-                      size[0] - size[0] / 50.0 * i,
-                      size[1] - size[1] / 50.0 * i), 0)
-        t.blit(m, (0, 0))
-    # convert image to string
-    t = pg.image.tostring(t, "RGBA", True)
-    # create new texture
-    texture = glGenTextures(1)
-    # bind it
-    glBindTexture(GL_TEXTURE_2D, texture)
-    # set parameters
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-    # add image to texture
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, size[0], size[1], 0, GL_RGBA, GL_UNSIGNED_BYTE, t)
-
-
-def string_to_texture(s):
-    """Create a texture of the string that can be displayed on a quad.
-    :param s: string to be displayed.
-    :returns: texture object and aspect ratio."""
-
-    # create a font object and render the text on a pygame surface
-    font = pg.font.Font("font"+str(random.randint(0, 4))+".ttf", 150).render(s, True, (255, 255, 255, 255))
-    # size of surface
-    sx, sy = font.get_width(), font.get_height()
-    # convert the surface to RGBA string
-    data = pg.image.tostring(font, "RGBA", True)
-    # create new texture
-    text = glGenTextures(1)
-    # bind it to 2D texture
-    glBindTexture(GL_TEXTURE_2D, text)
-    # set parameters for different sized mapping
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
-    # add image to texture
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, sx, sy, 0, GL_RGBA, GL_UNSIGNED_BYTE, data)
-    return text, float(sy) / sx
-
-
-def change_color():
-    """Change color of boundary and obstacles with time.
-    :return: nothing."""
-
-    global game_color, Color_change, Next_color, Color_difference
-    if Color_change:        # wait to change
-        Color_change -= 1   # reduce wait time
-    else:
-        if Next_color:          # if transition going on
-            Next_color -= 1     # modify color
-            game_color += Color_difference
-            # check if it is black
-            if (game_color < np.array((0.2,))).all():
-                game_color += 0.5
-        else:   # transition complete
-            Color_change = random.randint(100, 200)     # set new color and transition parameters
-            Next_color = random.randint(50, 100)
-            Color_difference = ((random.random() - game_color[0]) / Next_color,
-                                (random.random() - game_color[1]) / Next_color,
-                                (random.random() - game_color[2]) / Next_color)
+    # generated once and cached on disk, with mipmaps
+    texture = textures.load("glow", Texture_size)
 
 
 def clear():
-    """Utility function to clear buffers.
+    """Utility function to clear buffers. Starts drawing the scene of a frame, into the framebuffer if there is one.
     :return: nothing."""
 
+    if Framebuffer:
+        Framebuffer.bind(Resolution.scale)
+        if Gpu_timer:
+            Gpu_timer.begin()
     glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
 
+def present():
+    """Scale the scene of a frame up to the window, if it was drawn into the framebuffer. Text drawn after this is
+    drawn at the resolution of the window. The time of the frame adjusts the scale of the next ones.
+    :return: nothing."""
+
+    if not Framebuffer:
+        return
+    if Gpu_timer:
+        Gpu_timer.end()
+    Framebuffer.present()
+    if Scale is None:
+        # the GPU time of a frame a few frames ago, or the time between frames
+        ms = Gpu_timer.read() if Gpu_timer else Clock.get_rawtime()
+        if ms is not None:
+            Resolution.update(ms)
+
+
 def draw_quad(face):
     """Draws a quad with corresponding texture.
     :param face: the quad to be drawn.
@@ -708,54 +832,129 @@ def draw_cube(cube):
         draw_quad(face)
 
 
-def collide_cube(cube):
-    """Test if the current position collides with an obstacle.
-    :parameter cube: the boundary of an obstacle.
-    :return: boolean value which is true if any of the points corresponding to current position is inside cube."""
-
-    global Current_X, Current_Y, Current_Z
-    # points to be tested
-    points = [(-Current_X + x, -Current_Y + y)
-              for x in [Cube_size * 2 - Bound, Bound - Cube_size * 2]
-              for y in [Cube_size * 2 - Bound, Bound - Cube_size * 2]]
-
-    # get min and max values of x, y, z
-    x, y, z = set(), set(), set()
-    for face in cube:
-        for vertex in face:
-            x.add(vertex[0])
-            y.add(vertex[1])
-            z.add(vertex[2])
-    x1, x2 = sorted(x)
-    y1, y2 = sorted(y)
-    z1, z2 = sorted(z)
-
-    # check if Current_Z is relevant
-    if z1 + Cube_size / 3.0 <= Gap_Z - Current_Z <= z2 - Cube_size / 3.0:
-        # test if points are in the square
-        for x, y in points:
-            if x1 <= x <= x2 and y1 <= y <= y2:
-                return True
-    return False
-
-
-def translation_matrix(d):
-    """Transformation matrix to move a point from (x, y, z) to (dx, dy, dz).
-    :parameter d: packed dx, dy, dz.
-    :return: transformation matrix."""
-
-    dx, dy, dz = d
-    return np.array(((1,        0,      0,      0),
-                     (0,        1,      0,      0),
-                     (0,        0,      1,      0),
-                     (dx,       dy,     dz,     1)))
+def default_player():
+    """Name of the player when none is given: the name of the user.
+    :return: the name."""
+
+    try:
+        return getpass.getuser()
+    except (KeyError, ImportError, OSError):
+        # no user name in the environment or the password database
+        return Player
+
+
+def window_size(value):
+    """Size of the window from the command line.
+    :param value: width and height, as 1280x720.
+    :return: tuple of width and height."""
+
+    try:
+        width, height = [int(n) for n in value.lower().split("x")]
+    except ValueError:
+        raise argparse.ArgumentTypeError("%s is not a size like 1280x720" % value)
+    if width <= 0 or height <= 0:
+        raise argparse.ArgumentTypeError("%s is not a size like 1280x720" % value)
+    return width, height
+
+
+def parse(argv):
+    """Parse command line arguments.
+    :param argv: list of arguments.
+    :return: parsed arguments."""
+
+    parser = argparse.ArgumentParser(description="Run: 3D")
+    parser.add_argument("--tick-rate", type=int, default=Tick_rate,
+                        help="ticks of the game in a second, %d plays at the original speed" % Tick_rate)
+    parser.add_argument("--fps", type=int, default=Frame_limit, help="most frames in a second, 0 for no limit")
+    parser.add_argument("--view-depth", type=float, default=View_depth,
+                        help="distance to the end of the view, the tunnel fades into fog before it")
+    parser.add_argument("--dense", action="store_true",
+                        help="dense mode: %dx obstacles, drawn with --split %d unless it is given" %
+                        (Dense_density, Dense_split))
+    parser.add_argument("--split", type=int, metavar="N",
+                        help="draw each obstacle cube as N ** 3 smaller cubes. Only drawn: obstacles are made and hit "
+                             "as whole cubes")
+    parser.add_argument("--record", metavar="DIRECTORY",
+                        help="record every game to a file in this directory, to play it again with replay.py")
+    parser.add_argument("--windowed", nargs="?", const=Window_size, type=window_size, metavar="WIDTHxHEIGHT",
+                        help="play in a window, %dx%d by default, instead of full screen" % Window_size)
+    parser.add_argument("--scale", type=float, metavar="S",
+                        help="draw the scene at S times the resolution of the screen, from %.1f to 1. "
+                             "By default the scale is adjusted to keep frames at --target-ms" % render.Min_scale)
+    parser.add_argument("--target-ms", type=float, default=Target_ms,
+                        help="time of a frame the resolution is adjusted to keep, %.1f ms by default" % Target_ms)
+    parser.add_argument("--fixed-function", action="store_true",
+                        help="draw boundary and obstacles with glColor and the fixed pipeline, not shaders")
+    parser.add_argument("--ghosts", metavar="PACK",
+                        help="race the ghosts of a pack made with ghosts.py, on the seed most of them played")
+    parser.add_argument("--most-ghosts", type=int, metavar="N", help="race only the N best ghosts of the pack")
+    parser.add_argument("--input", choices=("late", "classic"), default="late",
+                        help="late: read the mouse as late as the frame allows and draw the view ahead with it. "
+                             "classic: read it once a tick right after the wait and draw in between ticks")
+    parser.add_argument("--latency", action="store_true",
+                        help="measure the latency from input to photon of every frame, and print it on exit")
+    parser.add_argument("--latency-out", metavar="PATH",
+                        help="write the latency of every frame to a .csv file on exit, implies --latency")
+    parser.add_argument("--player", default=default_player(), help="name of the player in the score log")
+    parser.add_argument("--scores", default=scores.Path, metavar="PATH",
+                        help="file to save scores to, with an index next to it. Empty to not save them")
+    parser.add_argument("--leaderboard", metavar="URL", help="upload scores to this leaderboard as they are saved")
+    parser.add_argument("--profile", action="store_true", help="record how long each part of a frame takes")
+    parser.add_argument("--profile-out", metavar="PATH",
+                        help="write the recorded frame times to a .csv or .json file on exit, implies --profile")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print how long each phase of startup took, up to the first frame")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
+    arguments = parse(sys.argv[1:])
+    Profile_startup = arguments.profile_startup
+    Tick_rate, Frame_limit = arguments.tick_rate, arguments.fps
+    Record_directory = arguments.record
+    View_depth = arguments.view_depth
+    Target_ms = arguments.target_ms
+    if arguments.scale is not None:
+        Scale = min(max(arguments.scale, render.Min_scale), 1.0)
+    Windowed = arguments.windowed
+    Shaded = not arguments.fixed_function
+    if View_depth > Rings * Ring_gap:
+        # a longer tunnel to fill the view. Obstacles appear as far ahead as before
+        Game = World(rings=int(np.ceil(View_depth / Ring_gap)) + 1)
+    if arguments.dense:
+        Split = Dense_split
+        Game.density = Dense_density
+    if arguments.split:
+        Split = arguments.split
+    if arguments.profile or arguments.profile_out:
+        profiler.enable()
+    Player = arguments.player
+    Late_input = arguments.input == "late"
+    if arguments.latency or arguments.latency_out:
+        Latency = latency.Meter()
+    if arguments.ghosts:
+        Ghost_pack = ghosts.Pack(arguments.ghosts)
+        Ghosts = ghosts.Ghosts(Ghost_pack, Ghost_pack.seed(), Game.density, arguments.most_ghosts)
+        print("racing %d ghosts on seed %s" % (len(Ghosts), Ghost_pack.seed()))
+        Game.reset(Ghost_pack.seed())
+    if arguments.scores:
+        Scores = scores.Scores(arguments.scores, arguments.leaderboard)
     start("No Fire, No Mountain. But RUN RUN RUN :P")
+    # the first game starts with the whole tunnel
+    record_game(Game.tunnel.rings)
     kl = 1
     while kl:
         kl = play()
         if kl == 2:
-            restart()
+            kl = restart()
+    stop_recording()
+    if Scores:
+        # the last score is saved, uploads left are made the next time
+        Scores.close()
     stop()
+    if arguments.profile_out and profiler.Active is not None:
+        profiler.Active.dump(arguments.profile_out)
+    if Latency:
+        print("%s input: %s" % (arguments.input, Latency.report()))
+        if arguments.latency_out:
+            Latency.dump(arguments.latency_out)
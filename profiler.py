@@ -0,0 +1,124 @@
+#################################################
+#                   Run: 3D                     #
+#         time spent in each part of frames     #
+#################################################
+
+# imports
+import csv
+import json
+import time
+import numpy as np
+
+# globals
+Phases = ("wait", "events", "input", "palette", "boundaries", "obstacles", "collision", "draw", "hud", "flip",
+          "other")          # parts of a frame, in the order they happen
+Columns = dict((name, i) for i, name in enumerate(Phases))     # column of each phase in the records
+Capacity = 1024             # number of frames kept, older frames are overwritten
+Percentiles = (50, 95, 99)  # percentiles of frame times that are shown
+Timer = getattr(time, "perf_counter", time.time)    # most precise clock there is
+Active = None               # the profiler recording, None if profiling is off
+
+
+class Profiler:
+    """Records the time spent in each phase of the last frames, in a fixed size ring buffer.
+    A phase is the time from the previous mark to the mark with its name. Marks with the same name in a frame add up."""
+
+    def __init__(self, capacity=Capacity):
+        # seconds spent in each phase, one row for each frame
+        self.times = np.zeros((capacity, len(Phases)))
+        # number of frames recorded, the next frame goes to row frames % capacity
+        self.frames = 0
+        # times of the frame going on, kept in a list as it is faster to add to
+        self.current = [0.0] * len(Phases)
+        # time of the last mark or the start of the frame
+        self.last = Timer()
+
+    def mark(self, name):
+        """End a phase.
+        :param name: name of the phase, one of Phases.
+        :return: nothing."""
+
+        t = Timer()
+        self.current[Columns[name]] += t - self.last
+        self.last = t
+
+    def frame(self, keep=True):
+        """End a frame and start the next. The time since the last mark is counted as "other".
+        :param keep: False to drop the frame, for time spent outside of frames.
+        :return: nothing."""
+
+        t = Timer()
+        if keep:
+            self.current[-1] += t - self.last
+            self.times[self.frames % len(self.times)] = self.current
+            self.frames += 1
+        self.current = [0.0] * len(Phases)
+        self.last = t
+
+    def records(self):
+        """Times of the recorded frames, oldest first.
+        :return: array of milliseconds, one row for each frame and one column for each phase."""
+
+        n = len(self.times)
+        if self.frames <= n:
+            return self.times[:self.frames] * 1000
+        # the oldest frame is the one that will be overwritten next
+        i = self.frames % n
+        return np.concatenate((self.times[i:], self.times[:i])) * 1000
+
+    def percentiles(self):
+        """Percentiles of the time of frames and of each phase.
+        :return: array of milliseconds, one row for each of Percentiles, frame time first and then each phase."""
+
+        records = self.records()
+        if not len(records):
+            return np.zeros((len(Percentiles), len(Phases) + 1))
+        records = np.column_stack((records.sum(1), records))
+        return np.percentile(records, Percentiles, axis=0)
+
+    def dump(self, path):
+        """Write the recorded frames to a file, CSV or JSON by its extension.
+        :param path: name of the file, ending in .csv or .json.
+        :return: nothing."""
+
+        records = self.records()
+        if path.lower().endswith(".csv"):
+            with open(path, "w") as f:
+                writer = csv.writer(f)
+                writer.writerow(("frame", "total") + Phases)
+                first = self.frames - len(records)
+                for i, row in enumerate(records):
+                    writer.writerow([first + i, "%.4f" % row.sum()] + ["%.4f" % t for t in row])
+            return
+        summary = self.percentiles()
+        with open(path, "w") as f:
+            json.dump({"phases": Phases,
+                       "units": "ms",
+                       "percentiles": dict(("p%d" % p, dict(zip(("total",) + Phases, row.round(4).tolist())))
+                                           for p, row in zip(Percentiles, summary)),
+                       "first_frame": self.frames - len(records),
+                       "frames": records.round(4).tolist()}, f, indent=1)
+
+
+def ignore(*args):
+    """Does nothing, in place of mark and frame while profiling is off.
+    :return: nothing."""
+
+    pass
+
+
+# end a phase and end a frame. Calls nothing but an empty function while profiling is off
+mark = ignore
+frame = ignore
+
+
+def enable(capacity=Capacity):
+    """Start recording. Calls to mark and frame go to a new profiler.
+    :param capacity: number of frames kept.
+    :return: the profiler."""
+
+    global Active, mark, frame
+    Active = Profiler(capacity)
+    mark, frame = Active.mark, Active.frame
+    return Active
+
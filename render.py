@@ -0,0 +1,677 @@
+#################################################
+#                   Run: 3D                     #
+#            retained mode rendering            #
+#################################################
+
+# imports
+import ctypes
+import numpy as np
+from OpenGL.GL import (glAttachShader, glBindAttribLocation, glBindBuffer, glBufferData, glBufferSubData,
+                       glCompileShader, glCreateProgram, glCreateShader, glDeleteBuffers, glDeleteProgram,
+                       glDeleteShader, glDisableClientState, glDisableVertexAttribArray, glDrawArrays,
+                       glEnableClientState, glEnableVertexAttribArray, glGenBuffers, glGetProgramInfoLog,
+                       glGetProgramiv, glGetShaderInfoLog, glGetShaderiv, glGetUniformLocation, glLinkProgram,
+                       glShaderSource, glTexCoordPointer, glUniform1f, glUniform1i, glUniform3fv, glUseProgram,
+                       glVertexAttribPointer, glVertexPointer, glViewport,
+                       glBeginQuery, glDeleteQueries, glEndQuery, glGenQueries, glGetQueryObjectuiv,
+                       glGetQueryObjectui64v, GL_ARRAY_BUFFER, GL_COLOR_ATTACHMENT0, GL_COLOR_BUFFER_BIT,
+                       GL_COMPILE_STATUS, GL_DEPTH_ATTACHMENT, GL_DEPTH_COMPONENT24, GL_DRAW_FRAMEBUFFER,
+                       GL_DYNAMIC_DRAW, GL_FALSE, GL_FLOAT, GL_FRAGMENT_SHADER, GL_FRAMEBUFFER,
+                       GL_FRAMEBUFFER_COMPLETE, GL_LINEAR, GL_LINK_STATUS, GL_QUADS, GL_QUERY_RESULT,
+                       GL_QUERY_RESULT_AVAILABLE, GL_READ_FRAMEBUFFER, GL_RENDERBUFFER, GL_RGBA8, GL_STATIC_DRAW,
+                       GL_TEXTURE_COORD_ARRAY, GL_TIME_ELAPSED, GL_VERTEX_ARRAY, GL_VERTEX_SHADER)
+from OpenGL.error import GLError, NullFunctionError
+from OpenGL.extensions import alternate
+import OpenGL.GL
+import OpenGL.GL.ARB.draw_instanced
+import OpenGL.GL.ARB.instanced_arrays
+import OpenGL.GL.EXT.framebuffer_object
+import OpenGL.GL.EXT.framebuffer_blit
+
+# texture coordinates of the 4 corners of a quad, same order as draw_quad in main
+Quad_texture = np.array(((0, 0), (0, 1), (1, 1), (1, 0)), np.float32)
+# bytes per vertex. x, y, z, s, t interleaved as float32
+Stride = 5 * 4
+# bytes per instance. x, y, z of the center, half the size, r, g, b as float32
+Instance_stride = 7 * 4
+# resolution scaling
+Min_scale = 0.4             # smallest scale of the resolution the scene is drawn at
+Window = 20                 # frames whose median time the scale is adjusted to
+Over = 1.1                  # frames slower than the target by this much make the scale smaller
+Headroom = 0.8              # frames faster than this much of the target make it larger
+Step_down, Step_up = 0.15, 0.05     # largest change of the scale at once, it drops fast and grows slowly
+Quantum = 0.025             # the scale is a multiple of this, so that it does not change by tiny steps
+Queries = 4                 # timer queries in flight, results are read a few frames late so that nothing waits
+
+# instancing from OpenGL 3.3, or the extensions that added it to older versions
+glDrawArraysInstanced = alternate("glDrawArraysInstanced", OpenGL.GL.glDrawArraysInstanced,
+                                  OpenGL.GL.ARB.draw_instanced.glDrawArraysInstancedARB)
+glVertexAttribDivisor = alternate("glVertexAttribDivisor", OpenGL.GL.glVertexAttribDivisor,
+                                  OpenGL.GL.ARB.instanced_arrays.glVertexAttribDivisorARB)
+# framebuffer objects from OpenGL 3.0, or the extensions that added them to older versions
+glGenFramebuffers = alternate("glGenFramebuffers", OpenGL.GL.glGenFramebuffers,
+                              OpenGL.GL.EXT.framebuffer_object.glGenFramebuffersEXT)
+glBindFramebuffer = alternate("glBindFramebuffer", OpenGL.GL.glBindFramebuffer,
+                              OpenGL.GL.EXT.framebuffer_object.glBindFramebufferEXT)
+glDeleteFramebuffers = alternate("glDeleteFramebuffers", OpenGL.GL.glDeleteFramebuffers,
+                                 OpenGL.GL.EXT.framebuffer_object.glDeleteFramebuffersEXT)
+glFramebufferRenderbuffer = alternate("glFramebufferRenderbuffer", OpenGL.GL.glFramebufferRenderbuffer,
+                                      OpenGL.GL.EXT.framebuffer_object.glFramebufferRenderbufferEXT)
+glCheckFramebufferStatus = alternate("glCheckFramebufferStatus", OpenGL.GL.glCheckFramebufferStatus,
+                                     OpenGL.GL.EXT.framebuffer_object.glCheckFramebufferStatusEXT)
+glGenRenderbuffers = alternate("glGenRenderbuffers", OpenGL.GL.glGenRenderbuffers,
+                               OpenGL.GL.EXT.framebuffer_object.glGenRenderbuffersEXT)
+glBindRenderbuffer = alternate("glBindRenderbuffer", OpenGL.GL.glBindRenderbuffer,
+                               OpenGL.GL.EXT.framebuffer_object.glBindRenderbufferEXT)
+glRenderbufferStorage = alternate("glRenderbufferStorage", OpenGL.GL.glRenderbufferStorage,
+                                  OpenGL.GL.EXT.framebuffer_object.glRenderbufferStorageEXT)
+glDeleteRenderbuffers = alternate("glDeleteRenderbuffers", OpenGL.GL.glDeleteRenderbuffers,
+                                  OpenGL.GL.EXT.framebuffer_object.glDeleteRenderbuffersEXT)
+glBlitFramebuffer = alternate("glBlitFramebuffer", OpenGL.GL.glBlitFramebuffer,
+                              OpenGL.GL.EXT.framebuffer_blit.glBlitFramebufferEXT)
+
+# each vertex of the mesh is moved to the center of its instance and scaled to its size.
+# color, texture and linear fog are combined the same way as in the fixed pipeline
+Vertex_shader = """
+#version 120
+attribute vec3 position;
+attribute vec2 texcoord;
+attribute vec4 offset;
+attribute vec3 color;
+varying vec2 uv;
+varying vec3 tint;
+void main() {
+    uv = texcoord;
+    tint = color;
+    vec4 eye = gl_ModelViewMatrix * vec4(offset.xyz + position * offset.w, 1.0);
+    gl_FogFragCoord = abs(eye.z);
+    gl_Position = gl_ProjectionMatrix * eye;
+}
+"""
+Fragment_shader = """
+#version 120
+uniform sampler2D image;
+uniform bool fog;
+varying vec2 uv;
+varying vec3 tint;
+void main() {
+    vec4 color = texture2D(image, uv) * vec4(tint, 1.0);
+    if (fog) {
+        color.rgb = mix(gl_Fog.color.rgb, color.rgb, clamp((gl_Fog.end - gl_FogFragCoord) * gl_Fog.scale, 0.0, 1.0));
+    }
+    gl_FragColor = color;
+}
+"""
+# boundary and obstacles drawn from quads, with the color made in the fragment shader
+Quad_vertex_shader = """
+#version 120
+varying vec2 uv;
+void main() {
+    uv = gl_MultiTexCoord0.xy;
+    vec4 eye = gl_ModelViewMatrix * gl_Vertex;
+    gl_FogFragCoord = abs(eye.z);
+    gl_Position = gl_ProjectionMatrix * eye;
+}
+"""
+# the color of the palette from its transition, times the glow texture. Sampled from its mipmaps, the steps of the
+# glow are filtered on distant faces as in the fixed pipeline. Then the linear fog
+Shaded_fragment = """
+#version 120
+uniform sampler2D image;
+uniform vec3 start;
+uniform vec3 end;
+uniform float progress;
+uniform bool fog;
+varying vec2 uv;
+void main() {
+    vec3 color = clamp(mix(start, end, progress), 0.0, 1.0) * texture2D(image, uv).rgb;
+    if (fog) {
+        color = mix(gl_Fog.color.rgb, color, clamp((gl_Fog.end - gl_FogFragCoord) * gl_Fog.scale, 0.0, 1.0));
+    }
+    gl_FragColor = vec4(color, 1.0);
+}
+"""
+# attribute locations, position at 0 as some drivers need attribute 0 to draw
+Attributes = ("position", "texcoord", "offset", "color")
+
+
+def cube_faces(mesh, centers, size):
+    """Faces of cubes of the same mesh.
+    :param mesh: faces of a cube from -1 to 1, shape (6, 4, 3).
+    :param centers: centers of the cubes, shape (n, 3).
+    :param size: half the size of the cubes, one for all or one for each cube.
+    :return: array of shape (n, 6, 4, 3)."""
+
+    size = np.asarray(size)
+    return mesh * (size[:, None, None, None] if size.ndim else size) + np.asarray(centers)[:, None, None, :]
+
+
+def in_view(points, radius, tangents, near, far):
+    """Test which spheres are at least partly inside a view frustum, to skip drawing the rest.
+    :param points: centers of the spheres in eye space, the camera at the origin looking along -z. Shape (n, 3).
+    :param radius: radius of the spheres, one for all or one for each sphere.
+    :param tangents: tangents of half the field of view, horizontal and vertical.
+    :param near: distance of the near plane.
+    :param far: distance of the far plane.
+    :return: array of bools, True for spheres to draw."""
+
+    depth = -points[:, 2]
+    inside = (depth + radius > near) & (depth - radius < far)
+    for axis, tangent in enumerate(tangents):
+        # distance from the side plane, positive outside
+        inside &= (np.abs(points[:, axis]) - depth * tangent) <= radius * np.sqrt(1 + tangent * tangent)
+    return inside
+
+
+def subdivide(centers, size, parts):
+    """Split cubes into smaller cubes that fill them.
+    :param centers: centers of the cubes, shape (n, 3).
+    :param size: half the size of the cubes, one for all or one for each cube.
+    :param parts: number of smaller cubes along each edge.
+    :return: centers of shape (n * parts ** 3, 3) and half the size of the smaller cubes."""
+
+    if parts == 1:
+        return centers, size
+    # centers of the smaller cubes relative to the center of a cube of size 1
+    steps = (np.arange(parts) * 2 + 1 - parts) / float(parts)
+    offsets = np.stack(np.meshgrid(steps, steps, steps, indexing="ij"), -1).reshape(-1, 3)
+    size = np.asarray(size)
+    if size.ndim:
+        # each of the smaller cubes has the size of its cube
+        return ((np.asarray(centers)[:, None, :] + offsets * size[:, None, None]).reshape(-1, 3),
+                np.repeat(size / parts, len(offsets)))
+    return (np.asarray(centers)[:, None, :] + offsets * size).reshape(-1, 3), size / parts
+
+
+class QuadBatch:
+    """A batch of textured quads stored in a vertex buffer object and drawn with a single glDrawArrays call.
+    Client side vertex arrays are used instead if vertex buffer objects are not supported."""
+
+    def __init__(self):
+        # interleaved vertex data (x, y, z, s, t), grows when more quads are set
+        self.data = np.zeros((0, 5), np.float32)
+        # number of vertices in use
+        self.count = 0
+        # vertex buffer object, None if the driver has none and client side arrays are used
+        self.buffer = glGenBuffers(1) if bool(glGenBuffers) else None
+        # True if all data has to be uploaded
+        self.dirty = False
+        # (first vertex, number of vertices) of parts that have changed since the last upload
+        self.changes = []
+
+    def set(self, faces, texture=None):
+        """Replace the quads of the batch.
+        :param faces: array like of quads, any shape ending in (4, 3) or (4, 4). w is ignored.
+        :param texture: texture coordinates of each vertex, shape (n, 4, 2). Default maps each quad fully.
+        :return: nothing."""
+
+        faces = np.asarray(faces, np.float32)
+        faces = faces.reshape(-1, 4, faces.shape[-1]) if faces.size else faces.reshape(0, 4, 3)
+        count = len(faces) * 4
+        if count > len(self.data):
+            # double the capacity to avoid reallocation on small growth
+            self.data = np.zeros((max(count, 2 * len(self.data)), 5), np.float32)
+        # view of the used part, one row of 4 vertices for each quad
+        quads = self.data[:count].reshape(-1, 4, 5)
+        quads[:, :, :3] = faces[:, :, :3]
+        quads[:, :, 3:] = Quad_texture if texture is None else texture
+        self.count = count
+        self.dirty = True
+
+    def update(self, first, faces):
+        """Replace some quads of the batch and keep the rest. Texture coordinates are not changed.
+        :param first: index of the first quad to replace.
+        :param faces: array like of quads, any shape ending in (4, 3) or (4, 4). w is ignored.
+        :return: nothing."""
+
+        faces = np.asarray(faces)
+        faces = faces.reshape(-1, 4, faces.shape[-1])
+        start, count = first * 4, len(faces) * 4
+        self.data[start:start + count, :3] = faces[:, :, :3].reshape(-1, 3)
+        self.changes.append((start, count))
+
+    def draw(self, ranges=None):
+        """Draw quads of the batch with the current color and texture.
+        :param ranges: list of (first quad, number of quads) to draw. All quads if None.
+        :return: nothing."""
+
+        if not self.count:
+            return
+        if self.buffer is not None:
+            glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+            if self.dirty:
+                # upload only when the geometry has changed
+                glBufferData(GL_ARRAY_BUFFER, self.count * Stride, self.data, GL_DYNAMIC_DRAW)
+            elif self.changes:
+                # upload only the parts that have changed
+                for start, count in self.changes:
+                    glBufferSubData(GL_ARRAY_BUFFER, start * Stride, count * Stride, self.data[start:start + count])
+            # offsets into the bound buffer
+            vertex, texture = ctypes.c_void_p(0), ctypes.c_void_p(12)
+        else:
+            # addresses in client memory
+            vertex = ctypes.c_void_p(self.data.ctypes.data)
+            texture = ctypes.c_void_p(self.data.ctypes.data + 12)
+        self.dirty = False
+        self.changes = []
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glVertexPointer(3, GL_FLOAT, Stride, vertex)
+        glTexCoordPointer(2, GL_FLOAT, Stride, texture)
+        if ranges is None:
+            glDrawArrays(GL_QUADS, 0, self.count)
+        else:
+            for first, count in ranges:
+                if count:
+                    glDrawArrays(GL_QUADS, first * 4, count * 4)
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        if self.buffer is not None:
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def release(self):
+        """Free the GPU memory held by the batch.
+        :return: nothing."""
+
+        if self.buffer is not None:
+            glDeleteBuffers(1, [self.buffer])
+            self.buffer = None
+        self.count = 0
+
+
+class CubeInstances:
+    """Cubes of the same mesh drawn with hardware instancing. The mesh, faces of a cube from -1 to 1, is uploaded
+    once and each cube is only its center, size and color. Check supported, and draw with QuadBatch if it is False.
+    With Shaded_fragment as the fragment shader the color of the instances is not used, the palette makes it."""
+
+    def __init__(self, mesh, fragment=Fragment_shader):
+        # shader program, None if not supported
+        self.program = None
+        self.supported = False
+        # why the shaders could not be built, with the info log of the compiler or linker. None if they were
+        self.error = None
+        # number of instances set
+        self.count = 0
+        # center, half size and color of each instance
+        self.data = np.zeros((0, 7), np.float32)
+        if not (bool(glDrawArraysInstanced) and bool(glVertexAttribDivisor) and bool(glGenBuffers)):
+            return
+        try:
+            self.program = program(Vertex_shader, fragment)
+        except (RuntimeError, GLError, NullFunctionError) as error:
+            # no shaders of this version
+            self.error = str(error)
+            return
+        glUseProgram(self.program)
+        glUniform1i(glGetUniformLocation(self.program, "image"), 0)
+        glUseProgram(0)
+        self.fog = glGetUniformLocation(self.program, "fog")
+        # uniforms of the transition of the palette, -1 if the shader has none
+        self.palette = palette_uniforms(self.program)
+        # mesh with texture coordinates, same layout as QuadBatch
+        vertices = np.zeros((6, 4, 5), np.float32)
+        vertices[..., :3] = mesh
+        vertices[..., 3:] = Quad_texture
+        self.vertices = len(vertices) * 4
+        self.mesh, self.buffer = glGenBuffers(2)
+        glBindBuffer(GL_ARRAY_BUFFER, self.mesh)
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.supported = True
+
+    def set(self, centers, size, color):
+        """Replace the instances.
+        :param centers: centers of the cubes, shape (n, 3).
+        :param size: half the size of the cubes.
+        :param color: r, g, b of all cubes, or of each cube with shape (n, 3).
+        :return: nothing."""
+
+        count = len(centers)
+        if count > len(self.data):
+            # double the capacity to avoid reallocation on small growth
+            self.data = np.zeros((max(count, 2 * len(self.data)), 7), np.float32)
+        data = self.data[:count]
+        data[:, :3] = centers
+        data[:, 3] = size
+        data[:, 4:] = color
+        self.count = count
+
+    def draw(self, fog=False, palette=None):
+        """Draw all instances with the current texture.
+        :param fog: True to apply the linear fog set with glFog, as the fixed pipeline does with GL_FOG enabled.
+        :param palette: the palette, for a shader that makes the color from its transition.
+        :return: nothing."""
+
+        if not self.count:
+            return
+        glUseProgram(self.program)
+        glUniform1i(self.fog, fog)
+        if palette is not None:
+            set_palette(self.palette, palette)
+        # the mesh, the same for every instance
+        glBindBuffer(GL_ARRAY_BUFFER, self.mesh)
+        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, Stride, ctypes.c_void_p(0))
+        glVertexAttribPointer(1, 2, GL_FLOAT, GL_FALSE, Stride, ctypes.c_void_p(12))
+        # the instances, uploaded again every frame
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffer)
+        glBufferData(GL_ARRAY_BUFFER, self.count * Instance_stride, self.data, GL_DYNAMIC_DRAW)
+        glVertexAttribPointer(2, 4, GL_FLOAT, GL_FALSE, Instance_stride, ctypes.c_void_p(0))
+        glVertexAttribPointer(3, 3, GL_FLOAT, GL_FALSE, Instance_stride, ctypes.c_void_p(16))
+        for i in range(4):
+            glEnableVertexAttribArray(i)
+        # offset and color advance once for each instance
+        glVertexAttribDivisor(2, 1)
+        glVertexAttribDivisor(3, 1)
+        glDrawArraysInstanced(GL_QUADS, 0, self.vertices, self.count)
+        # leave the state as the fixed pipeline expects it
+        glVertexAttribDivisor(2, 0)
+        glVertexAttribDivisor(3, 0)
+        for i in range(4):
+            glDisableVertexAttribArray(i)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glUseProgram(0)
+
+    def release(self):
+        """Free the GPU memory held by the instances.
+        :return: nothing."""
+
+        if self.supported:
+            glDeleteBuffers(2, [self.mesh, self.buffer])
+            glDeleteProgram(self.program)
+            self.supported = False
+        self.count = 0
+
+
+class Shading:
+    """Draws boundary and obstacles from quads with shaders that make their color from the palette and its glow from
+    the glow texture, so that the CPU only sets the transition of the palette. Check supported, and draw with the glow
+    texture and glColor if it is False."""
+
+    def __init__(self):
+        self.program = None
+        self.supported = False
+        # why the shaders could not be built, with the info log of the compiler or linker. None if they were
+        self.error = None
+        if not bool(glUseProgram):
+            return
+        try:
+            self.program = program(Quad_vertex_shader, Shaded_fragment)
+        except (RuntimeError, GLError, NullFunctionError) as error:
+            # no shaders of this version
+            self.error = str(error)
+            return
+        glUseProgram(self.program)
+        glUniform1i(glGetUniformLocation(self.program, "image"), 0)
+        glUseProgram(0)
+        self.fog = glGetUniformLocation(self.program, "fog")
+        self.palette = palette_uniforms(self.program)
+        self.supported = True
+
+    def begin(self, palette, fog=True):
+        """Draw with the shaders until end.
+        :param palette: the palette of the game.
+        :param fog: True to apply the linear fog set with glFog.
+        :return: nothing."""
+
+        glUseProgram(self.program)
+        glUniform1i(self.fog, fog)
+        set_palette(self.palette, palette)
+
+    def end(self):
+        """Draw with the fixed pipeline again.
+        :return: nothing."""
+
+        glUseProgram(0)
+
+    def release(self):
+        """Free the shaders.
+        :return: nothing."""
+
+        if self.supported:
+            glDeleteProgram(self.program)
+            self.supported = False
+
+
+def palette_uniforms(shader):
+    """Locations of the uniforms of the transition of a palette in a shader program.
+    :param shader: the program.
+    :return: locations of start, end and progress, -1 for those it does not have."""
+
+    return [glGetUniformLocation(shader, name) for name in ("start", "end", "progress")]
+
+
+def set_palette(locations, palette):
+    """Set the transition of a palette to the uniforms of the program in use.
+    :param locations: locations from palette_uniforms.
+    :param palette: the palette.
+    :return: nothing."""
+
+    start, end, progress = locations
+    glUniform3fv(start, 1, palette.start)
+    glUniform3fv(end, 1, palette.end)
+    glUniform1f(progress, palette.progress)
+
+
+class Framebuffer:
+    """An offscreen framebuffer the scene is drawn into at a fraction of the resolution of the window, then scaled
+    up to the window. Its buffers are made at the size of the window once; a smaller scale only draws into a
+    smaller corner of them, so changing the scale allocates nothing. Check supported, and draw to the window if it
+    is False."""
+
+    def __init__(self, size):
+        # size of the window, and of the part drawn into at the current scale
+        self.size = self.viewport = tuple(size)
+        self.supported = False
+        self.framebuffer = self.color = self.depth = None
+        if not (bool(glGenFramebuffers) and bool(glBlitFramebuffer) and bool(glGenRenderbuffers)):
+            return
+        try:
+            self.framebuffer = glGenFramebuffers(1)
+            self.color, self.depth = glGenRenderbuffers(2)
+            glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+            for buffer, storage, attachment in ((self.color, GL_RGBA8, GL_COLOR_ATTACHMENT0),
+                                                (self.depth, GL_DEPTH_COMPONENT24, GL_DEPTH_ATTACHMENT)):
+                glBindRenderbuffer(GL_RENDERBUFFER, buffer)
+                glRenderbufferStorage(GL_RENDERBUFFER, storage, size[0], size[1])
+                glFramebufferRenderbuffer(GL_FRAMEBUFFER, attachment, GL_RENDERBUFFER, buffer)
+            glBindRenderbuffer(GL_RENDERBUFFER, 0)
+            complete = glCheckFramebufferStatus(GL_FRAMEBUFFER) == GL_FRAMEBUFFER_COMPLETE
+            glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        except (GLError, NullFunctionError):
+            # too large for the driver, or not there after all
+            complete = False
+        if not complete:
+            self.release()
+            return
+        self.supported = True
+
+    def bind(self, scale):
+        """Draw into the framebuffer from now on, at a scale of the resolution of the window.
+        The projection keeps its aspect ratio, so nothing else changes.
+        :param scale: fraction of the width and height of the window, up to 1.
+        :return: nothing."""
+
+        self.viewport = (max(int(round(self.size[0] * scale)), 1), max(int(round(self.size[1] * scale)), 1))
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+        glViewport(0, 0, self.viewport[0], self.viewport[1])
+
+    def present(self):
+        """Scale what was drawn up to the window, with linear filtering, and draw to the window from now on.
+        :return: nothing."""
+
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, self.framebuffer)
+        glBindFramebuffer(GL_DRAW_FRAMEBUFFER, 0)
+        glBlitFramebuffer(0, 0, self.viewport[0], self.viewport[1], 0, 0, self.size[0], self.size[1],
+                          GL_COLOR_BUFFER_BIT, GL_LINEAR)
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        glViewport(0, 0, self.size[0], self.size[1])
+
+    def release(self):
+        """Free the GPU memory held by the framebuffer.
+        :return: nothing."""
+
+        if self.color is not None:
+            glDeleteRenderbuffers(2, [self.color, self.depth])
+            self.color = self.depth = None
+        if self.framebuffer is not None:
+            glDeleteFramebuffers(1, [self.framebuffer])
+            self.framebuffer = None
+        self.supported = False
+
+
+class GpuTimer:
+    """Measures the time the GPU takes for a part of each frame, with timer queries. The result of a frame is read
+    a few frames later, once it is there, so that the CPU never waits for the GPU. Check supported."""
+
+    def __init__(self, queries=Queries):
+        self.supported = False
+        # queries in a ring, and which of them wait for a result
+        self.queries = []
+        self.pending = [False] * queries
+        # query of the next frame, and True if this frame is timed
+        self.next = 0
+        self.timing = False
+        if not (bool(glGenQueries) and bool(glGetQueryObjectui64v)):
+            return
+        try:
+            self.queries = list(glGenQueries(queries))
+            # timer queries are newer than queries
+            glBeginQuery(GL_TIME_ELAPSED, self.queries[0])
+            glEndQuery(GL_TIME_ELAPSED)
+        except (GLError, NullFunctionError):
+            return
+        self.supported = True
+
+    def begin(self):
+        """Start timing. Skipped if the query of this frame has not got its result yet, or if timing has started
+        and not ended, as a query that is running cannot be started again.
+        :return: nothing."""
+
+        if self.timing:
+            return
+        self.timing = not self.pending[self.next]
+        if self.timing:
+            glBeginQuery(GL_TIME_ELAPSED, self.queries[self.next])
+
+    def end(self):
+        """Stop timing.
+        :return: nothing."""
+
+        if self.timing:
+            glEndQuery(GL_TIME_ELAPSED)
+            self.pending[self.next] = True
+            self.next = (self.next + 1) % len(self.queries)
+            self.timing = False
+
+    def read(self):
+        """Time of the oldest frame whose result is there.
+        :return: milliseconds, or None if no result is there yet."""
+
+        oldest = self.next
+        for i in range(len(self.queries)):
+            # the oldest pending query is the first one after the last started
+            j = (oldest + i) % len(self.queries)
+            if self.pending[j]:
+                if not glGetQueryObjectuiv(self.queries[j], GL_QUERY_RESULT_AVAILABLE):
+                    return None
+                self.pending[j] = False
+                return glGetQueryObjectui64v(self.queries[j], GL_QUERY_RESULT) * 1e-6
+        return None
+
+    def release(self):
+        """Free the queries.
+        :return: nothing."""
+
+        if self.supported:
+            glDeleteQueries(len(self.queries), self.queries)
+            self.supported = False
+
+
+class Resolution:
+    """Chooses the scale of the resolution the scene is drawn at, to keep frames at a target time. The time of
+    filling pixels grows with the square of the scale. Every Window frames the median frame time is compared
+    with the target: above it by Over the scale shrinks, below Headroom of it the scale grows, in between it stays,
+    so that it settles instead of going back and forth."""
+
+    def __init__(self, target, scale=1.0, low=Min_scale, high=1.0, window=Window):
+        # target frame time in ms, and the bounds of the scale
+        self.target, self.low, self.high = target, low, high
+        self.scale = scale
+        # frame times since the scale last changed
+        self.times = np.zeros(window)
+        self.count = 0
+
+    def update(self, ms):
+        """Add the time of a frame.
+        :param ms: time of the frame in milliseconds.
+        :return: the scale for the next frames."""
+
+        self.times[self.count] = ms
+        self.count += 1
+        if self.count < len(self.times):
+            return self.scale
+        self.count = 0
+        median = np.median(self.times)
+        if self.target * Headroom <= median <= self.target * Over:
+            return self.scale
+        # the scale at which pixels would take the target time, no further than a step away
+        change = min(max(np.sqrt(self.target / median), 1 - Step_down), 1 + Step_up)
+        scale = round(self.scale * change / Quantum) * Quantum
+        if scale == self.scale:
+            # at least a quantum, or it would stay where it is
+            scale += Quantum if change > 1 else -Quantum
+        self.scale = min(max(scale, self.low), self.high)
+        return self.scale
+
+
+def program(vertex, fragment):
+    """Compile and link a shader program, with the attributes at the locations of Attributes.
+    :param vertex: source of the vertex shader.
+    :param fragment: source of the fragment shader.
+    :return: the program. RuntimeError with the info log if it can not be compiled or linked."""
+
+    # compiled one at a time, the shaders made are deleted when a later one fails too. Attached to the program,
+    # they are deleted with it
+    shaders = []
+    try:
+        shaders.append(shader(vertex, GL_VERTEX_SHADER))
+        shaders.append(shader(fragment, GL_FRAGMENT_SHADER))
+        result = glCreateProgram()
+        for part in shaders:
+            glAttachShader(result, part)
+        for i, name in enumerate(Attributes):
+            glBindAttribLocation(result, i, name)
+        glLinkProgram(result)
+    finally:
+        for part in shaders:
+            glDeleteShader(part)
+    if glGetProgramiv(result, GL_LINK_STATUS) != 1:
+        log = glGetProgramInfoLog(result)
+        glDeleteProgram(result)
+        raise RuntimeError("Link failed: %s" % info_log(log))
+    return result
+
+
+def shader(source, kind):
+    """Compile a shader.
+    :param source: source of the shader.
+    :param kind: GL_VERTEX_SHADER or GL_FRAGMENT_SHADER.
+    :return: the shader. RuntimeError with the info log if it can not be compiled."""
+
+    result = glCreateShader(kind)
+    glShaderSource(result, source)
+    glCompileShader(result)
+    if glGetShaderiv(result, GL_COMPILE_STATUS) != 1:
+        log = glGetShaderInfoLog(result)
+        glDeleteShader(result)
+        raise RuntimeError("Compile of the %s shader failed: %s" %
+                           ("vertex" if kind == GL_VERTEX_SHADER else "fragment", info_log(log)))
+    return result
+
+
+def info_log(log):
+    """Text of the info log of a shader or program.
+    :param log: the log, bytes or str.
+    :return: the log as str, without the line break it ends with."""
+
+    return (log.decode("utf-8", "replace") if isinstance(log, bytes) else str(log)).strip()
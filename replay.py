@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+#################################################
+#                   Run: 3D                     #
+#        recording and playback of games        #
+#################################################
+
+# imports
+import os
+import sys
+import time
+import struct
+import argparse
+import numpy as np
+from world import World, Rings
+
+# globals
+Magic = b"RUN3DRPL"         # first bytes of a replay file
+Version = 4                 # version of the file format, 2 since obstacles are checked to be passable, 3 since
+                            # the origin moves with the player, 4 since collisions are tested along the way
+# magic, version, rings at reset, seed, tick rate, rings of the tunnel, density, score, collision tick (-1 for none), ticks
+Header = struct.Struct("<8sHHIHHfiiI")
+Chunk = 4096                # input pairs kept in memory before they are written
+
+# events, stored as (NaN, event) in place of (dx, dy)
+Grow = 1                    # a ring was added while setting up the tunnel
+Idle = 2                    # a tick in the menu
+Click = 3                   # mouse click
+Focus_lost = 4              # the window lost focus
+Focus_gained = 5            # the window gained focus
+
+
+class Recorder:
+    """Records a game to a file: a header with the seed, then the input of every tick as a pair of float32.
+    Pairs are kept in a buffer and written a chunk at a time. The header is completed when the game ends."""
+
+    def __init__(self, path, world, rings, tick_rate=0):
+        # the world being recorded, right after it was reset
+        self.world = world
+        self.rings, self.tick_rate = rings, tick_rate
+        self.file = open(path, "wb")
+        # room for the header, written again with the result on close
+        self.file.write(self.header())
+        # pairs not written yet
+        self.buffer = np.empty((Chunk, 2), np.float32)
+        self.count = 0
+
+    def header(self):
+        """Header of the file, with the result of the game so far.
+        :return: bytes."""
+
+        world = self.world
+        collision_tick = -1 if world.collision_tick is None else world.collision_tick
+        return Header.pack(Magic, Version, self.rings, world.seed, self.tick_rate, world.tunnel.rings,
+                           world.density, world.score, collision_tick, world.ticks)
+
+    def tick(self, dx, dy):
+        """Record the input of a tick.
+        :param dx: input in x direction.
+        :param dy: input in y direction.
+        :return: nothing."""
+
+        self.buffer[self.count] = (dx, dy)
+        self.count += 1
+        if self.count == Chunk:
+            self.flush()
+
+    def event(self, event):
+        """Record an event.
+        :param event: one of the events, Grow, Idle, Click, Focus_lost, Focus_gained.
+        :return: nothing."""
+
+        self.buffer[self.count] = (np.nan, event)
+        self.count += 1
+        if self.count == Chunk:
+            self.flush()
+
+    def flush(self):
+        """Write the pairs in the buffer.
+        :return: nothing."""
+
+        self.file.write(self.buffer[:self.count].tobytes())
+        self.count = 0
+
+    def close(self):
+        """Write the rest of the pairs and the result of the game.
+        :return: nothing."""
+
+        self.flush()
+        self.file.seek(0)
+        self.file.write(self.header())
+        self.file.close()
+
+
+def read(path):
+    """Read a replay file.
+    :param path: name of the file.
+    :return: dictionary of the fields of the header, and the pairs as an array of shape (n, 2)."""
+
+    with open(path, "rb") as f:
+        fields = Header.unpack(f.read(Header.size))
+        pairs = np.fromfile(f, np.float32).reshape(-1, 2)
+    if fields[0] != Magic or not 1 <= fields[1] <= Version:
+        raise ValueError("%s is not a replay of version 1 to %d" % (path, Version))
+    names = ("magic", "version", "rings", "seed", "tick_rate", "tunnel", "density", "score", "collision_tick",
+             "ticks")
+    header = dict(zip(names, fields))
+    if header["collision_tick"] < 0:
+        header["collision_tick"] = None
+    return header, pairs
+
+
+def play(header, pairs):
+    """Play a recorded game without drawing, as fast as possible.
+    :param header: header of the replay.
+    :param pairs: inputs and events of the replay.
+    :return: the world at the end of the game."""
+
+    # files without the length of the tunnel have 0 there, the default tunnel
+    # obstacles of version 1 were not rerolled when they could not be passed, the origin of version 2 stood still,
+    # version 3 tested collisions at the end of each tick only
+    game = World(header["seed"], header["tunnel"] or Rings, header["density"], solvable=header["version"] >= 2,
+                 floating=header["version"] >= 3, swept=header["version"] >= 4)
+    if header["rings"] < game.tunnel.rings:
+        # the tunnel was set up while moving
+        game.reset(header["seed"], header["rings"])
+    for dx, dy in pairs.tolist():
+        if dx == dx:
+            # not NaN, the input of a tick
+            if game.tick(dx, dy):
+                break
+        elif dy == Grow:
+            game.grow()
+        elif dy == Idle:
+            game.idle()
+        # clicks and focus change nothing in the game
+    return game
+
+
+def verify(args):
+    """Play replays and check that they end as they were recorded.
+    :param args: parsed command line arguments.
+    :return: exit status, 1 if any replay ends differently."""
+
+    failed = 0
+    for path in args.replays:
+        header, pairs = read(path)
+        t = time.time()
+        game = play(header, pairs)
+        t = time.time() - t
+        same = (game.score, game.collision_tick, game.ticks) == (header["score"], header["collision_tick"],
+                                                                 header["ticks"])
+        failed += not same
+        print("%s: seed %d, score %d (recorded %d), hit at tick %s (recorded %s), %d ticks in %.3f s%s" %
+              (os.path.basename(path), header["seed"], game.score, header["score"], game.collision_tick,
+               header["collision_tick"], game.ticks, t, "" if same else "  MISMATCH"))
+    return 1 if failed else 0
+
+
+def parse(argv):
+    """Parse command line arguments.
+    :param argv: list of arguments.
+    :return: parsed arguments."""
+
+    parser = argparse.ArgumentParser(description="Play recorded games of Run: 3D without drawing and check them")
+    parser.add_argument("replays", nargs="+", help="replay files, written by main.py --record")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(verify(parse(sys.argv[1:])))
@@ -0,0 +1,463 @@
+#!/usr/bin/env python
+#################################################
+#                   Run: 3D                     #
+#       scores of games and the leaderboard     #
+#################################################
+
+# imports
+import os
+import sys
+import json
+import time
+import zlib
+import queue
+import struct
+import asyncio
+import argparse
+import threading
+import numpy as np
+from urllib.parse import urlsplit
+
+# globals
+Magic = b"RUN3DSCR"         # first bytes of a score log
+Version = 1                 # version of the file format
+# magic, version, size of an entry
+Header = struct.Struct("<8sHH")
+# time, seed, score, ticks, density, player and replay file, the strings padded with zeros
+Entry = struct.Struct("<dIiIf32s64s")
+# score and hash of the player of each entry, in the order of the log
+Index = np.dtype([("score", "<i4"), ("player", "<u4")])
+Path = "scores.log"         # score log, with its index in .idx and the entries uploaded in .sync next to it
+Timeout = 5.0               # seconds an upload may take
+Backoff = 1.0, 60.0         # seconds to wait before trying an upload again, doubled after each failure up to 60
+Top = 10                    # entries shown by default
+
+
+def entry(player, seed, score, ticks, density, replay="", when=None):
+    """An entry of the log, as a dictionary. It is sent to the leaderboard as it is.
+    :param player: name of the player, at most 32 bytes in UTF-8.
+    :param seed: seed of the game.
+    :param score: score of the game.
+    :param ticks: ticks the game lasted.
+    :param density: obstacles in a distance, relative to the normal game.
+    :param replay: name of the replay file of the game, empty if it was not recorded.
+    :param when: time of the end of the game, now if None.
+    :return: dictionary of time, player, seed, score, ticks, density and replay."""
+
+    return dict(time=time.time() if when is None else when, player=player, seed=seed, score=score, ticks=ticks,
+                density=density, replay=replay)
+
+
+def player_hash(player):
+    """Hash of the name of a player, kept in the index.
+    :param player: name of the player.
+    :return: integer."""
+
+    return zlib.crc32(player.encode("utf-8")[:32])
+
+
+def pack(item):
+    """Bytes of an entry in the log.
+    :param item: the entry.
+    :return: bytes."""
+
+    return Entry.pack(item["time"], item["seed"] & 0xFFFFFFFF, item["score"], item["ticks"], item["density"],
+                      item["player"].encode("utf-8")[:32], item["replay"].encode("utf-8")[:64])
+
+
+def unpack(data):
+    """Entry from its bytes in the log.
+    :param data: bytes.
+    :return: the entry."""
+
+    when, seed, score, ticks, density, player, replay = Entry.unpack(data)
+    return entry(player.rstrip(b"\0").decode("utf-8", "replace"), seed, score, ticks, density,
+                 replay.rstrip(b"\0").decode("utf-8", "replace"), when)
+
+
+class Log:
+    """Scores of games in a file that is only added to: a header, then an entry of fixed size for each game.
+    The index keeps the score and a hash of the player of each entry, 8 bytes each, in a file of its own that is
+    read into memory, so that the best scores of all players or of one are found without reading the log.
+    A log cut in the middle of an entry is cut back to the last whole entry, and an index that is missing or
+    behind is made again from the log."""
+
+    def __init__(self, path=Path):
+        self.path, self.index_path = path, path + ".idx"
+        # entries are added by one thread and read by others
+        self.lock = threading.Lock()
+        self.file = open(path, "r+b" if os.path.exists(path) else "w+b")
+        header = self.file.read(Header.size)
+        if not header:
+            self.file.write(Header.pack(Magic, Version, Entry.size))
+            self.file.flush()
+        elif len(header) < Header.size or Header.unpack(header) != (Magic, Version, Entry.size):
+            self.file.close()
+            raise ValueError("%s is not a score log of version %d" % (path, Version))
+        # whole entries in the log
+        self.count = (os.fstat(self.file.fileno()).st_size - Header.size) // Entry.size
+        self.file.truncate(Header.size + self.count * Entry.size)
+        # the index in memory, with room to grow
+        self.index = np.zeros(max(self.count, 1024), Index)
+        known = 0
+        if os.path.exists(self.index_path):
+            stored = np.fromfile(self.index_path, Index)[:self.count]
+            known = len(stored)
+            self.index[:known] = stored
+        for i in range(known, self.count):
+            # index the entries written after the index was
+            item = self.read(i)
+            self.index[i] = (item["score"], player_hash(item["player"]))
+        self.index_file = open(self.index_path, "r+b" if os.path.exists(self.index_path) else "w+b")
+        self.index_file.truncate(known * Index.itemsize)
+        self.index_file.seek(0, os.SEEK_END)
+        self.index_file.write(self.index[known:self.count].tobytes())
+        self.index_file.flush()
+
+    def append(self, item):
+        """Add an entry at the end of the log and of the index. The log is synced to the disk first, so that the
+        index never has entries the log does not.
+        :param item: the entry.
+        :return: number of entries in the log."""
+
+        with self.lock:
+            self.file.seek(0, os.SEEK_END)
+            self.file.write(pack(item))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            if self.count == len(self.index):
+                self.index = np.concatenate((self.index, np.zeros(len(self.index), Index)))
+            self.index[self.count] = (item["score"], player_hash(item["player"]))
+            self.index_file.write(self.index[self.count:self.count + 1].tobytes())
+            self.index_file.flush()
+            self.count += 1
+            return self.count
+
+    def read(self, i):
+        """Read an entry of the log.
+        :param i: number of the entry, from 0 for the first.
+        :return: the entry."""
+
+        with self.lock:
+            self.file.seek(Header.size + i * Entry.size)
+            return unpack(self.file.read(Entry.size))
+
+    def top(self, n=Top, player=None):
+        """Best scores, of all players or of one.
+        :param n: number of entries.
+        :param player: name of the player, None for all.
+        :return: list of entries, the best first. Of equal scores, the earlier is first."""
+
+        with self.lock:
+            index = self.index[:self.count]
+        rows = np.arange(len(index))
+        if player is not None:
+            # names with the same hash are told apart when the entries are read
+            rows = rows[index["player"] == player_hash(player)]
+        # stable, so that equal scores keep the order they were made in
+        order = rows[np.argsort(-index["score"][rows].astype(np.int64), kind="stable")]
+        best = []
+        for i in order.tolist():
+            item = self.read(i)
+            if player is None or item["player"] == player[:32]:
+                best.append(item)
+                if len(best) == n:
+                    break
+        return best
+
+    def close(self):
+        """Close the files of the log.
+        :return: nothing."""
+
+        self.file.close()
+        self.index_file.close()
+
+
+class Scores:
+    """Saves the scores of games, and sends them to a leaderboard, without ever making the game wait.
+    submit only puts an entry in a queue. A writer thread adds the entries to the log, and an uploader thread runs
+    an asyncio loop that posts the entries not uploaded yet, in order, as JSON to the leaderboard. The number of
+    entries uploaded is kept in a file next to the log, so entries left when the game ends are sent the next time.
+    A server that is slow or cannot be reached is tried again later, with a longer wait every time."""
+
+    def __init__(self, path=Path, url=None):
+        self.path, self.url = path, url
+        self.sync_path = path + ".sync"
+        # entries to write, None to stop
+        self.queue = queue.Queue()
+        # the log, opened by the writer, and the entries in it
+        self.log, self.written = None, 0
+        # entries uploaded, and entries the leaderboard refused
+        self.uploaded = self.rejected = 0
+        self.error = None
+        # loop of the uploader, its task and the event that wakes it, None without a leaderboard
+        self.loop = self.task = self.wake = None
+        if url:
+            self.loop = asyncio.new_event_loop()
+            self.uploader = threading.Thread(target=self.run_uploads, name="leaderboard")
+            self.uploader.daemon = True
+            self.uploader.start()
+        self.writer = threading.Thread(target=self.write, name="scores")
+        self.writer.daemon = True
+        self.writer.start()
+
+    def submit(self, item):
+        """Save an entry, and upload it if there is a leaderboard. Returns at once.
+        :param item: the entry, see entry.
+        :return: nothing."""
+
+        self.queue.put(item)
+
+    def write(self):
+        """Add the entries submitted to the log until None is submitted, in the writer thread.
+        :return: nothing."""
+
+        try:
+            self.log = Log(self.path)
+            self.written = self.log.count
+            self.kick()
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    break
+                self.written = self.log.append(item)
+                self.kick()
+        except (IOError, OSError, ValueError) as e:
+            # the game goes on without saving scores
+            self.error = e
+            print("scores are not saved: %s" % e)
+
+    def kick(self):
+        """Tell the uploader there are entries to upload.
+        :return: nothing."""
+
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.wakeup)
+
+    def wakeup(self):
+        """Wake the uploader, in its loop.
+        :return: nothing."""
+
+        if self.wake is not None:
+            self.wake.set()
+
+    def run_uploads(self):
+        """Run the loop of the uploader until it is cancelled, in the uploader thread.
+        :return: nothing."""
+
+        self.task = self.loop.create_task(self.upload())
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.loop.close()
+
+    async def upload(self):
+        """Post the entries not uploaded yet, in order, waiting for new ones when all are.
+        :return: nothing."""
+
+        self.wake = asyncio.Event()
+        try:
+            with open(self.sync_path) as f:
+                self.uploaded = int(f.read())
+        except (IOError, OSError, ValueError):
+            self.uploaded = 0
+        delay = Backoff[0]
+        while True:
+            if self.log is None or self.uploaded >= self.written:
+                await self.wake.wait()
+                self.wake.clear()
+                continue
+            item = self.log.read(self.uploaded)
+            try:
+                status = await asyncio.wait_for(post(self.url, item), Timeout)
+            except (OSError, ValueError, asyncio.TimeoutError):
+                status = None
+            if status is None or status >= 500 or status in (408, 429):
+                # try again later
+                await asyncio.sleep(delay)
+                delay = min(2 * delay, Backoff[1])
+                continue
+            if status >= 300:
+                # refused, sending it again does not help
+                self.rejected += 1
+            delay = Backoff[0]
+            self.uploaded += 1
+            # written next to the file and renamed over it, so that it is never half written
+            with open(self.sync_path + ".tmp", "w") as f:
+                f.write(str(self.uploaded))
+            os.replace(self.sync_path + ".tmp", self.sync_path)
+
+    def close(self, timeout=2.0):
+        """Finish writing the entries submitted, and stop uploading. Entries not uploaded yet are uploaded the next
+        time there is a leaderboard.
+        :param timeout: seconds to wait for the writer.
+        :return: nothing."""
+
+        self.queue.put(None)
+        self.writer.join(timeout)
+        if self.loop is not None:
+            if self.task is not None:
+                self.loop.call_soon_threadsafe(self.task.cancel)
+            self.uploader.join(timeout)
+        if self.log is not None and not self.writer.is_alive():
+            self.log.close()
+
+
+async def post(url, item):
+    """Post an entry to a leaderboard as JSON.
+    :param url: http or https URL of the leaderboard.
+    :param item: the entry.
+    :return: HTTP status of the reply."""
+
+    parts = urlsplit(url)
+    secure = parts.scheme == "https"
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or (443 if secure else 80),
+                                                   ssl=True if secure else None)
+    try:
+        body = json.dumps(item).encode("utf-8")
+        writer.write(("POST %s HTTP/1.1\r\nHost: %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n"
+                      "Connection: close\r\n\r\n" % (parts.path or "/", parts.netloc, len(body))).encode("ascii") +
+                     body)
+        await writer.drain()
+        # HTTP/1.1 201 Created
+        status = (await reader.readline()).split()
+        if len(status) < 2:
+            raise ValueError("no reply from %s" % url)
+        return int(status[1])
+    finally:
+        writer.close()
+
+
+class Stub:
+    """A leaderboard for trying the uploader: keeps the entries posted to /scores in memory, and gives the best of
+    them for GET /scores?n=10. It can answer slowly, or fail some posts, like a server under load."""
+
+    def __init__(self, delay=0.0, fail=0):
+        # seconds to wait before answering a post, and posts to fail in every 10
+        self.delay, self.fail = delay, fail
+        self.scores = []
+        self.posts = 0
+        self.server = None
+
+    async def handle(self, reader, writer):
+        """Answer a request.
+        :param reader: stream of the request.
+        :param writer: stream of the reply.
+        :return: nothing."""
+
+        try:
+            method, target = (await reader.readline()).decode("ascii").split()[:2]
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, value = line.decode("ascii").split(":", 1)
+                if name.strip().lower() == "content-length":
+                    length = int(value)
+            body = await reader.readexactly(length)
+            path, _, query = target.partition("?")
+            if path != "/scores":
+                status, reply = 404, {}
+            elif method == "POST":
+                self.posts += 1
+                await asyncio.sleep(self.delay)
+                if self.posts % 10 < self.fail:
+                    status, reply = 503, {}
+                else:
+                    self.scores.append(json.loads(body.decode("utf-8")))
+                    status, reply = 201, {"entries": len(self.scores)}
+            else:
+                n = int(dict(p.split("=", 1) for p in query.split("&") if "=" in p).get("n", Top))
+                status, reply = 200, sorted(self.scores, key=lambda item: -item["score"])[:n]
+            data = json.dumps(reply).encode("utf-8")
+            writer.write(("HTTP/1.1 %d X\r\nContent-Type: application/json\r\nContent-Length: %d\r\n"
+                          "Connection: close\r\n\r\n" % (status, len(data))).encode("ascii") + data)
+            await writer.drain()
+        except (ValueError, OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, port, started=None):
+        """Answer requests until the loop is stopped.
+        :param port: port to listen on, 0 for any free one.
+        :param started: called with the port once it listens.
+        :return: nothing."""
+
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", port)
+        if started is not None:
+            started(self.server.sockets[0].getsockname()[1])
+        async with self.server:
+            await self.server.serve_forever()
+
+    def start(self):
+        """Answer requests in a thread of its own, on a free port.
+        :return: URL to post entries to."""
+
+        ready = threading.Event()
+        ports = []
+
+        def started(port):
+            ports.append(port)
+            ready.set()
+        thread = threading.Thread(target=asyncio.run, args=(self.serve(0, started),), name="stub")
+        thread.daemon = True
+        thread.start()
+        ready.wait()
+        return "http://127.0.0.1:%d/scores" % ports[0]
+
+
+def show(args):
+    """Print the best scores in a log.
+    :param args: parsed command line arguments.
+    :return: exit status."""
+
+    log = Log(args.log)
+    for rank, item in enumerate(log.top(args.n, args.player), 1):
+        print("%3d %8d  %-20s %s  seed %d%s" % (rank, item["score"], item["player"],
+                                                 time.strftime("%Y-%m-%d %H:%M", time.localtime(item["time"])),
+                                                 item["seed"], "  " + item["replay"] if item["replay"] else ""))
+    log.close()
+    return 0
+
+
+def serve(args):
+    """Run a stub leaderboard until interrupted.
+    :param args: parsed command line arguments.
+    :return: exit status."""
+
+    stub = Stub(args.delay, args.fail)
+    try:
+        asyncio.run(stub.serve(args.port, lambda port: print("leaderboard at http://127.0.0.1:%d/scores" % port)))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def parse(argv):
+    """Parse command line arguments.
+    :param argv: list of arguments.
+    :return: parsed arguments."""
+
+    parser = argparse.ArgumentParser(description="Scores of Run: 3D")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+    p = commands.add_parser("top", help="best scores in a score log")
+    p.add_argument("--log", default=Path, help="score log, written by main.py")
+    p.add_argument("-n", type=int, default=Top, help="scores to show")
+    p.add_argument("--player", help="only the scores of this player")
+    p.set_defaults(run=show)
+    p = commands.add_parser("serve", help="run a stub leaderboard to upload to")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--delay", type=float, default=0.0, help="seconds to wait before answering a post")
+    p.add_argument("--fail", type=int, default=0, help="posts to fail with 503 in every 10")
+    p.set_defaults(run=serve)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse(sys.argv[1:])
+    sys.exit(arguments.run(arguments))
@@ -0,0 +1,181 @@
+#################################################
+#                   Run: 3D                     #
+#          text drawn from glyph atlases        #
+#################################################
+
+# imports
+import os
+from collections import OrderedDict
+import numpy as np
+import pygame as pg
+from OpenGL.GL import (glBindTexture, glDeleteTextures, glGenTextures, glMultMatrixf, glPixelStorei, glPopMatrix,
+                       glPushMatrix, glTexImage2D, glTexParameteri, GL_ALPHA, GL_LINEAR, GL_TEXTURE_2D,
+                       GL_TEXTURE_MAG_FILTER, GL_TEXTURE_MIN_FILTER, GL_UNPACK_ALIGNMENT, GL_UNSIGNED_BYTE)
+import render
+
+# globals
+Fonts = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "font%d.ttf" % i) for i in range(5)]
+Glyph_size = 128            # size of the font used to rasterize glyphs
+Atlas_width = 2048          # width of an atlas texture in pixels
+Characters = "".join(chr(i) for i in range(32, 127))    # printable ASCII, the rest is drawn as "?"
+Cached_strings = 32         # number of strings kept ready to draw
+
+
+class Atlas:
+    """All glyphs of a font, rasterized once into a single alpha texture."""
+
+    def __init__(self, path, size=Glyph_size):
+        # fonts are the only part of pygame needed here besides the display
+        if not pg.font.get_init():
+            pg.font.init()
+        font = pg.font.Font(path, size)
+        # glyph: (width in pixels, s1, s2, t bottom, t top) where s, t are texture coordinates
+        self.glyphs = {}
+        # place the glyphs in rows, left to right
+        surfaces = [font.render(c, True, (255, 255, 255)) for c in Characters]
+        # height of a line of text in pixels. Some glyphs are taller than the font says
+        self.height = max([font.get_height()] + [surface.get_height() for surface in surfaces])
+        x = y = 0
+        places = []
+        for surface in surfaces:
+            if x + surface.get_width() > Atlas_width:
+                x, y = 0, y + self.height + 1
+            places.append((x, y))
+            x += surface.get_width() + 1   # one pixel apart, so that linear filtering doesn't mix glyphs
+        rows = y + self.height
+        pixels = np.zeros((rows, Atlas_width), np.uint8)
+        for c, surface, (x, y) in zip(Characters, surfaces, places):
+            w, h = surface.get_size()
+            # alpha of the rendered glyph, (width, height) in pygame
+            pixels[y:y + h, x:x + w] = pg.surfarray.array_alpha(surface).T
+            # the first row of the image is at t = 0. All glyphs are aligned at the top of the line
+            self.glyphs[c] = (w, float(x) / Atlas_width, float(x + w) / Atlas_width,
+                              float(y + self.height) / rows, float(y) / rows)
+        # create the texture. Only alpha, the color comes from glColor
+        self.texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_ALPHA, Atlas_width, rows, 0, GL_ALPHA, GL_UNSIGNED_BYTE, pixels)
+
+    def width(self, s):
+        """Width of a string in pixels.
+        :param s: the string.
+        :return: width in pixels."""
+
+        return sum(self.glyph(c)[0] for c in s)
+
+    def glyph(self, c):
+        """Glyph of a character.
+        :param c: the character.
+        :return: width and texture coordinates."""
+
+        return self.glyphs.get(c) or self.glyphs["?"]
+
+    def layout(self, s):
+        """Quads of the glyphs of a string that fill a 1x1 square, left to right.
+        :param s: the string.
+        :returns: faces of shape (n, 4, 3) and texture coordinates of shape (n, 4, 2)."""
+
+        width = float(max(self.width(s), 1))
+        faces = np.zeros((len(s), 4, 3), np.float32)
+        texture = np.zeros((len(s), 4, 2), np.float32)
+        x = 0
+        for i, c in enumerate(s):
+            w, s1, s2, bottom, top = self.glyph(c)
+            x1, x2 = x / width, (x + w) / width
+            # same order of corners as draw_quad: bottom left, top left, top right, bottom right
+            faces[i, :, :2] = ((x1, 0), (x1, 1), (x2, 1), (x2, 0))
+            texture[i] = ((s1, bottom), (s1, top), (s2, top), (s2, bottom))
+            x += w
+        return faces, texture
+
+    def release(self):
+        """Free the texture.
+        :return: nothing."""
+
+        glDeleteTextures([self.texture])
+
+
+class Text:
+    """Draws strings as batches of glyph quads. Fonts are loaded when first used and kept.
+    The quads of recently drawn strings are kept in vertex buffers, the least recently used are freed."""
+
+    def __init__(self, capacity=Cached_strings):
+        # font index: Atlas
+        self.atlases = {}
+        # (string, font index): QuadBatch, least recently used first
+        self.strings = OrderedDict()
+        # maximum number of strings kept
+        self.capacity = capacity
+
+    def atlas(self, font):
+        """Atlas of a font, loaded on first use.
+        :param font: index of the font.
+        :return: the atlas."""
+
+        if font not in self.atlases:
+            self.atlases[font] = Atlas(Fonts[font])
+        return self.atlases[font]
+
+    def aspect(self, s, font=0):
+        """Aspect ratio of a string.
+        :param s: the string.
+        :param font: index of the font.
+        :return: height / width."""
+
+        atlas = self.atlas(font)
+        return float(atlas.height) / max(atlas.width(s), 1)
+
+    def batch(self, s, font):
+        """Quads of a string, from the cache if it was drawn recently.
+        :param s: the string.
+        :param font: index of the font.
+        :return: QuadBatch with the string in a 1x1 square."""
+
+        key = (s, font)
+        if key in self.strings:
+            # most recently used
+            batch = self.strings.pop(key)
+        else:
+            if len(self.strings) >= self.capacity:
+                # free the least recently used
+                self.strings.popitem(last=False)[1].release()
+            batch = render.QuadBatch()
+            batch.set(*self.atlas(font).layout(s))
+        self.strings[key] = batch
+        return batch
+
+    def draw(self, s, corners, font=0):
+        """Draw a string in a quad, with the current color. Requires blending for transparent background.
+        :param s: the string.
+        :param corners: corners of the quad, in the same order as draw_quad.
+        :param font: index of the font.
+        :return: nothing."""
+
+        if not s:
+            return
+        batch = self.batch(s, font)
+        # map the 1x1 square of the string to the quad
+        origin, top, _, right = np.asarray(corners, np.float32)[:, :3]
+        matrix = np.identity(4, np.float32)
+        matrix[0, :3] = right - origin
+        matrix[1, :3] = top - origin
+        matrix[3, :3] = origin
+        glPushMatrix()
+        glMultMatrixf(matrix)
+        glBindTexture(GL_TEXTURE_2D, self.atlas(font).texture)
+        batch.draw()
+        glPopMatrix()
+
+    def release(self):
+        """Free all textures and vertex buffers.
+        :return: nothing."""
+
+        for batch in self.strings.values():
+            batch.release()
+        self.strings.clear()
+        for atlas in self.atlases.values():
+            atlas.release()
+        self.atlases.clear()
@@ -0,0 +1,172 @@
+#################################################
+#                   Run: 3D                     #
+#       procedural textures, cached on disk     #
+#################################################
+
+# imports
+import os
+import hashlib
+import numpy as np
+
+# globals
+Version = 1                 # change when a generator changes, so that cached textures are generated again
+Cache = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")   # directory of cached textures
+Size = 256                  # default width and height of textures
+Samples = 4                 # samples per pixel in each direction, for smooth edges of the play button
+
+
+def glow(size):
+    """The shaded texture mapped to boundary and obstacles. White at the edges, darker towards the center in steps.
+    Same as drawing black squares with alpha 30 + i / 2 over each other, i from 9 to 30, each inside the previous.
+    :param size: width and height in pixels.
+    :return: RGBA image, array of shape (size, size, 4)."""
+
+    # distance of each column from the nearest edge, in hundredths of the size
+    i = np.arange(size)
+    distance = np.minimum(i, size - 1 - i) * 100 // size
+    # brightness under 0 to 22 squares. White reflects the color indicated by glColor
+    alpha = (30 + np.arange(9, 31) // 2) / 255.0
+    shade = np.concatenate(((1.0,), np.cumprod(1 - alpha)))
+    # the squares i <= distance cover a pixel. Gray and opaque pixels of a column as r, g, b, a bytes of an integer
+    gray = np.rint(255 * shade[np.clip(distance - 8, 0, 22)]).astype("<u4")
+    pixels = gray * 0x010101 + 0xff000000
+    # a pixel is as far as the nearer of its row and column, which is the darker one: shade never grows inwards
+    return np.maximum.outer(pixels, pixels).view(np.uint8).reshape(size, size, 4)
+
+
+def play_button(size):
+    """The play button. A ring with a triangle in it on a transparent background.
+    :param size: width and height in pixels.
+    :return: RGBA image, array of shape (size, size, 4)."""
+
+    # coordinates of the samples in a 100 x 100 square, relative to the center, and of the centers of the pixels
+    p = ((np.arange(size * Samples) + 0.5) * 100.0 / (size * Samples) - 50).astype(np.float32)
+    center = ((np.arange(size) + 0.5) * 100.0 / size - 50).astype(np.float32)
+    # a pixel that no edge of the shapes crosses is all inside or all outside, as its center is. Edges cross the
+    # pixels at most half a diagonal from them, a bit more for rounding
+    reach = 100.0 / size * 0.75
+    # the shapes are in the middle 80 x 80, the pixels around them are empty
+    coverage = np.zeros((size, size), np.uint16)
+    box = np.flatnonzero(np.abs(center) < 40 + reach)
+    low, high = (box[0], box[-1] + 1) if len(box) else (0, 0)
+    x, y = center[None, low:high], center[low:high, None]
+    r = np.sqrt(x * x + y * y)
+    crossed = (np.abs(r - 30) < reach) | (np.abs(r - 40) < reach) | (np.abs(x + 10) < reach)
+    # the slanted sides of the triangle, 2x + 3y = 40 and 2x - 3y = 40
+    crossed |= (np.abs(2 * x + 3 * y - 40) < reach * np.sqrt(13)) | (np.abs(2 * x - 3 * y - 40) < reach * np.sqrt(13))
+    coverage[low:high, low:high] = play_inside(x, y) * np.uint16(Samples * Samples)
+    # only the pixels that are crossed are sampled, with the samples of the whole image
+    rows, columns = np.nonzero(crossed)
+    rows += low
+    columns += low
+    offsets = np.arange(Samples)
+    sample_x = p[(columns * Samples)[:, None, None] + offsets[None, None, :]]
+    sample_y = p[(rows * Samples)[:, None, None] + offsets[None, :, None]]
+    coverage[rows, columns] = play_inside(sample_x, sample_y).sum(axis=(1, 2), dtype=np.uint16)
+    image = np.empty((size, size, 4), np.uint8)
+    image[..., :3] = 200
+    image[..., 3] = (coverage * 200 + Samples * Samples // 2) // (Samples * Samples)
+    return image
+
+
+def play_inside(x, y):
+    """Test which points are inside the shapes of the play button.
+    :param x: x in a 100 x 100 square, relative to the center.
+    :param y: y, broadcast with x.
+    :return: boolean array."""
+
+    # circle of radius 40 and width 10 at the center
+    r = x * x + y * y
+    inside = (r > 30 * 30) & (r <= 40 * 40)
+    # triangle (70, 50), (40, 70), (40, 30): right of its left side and inside both slanted sides
+    height = (20 - x) * (2 / 3.0)
+    return inside | ((x >= -10) & (y <= height) & (-y <= height))
+
+
+Generators = {"glow": glow, "play": play_button}
+
+
+def mipmaps(image):
+    """Smaller versions of a square image, each half the size of the previous, down to 1 x 1.
+    :param image: RGBA image.
+    :return: list of images, starting with the given one."""
+
+    levels = [image]
+    while len(image) > 1:
+        n = len(image) // 2
+        # average of 2 x 2 pixels. An odd last row and column are dropped. Pairs of rows are added, then pairs of
+        # pixels in the sums, whole rows at a time
+        rows = image[:2 * n, :2 * n].reshape(n, 2, n * 2 * 4)
+        total = rows[:, 0].astype(np.uint16)
+        total += rows[:, 1]
+        total = total.reshape(n, n, 2, 4)
+        total = total[:, :, 0] + total[:, :, 1]
+        total += 2
+        image = (total // 4).astype(np.uint8)
+        levels.append(image)
+    return levels
+
+
+def path(name, size):
+    """File of a cached texture, keyed by everything that decides its pixels.
+    :param name: name of the generator.
+    :param size: width and height in pixels.
+    :return: path of the file."""
+
+    key = hashlib.sha1(repr((name, size, Version, Samples)).encode()).hexdigest()[:16]
+    return os.path.join(Cache, "%s-%d-%s.rgba" % (name, size, key))
+
+
+def levels(name, size):
+    """All mipmap levels of a texture. Memory mapped from the cache if it is there, else generated and cached.
+    :param name: name of the generator.
+    :param size: width and height in pixels.
+    :return: list of RGBA images."""
+
+    # sizes of the levels
+    sizes = [size]
+    while sizes[-1] > 1:
+        sizes.append(sizes[-1] // 2)
+    file_name = path(name, size)
+    if os.path.exists(file_name) and os.path.getsize(file_name) == sum(n * n * 4 for n in sizes):
+        # all levels are stored one after another as raw RGBA
+        data = np.memmap(file_name, np.uint8, "r")
+        images, start = [], 0
+        for n in sizes:
+            images.append(data[start:start + n * n * 4].reshape(n, n, 4))
+            start += n * n * 4
+        return images
+    images = mipmaps(Generators[name](size))
+    try:
+        if not os.path.isdir(Cache):
+            os.makedirs(Cache)
+        # write to a temporary file first, so that a partly written file is never read
+        with open(file_name + ".tmp", "wb") as f:
+            for image in images:
+                f.write(image.tobytes())
+        os.rename(file_name + ".tmp", file_name)
+    except (IOError, OSError):
+        # the game works without the cache, only starts slower
+        pass
+    return images
+
+
+def load(name, size=Size):
+    """Create an OpenGL texture with mipmaps. Requires an OpenGL context.
+    :param name: name of the generator, "glow" or "play".
+    :param size: width and height in pixels.
+    :return: the texture."""
+
+    from OpenGL.GL import (glGenTextures, glBindTexture, glTexParameteri, glPixelStorei, glTexImage2D,
+                           GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_TEXTURE_MIN_FILTER, GL_LINEAR,
+                           GL_LINEAR_MIPMAP_LINEAR, GL_UNPACK_ALIGNMENT, GL_RGBA, GL_UNSIGNED_BYTE)
+    texture = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, texture)
+    # set parameters. Mipmaps for smooth shading at a distance
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+    for level, image in enumerate(levels(name, size)):
+        glTexImage2D(GL_TEXTURE_2D, level, GL_RGBA, image.shape[1], image.shape[0], 0, GL_RGBA, GL_UNSIGNED_BYTE,
+                     np.ascontiguousarray(image))
+    return texture
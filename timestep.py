@@ -0,0 +1,61 @@
+#################################################
+#                   Run: 3D                     #
+#     fixed time steps, independent of frames   #
+#################################################
+
+# imports
+import time
+
+# globals
+Max_steps = 5               # most steps run in a frame. After a longer stall the game slows down instead of jumping
+
+
+class Stepper:
+    """Decides how many steps of fixed length to run in each frame, so that the simulation runs at the same rate
+    however fast frames are drawn. Time that is not a whole step is kept for the next frame, and tells how far
+    the drawn state is between the previous step and the current one."""
+
+    def __init__(self, rate, max_steps=Max_steps, clock=time.time):
+        # length of a step in seconds
+        self.step = 1.0 / rate
+        # limit of steps in a frame
+        self.max_steps = max_steps
+        # function returning the time in seconds
+        self.clock = clock
+        # time of the last frame, None before the first
+        self.last = None
+        # time that has passed and has not been simulated yet
+        self.accumulator = 0.0
+
+    def reset(self):
+        """Forget the time that has passed, after a pause or when starting again.
+        :return: nothing."""
+
+        self.last = None
+        self.accumulator = 0.0
+
+    def advance(self):
+        """Take the time that has passed since the last frame.
+        :return: number of steps to run in this frame."""
+
+        now = self.clock()
+        if self.last is None:
+            # first frame, one step to draw something
+            self.last = now
+            return 1
+        self.accumulator += now - self.last
+        self.last = now
+        steps = int(self.accumulator / self.step)
+        self.accumulator -= steps * self.step
+        if steps > self.max_steps:
+            # too far behind, drop the time that can't be caught up
+            steps = self.max_steps
+            self.accumulator = 0.0
+        return steps
+
+    @property
+    def alpha(self):
+        """Fraction of a step that has passed since the last step.
+        :return: number from 0 to 1, 0 to draw the state of the previous step, 1 for the current one."""
+
+        return min(self.accumulator / self.step, 1.0)
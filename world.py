@@ -0,0 +1,1530 @@
+#################################################
+#                   Run: 3D                     #
+#     game simulation, no OpenGL or pygame      #
+#################################################
+
+# imports
+import os
+import json
+import bisect
+import weakref
+import threading
+import numpy as np
+from collections import deque
+import random
+import profiler
+
+# globals
+Speed = 0.1                 # speed of Z movement at the beginning of a game
+Acceleration = 5e-5         # increase in speed with every tick
+Gap_low, Gap_high = 2, 5    # range of the time between two obstacles, in distances moved in a tick
+Cube_size = 0.25            # size of Cube
+Rings = 20                  # number of boundaries in the tunnel
+Ring_gap = 0.5              # distance between two boundaries
+Boxes = 64                  # initial number of obstacle cubes with space for their bounds
+# the origin moves forward by this when the player is this far past it. A power of two, so that moving is exact
+Origin_shift = 512.0
+# relative velocity taken for a cube that does not move relative to the player, so that the times its bounds are
+# crossed are far away in the right direction instead of undefined
+Tiny = 1e-300
+Pattern_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "patterns.json")   # obstacle shapes
+Motions = ("approach", "open")          # kinds of motion of obstacles
+
+# vertices of cube
+R_U_F = (Cube_size, Cube_size, Cube_size, 1)        # R = Right
+R_U_B = (Cube_size, Cube_size, -Cube_size, 1)       # U = Up
+R_D_F = (Cube_size, -Cube_size, Cube_size, 1)       # F = Front
+R_D_B = (Cube_size, -Cube_size, -Cube_size, 1)      # B = Back
+L_U_F = (-Cube_size, Cube_size, Cube_size, 1)       # D = Down
+L_U_B = (-Cube_size, Cube_size, -Cube_size, 1)      # L = Left
+L_D_F = (-Cube_size, -Cube_size, Cube_size, 1)
+L_D_B = (-Cube_size, -Cube_size, -Cube_size, 1)
+
+# faces of cube
+R_Face = np.array((R_U_F, R_U_B, R_D_B, R_D_F))
+L_Face = np.array((L_U_F, L_D_F, L_D_B, L_U_B))
+U_Face = np.array((R_U_F, L_U_F, L_U_B, R_U_B))
+D_Face = np.array((R_D_F, R_D_B, L_D_B, L_D_F))
+F_Face = np.array((R_U_F, R_D_F, L_D_F, L_U_F))
+B_Face = np.array((R_U_B, L_U_B, L_D_B, R_D_B))
+
+# cube
+Cube = np.array((R_Face, L_Face, U_Face, D_Face, F_Face, B_Face))
+
+# quads of a boundary at z = 0, x y z of each vertex
+Ring = np.array((R_Face + (-3 * Cube_size, -Cube_size, 0, 0),
+                 R_Face + (-3 * Cube_size, +Cube_size, 0, 0),
+                 L_Face + (+3 * Cube_size, -Cube_size, 0, 0),
+                 L_Face + (+3 * Cube_size, +Cube_size, 0, 0),
+                 U_Face + (-Cube_size, -3 * Cube_size, 0, 0),
+                 U_Face + (+Cube_size, -3 * Cube_size, 0, 0),
+                 D_Face + (-Cube_size, +3 * Cube_size, 0, 0),
+                 D_Face + (+Cube_size, +3 * Cube_size, 0, 0)))[..., :3]
+
+Bound = Cube_size * 7 / 5.0             # limit value for the player position
+# x or y of the points tested for collision, relative to the player position
+Probe = np.array((Cube_size * 2 - Bound, Bound - Cube_size * 2))
+Probe_low, Probe_high = Probe.tolist()
+Probe_reach = float(abs(Probe).max())   # farthest a probe is from the player, on either side
+Brighten = np.full(3, 0.5)              # added to a color that is too dark
+White = np.ones(3)                      # complement of a color is white minus the color
+# ways out of a grid of cubes: down, left, up and right. Clockwise, the order in which the ways out of a cell are listed
+Directions = ((0, -1), (-1, 0), (0, 1), (1, 0))
+# obstacles made ahead of the game
+Step = 0.25                 # largest move in x or in y in a tick, with the mouse at the edge of the window
+Segment = 40                # ticks of obstacles handed to the game at a time, a second at the normal tick rate
+Segments = 5                # segments kept ready ahead of the game
+Cells = 29                  # positions on each axis the player is checked at, within the bounds of the player
+Attempts = 20               # obstacles drawn at most for one spawn, until one can be passed
+
+
+def randint(bits, low, high):
+    """Random integer, the same numbers as random.Random.randint draws. randint binds a method on every call,
+    this takes it bound once, so that drawing allocates nothing.
+    :param bits: getrandbits of the generator.
+    :param low: smallest number.
+    :param high: largest number.
+    :return: integer from low to high, both included."""
+
+    n = high - low + 1
+    k = n.bit_length()
+    r = bits(k)
+    while r >= n:
+        r = bits(k)
+    return low + r
+
+
+class Palette:
+    """Color of boundary and obstacles. It stays for a while and then changes slowly to a random color.
+    A transition goes from start to end, the color is start + (end - start) * progress, so that a shader can make
+    it from the three of them. color and negative, its complement for text over the game, are kept up to date for
+    drawing without shaders."""
+
+    def __init__(self, rng):
+        # random number generator for the colors
+        self.random = rng
+        self.bits = rng.getrandbits
+        # current color, and 1 - color
+        self.color = np.array((0.0, 0.3, 0.8))
+        self.negative = White - self.color
+        # time for next color
+        self.wait = randint(self.bits, 100, 200)
+        # time for transition from current color to next
+        self.steps = randint(self.bits, 50, 100)
+        # color at the start and at the end of the transition, and how far it has gone, from 0 to 1
+        self.start, self.end = self.color.copy(), np.zeros(3)
+        self.progress = 0.0
+        # steps of the transition done, and progress as a 0-d array to compute the color with
+        self.done = 0
+        self.fraction = np.zeros(())
+        self.next_color()
+
+    def next_color(self):
+        """Choose the color at the end of the next transition. It starts at the current color.
+        :return: nothing."""
+
+        np.copyto(self.start, self.color)
+        end = self.end
+        end[0] = self.random.random()
+        end[1] = self.random.random()
+        end[2] = self.random.random()
+        self.progress, self.done = 0.0, 0
+
+    def step(self):
+        """Change color with time.
+        :return: nothing."""
+
+        if self.wait:           # wait to change
+            self.wait -= 1      # reduce wait time
+        else:
+            if self.done < self.steps:      # if transition going on
+                self.done += 1              # modify color
+                self.progress = self.fraction[()] = self.done / float(self.steps)
+                color = self.color
+                np.subtract(self.end, self.start, out=color)
+                np.multiply(color, self.fraction, out=color)
+                np.add(color, self.start, out=color)
+                # check if it is black
+                if color.item(0) < 0.2 and color.item(1) < 0.2 and color.item(2) < 0.2:
+                    # the rest of the transition is brighter as well
+                    np.add(self.start, Brighten, out=self.start)
+                    np.add(self.end, Brighten, out=self.end)
+                    np.add(color, Brighten, out=color)
+                np.subtract(White, color, out=self.negative)
+            else:   # transition complete
+                self.wait = randint(self.bits, 100, 200)      # set new color and transition parameters
+                self.steps = randint(self.bits, 50, 100)
+                self.next_color()
+
+
+def exits(column, row, grid):
+    """Directions in which a cell can move out of its grid, clockwise, the first after one that is not a way out.
+    :param column: column of the cell, 0 on the left.
+    :param row: row of the cell, 0 at the bottom.
+    :param grid: number of cells along each side.
+    :return: list of (dx, dy), empty for a cell inside the grid."""
+
+    # down, left, up, right
+    out = (row == 0, column == 0, row == grid - 1, column == grid - 1)
+    start = 0
+    for i in range(4):
+        if out[i] and not out[i - 1]:
+            start = i
+            break
+    return [Directions[(start + i) % 4] for i in range(4) if out[(start + i) % 4]]
+
+
+class Motion:
+    """How the cubes of an obstacle move, one of the motions of the pattern file.
+    approach: the cubes move towards the player with a chance, they are moved back so that they arrive on time.
+    open: one cube at the edge of the grid moves out of the way as the player comes near."""
+
+    __slots__ = ("kind", "delay", "slowdown", "threshold", "lead", "gap")
+
+    def __init__(self, name, data):
+        self.kind = data.get("kind")
+        if self.kind not in Motions:
+            raise ValueError("motion %s: kind must be one of %s" % (name, ", ".join(Motions)))
+        # ticks after creation before the cubes start to move
+        self.delay = int(data.get("delay", 0))
+        # speed of the cubes is the speed of the player divided by this
+        self.slowdown = data.get("slowdown", 1)
+        # the cubes approach if a random number is above this
+        self.threshold = 1 - data.get("chance", 1.0)
+        # ticks of the approach the cubes are moved back by
+        self.lead = data.get("lead", 0.0)
+        # added to the time before the next obstacle
+        self.gap = data.get("gap", 0.0)
+
+
+class Pattern:
+    """An obstacle shape of the pattern file, compiled to the bounds of its cubes around the center of the obstacle.
+    A grid of cells fills the tunnel, cubes of larger grids are smaller. Spawning copies the bounds and moves them."""
+
+    __slots__ = ("name", "grid", "size", "bounds", "live", "motion", "exits", "openers", "weight")
+
+    def __init__(self, data, motions, rows):
+        self.name = data.get("name", "")
+        self.grid = int(data["grid"])
+        cells = [tuple(cell) for cell in data["cells"]]
+        if not cells or len(set(cells)) < len(cells):
+            raise ValueError("pattern %s: cells must be given once each" % self.name)
+        if not all(0 <= column < self.grid and 0 <= row < self.grid for column, row in cells):
+            raise ValueError("pattern %s: cells must be inside a grid of %d" % (self.name, self.grid))
+        # half the size of the cubes
+        self.size = Cube_size * 2 / self.grid
+        # x1, x2, y1, y2 of each cube relative to the center, in the rows of a block. z is set when it is placed
+        self.bounds = np.zeros((rows, 6))
+        self.live = np.zeros(rows, bool)
+        for i, (column, row) in enumerate(cells):
+            x = (column - (self.grid - 1) / 2.0) * 2 * self.size
+            y = (row - (self.grid - 1) / 2.0) * 2 * self.size
+            self.bounds[i, :4] = (x - self.size, x + self.size, y - self.size, y + self.size)
+            self.live[i] = True
+        motion = data.get("motion")
+        if motion is not None and motion not in motions:
+            raise ValueError("pattern %s: no motion %s" % (self.name, motion))
+        self.motion = motions.get(motion)
+        # ways out of the grid of each cell, and the cells that have any
+        self.exits = [exits(column, row, self.grid) for column, row in cells]
+        self.openers = [i for i, directions in enumerate(self.exits) if directions]
+        if self.motion is not None and self.motion.kind == "open" and not self.openers:
+            raise ValueError("pattern %s: no cell can open" % self.name)
+        # chance of the pattern is its weight divided by the sum of all weights
+        self.weight = data.get("weight", 1)
+        if self.weight != int(self.weight) or self.weight < 0:
+            raise ValueError("pattern %s: weight must be a whole number" % self.name)
+
+
+class Library:
+    """All obstacle patterns, chosen at random by their weights."""
+
+    def __init__(self, data):
+        motions = dict((name, Motion(name, motion)) for name, motion in data.get("motions", {}).items())
+        # rows of bounds each obstacle has, enough for the largest pattern
+        self.rows = max(len(pattern["cells"]) for pattern in data["patterns"])
+        self.patterns = [Pattern(pattern, motions, self.rows) for pattern in data["patterns"]]
+        # sums of weights up to each pattern, a random number below the total falls on one of them
+        self.total, self.cumulative = 0, []
+        for pattern in self.patterns:
+            self.total += int(pattern.weight)
+            self.cumulative.append(self.total)
+        if not self.total:
+            raise ValueError("no pattern has a weight")
+        # velocity of cubes moving in z at 1 unit a tick
+        self.forward = np.zeros((self.rows, 6))
+        self.forward[:, 4:] = 1
+
+    def choose(self, bits):
+        """Choose a pattern at random. With equal weights it draws the same number as randint over the patterns.
+        :param bits: getrandbits of the generator.
+        :return: the pattern."""
+
+        return self.patterns[bisect.bisect_right(self.cumulative, randint(bits, 0, self.total - 1))]
+
+
+def load_patterns(path):
+    """Read the pattern file and compile it.
+    :param path: name of the file.
+    :return: the library of patterns."""
+
+    with open(path) as f:
+        data = json.load(f)
+    try:
+        return Library(data)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError("%s: %s" % (path, e))
+
+
+# patterns of the game
+Patterns = load_patterns(Pattern_file)
+
+
+class Block:
+    """The rows of the cubes of one obstacle in the arrays of the world, with views of them to write them in place.
+    The views are made again when the arrays of the world grow."""
+
+    __slots__ = ("first", "rows", "base", "boxes", "before", "velocity", "start_move", "live", "x1", "x2", "y1", "y2",
+                 "z1", "z2")
+
+    def __init__(self, world, first):
+        # first row of the block, the block has a row for each cube of the largest pattern
+        self.first = first
+        self.rows = slice(first, first + world.cubes)
+        self.bind(world)
+
+    def bind(self, world):
+        """Make the views of the rows of the block.
+        :param world: the world the block is in.
+        :return: nothing."""
+
+        rows = self.rows
+        self.base, self.boxes, self.before = world.base[rows], world.boxes[rows], world.before[rows]
+        self.velocity = world.velocity[rows]
+        self.start_move, self.live = world.start_move[rows], world.live[rows]
+        # columns of the bounds before they move
+        self.x1, self.x2, self.y1, self.y2, self.z1, self.z2 = self.base.T
+
+
+class Spawn:
+    """An obstacle made ahead of the game: the tick it appears in, its pattern and the random choices of its motion.
+    Where it appears and how fast its cubes move follow from the state of the game in that tick, see Obstacle.reset."""
+
+    __slots__ = ("tick", "pattern", "moving", "opening", "dx", "dy")
+
+    def __init__(self, tick, patterns, rng):
+        bits = rng.getrandbits
+        self.tick = tick
+        # shape of obstacle
+        self.pattern = pattern = patterns.choose(bits)
+        motion = pattern.motion
+        # True if the cubes approach
+        self.moving = False
+        # cube that moves alone, -1 for none, and the direction it moves out in
+        self.opening = -1
+        self.dx = self.dy = 0
+        if motion is None:
+            pass
+        elif motion.kind == "open":
+            # choose the cube to move, and the direction for it to move out of view
+            self.opening = pattern.openers[randint(bits, 0, len(pattern.openers) - 1)]
+            directions = pattern.exits[self.opening]
+            self.dx, self.dy = directions[randint(bits, 0, len(directions) - 1)]
+        else:
+            self.moving = rng.random() > motion.threshold
+
+
+class Obstacle:
+    """Each object of this class is a static or moving obstacle that the player has to dodge.
+    It is a collection of cubes in the shape of a pattern. The world keeps their positions in a block of rows
+    that belongs to the obstacle, and obstacles that have been passed are reset and used again,
+    so nothing is allocated while playing."""
+
+    __slots__ = ("x", "y", "z", "tick", "pattern", "has_passed", "block")
+
+    def __init__(self, world):
+        # rows of the cubes in the world. The obstacle is not in the game until it is reset
+        self.block = world.add_block()
+
+    def reset(self, world, spawn):
+        """Place the obstacle at the far end of the tunnel, as a new obstacle.
+        :param world: the world the obstacle is in.
+        :param spawn: the pattern and motion of the obstacle.
+        :return: nothing."""
+
+        # store x, y, z for creating obstacle and deleting after it is passed
+        # obstacles appear as far as the end of a tunnel of the default length
+        self.x, self.y = world.ring_x, world.ring_y
+        self.z = world.ring_z + 1 + (world.tunnel.rings - Rings) * Ring_gap
+        # tick it appeared in, z changes when the origin moves
+        self.tick = world.ticks
+        # shape of obstacle
+        self.pattern = pattern = spawn.pattern
+        motion = pattern.motion
+        # bool to check if object has passed
+        self.has_passed = False
+        # distance moved by the cubes in a tick once they start to move, in z by all or in x and y by one
+        dx = dy = dz_move = 0
+        # cube that moves alone, -1 for none
+        opening = -1
+        # tick at which the cubes start to move
+        start_move = world.ticks
+        # shift in z of all cubes at the time of creation
+        dz = 0
+        if motion is None:
+            pass
+        elif motion.kind == "open":
+            # set it to open as player approaches
+            start_move += motion.delay
+            opening = spawn.opening
+            # set the speed at which it should move out
+            dx, dy = spawn.dx * world.speed / motion.slowdown, spawn.dy * world.speed / motion.slowdown
+        elif spawn.moving:
+            # set moving obstacles
+            start_move += motion.delay
+            dz_move = world.speed / motion.slowdown
+            # move the cubes back to make them reach the position on time
+            dz = -motion.lead * world.speed
+        world.set_block(self.block, pattern, self.x, self.y, self.z - pattern.size + dz, self.z + pattern.size + dz,
+                        dz_move, start_move)
+        if opening >= 0:
+            # the cube that opens moves in x and y
+            velocity = self.block.velocity
+            velocity[opening, 0] = velocity[opening, 1] = dx
+            velocity[opening, 2] = velocity[opening, 3] = dy
+
+    def update(self, world):
+        """Update the status of the obstacle, used to delete.
+        :param world: the world the obstacle is in.
+        :return: nothing."""
+
+        self.has_passed = self.z > world.gap_z - world.z - Cube_size * 2 / 3
+
+    def collide(self, world):
+        """Check if the current position collides with the obstacle.
+        :param world: the world the obstacle is in.
+        :return: True if collision takes place, false otherwise."""
+
+        return world.collide(self.block.rows)
+
+
+class Tunnel:
+    """The boundaries of the tunnel, kept in one preallocated array of vertices used as a ring buffer.
+    Each boundary (ring) has 8 quads / squares, 2 on each of the 4 sides (Right, Left, Up, Down).
+    A passed ring is reused at the far end by moving it in Z, so nothing is allocated while playing."""
+
+    def __init__(self, rings):
+        # number of rings
+        self.rings = rings
+        # vertices of all quads: ring, quad, vertex, x y z
+        self.vertices = np.zeros((rings, 8, 4, 3))
+        # z of the vertices of each ring, to move them in place, and of all of them
+        self.depths = list(self.vertices.reshape(rings, -1)[:, 2::3])
+        self.all_depths = self.vertices.reshape(-1, 3)[:, 2]
+        # distance a ring is moved by
+        self.shift = np.zeros(())
+        # z of each ring, used to check if it is behind the current position. -inf for rings not in use
+        self.z = np.full(rings, -np.inf)
+        # rings changed since they were last uploaded, cleared by the renderer. Flags, a counter of changes would be a
+        # new integer object at each ring passed
+        self.changed = np.ones(rings, bool)
+        # index of the nearest ring and number of rings in use
+        self.head = self.count = 0
+
+    def clear(self):
+        """Remove all rings.
+        :return: nothing."""
+
+        self.vertices.fill(0)
+        self.z.fill(-np.inf)
+        self.head = self.count = 0
+        self.changed.fill(True)
+
+    def add(self, z):
+        """Add a ring at the far end.
+        :param z: z of the ring.
+        :return: nothing."""
+
+        i = (self.head + self.count) % self.rings
+        # the quads of a ring at the origin moved to z
+        np.add(Ring, (0, 0, z), out=self.vertices[i])
+        # helps to check if the boundary is out of the frame
+        self.z[i] = z - Cube_size
+        self.count += 1
+        self.changed[i] = True
+
+    def recycle(self, z):
+        """Move the nearest ring to the far end.
+        :param z: new z of the ring.
+        :return: nothing."""
+
+        i = self.head
+        if self.count < self.rings:
+            # the tunnel is not complete yet, the ring moves to a free place
+            self.vertices[i].fill(0)
+            self.z[i] = -np.inf
+            self.changed[i] = True
+            self.count -= 1
+            self.head = (i + 1) % self.rings
+            self.add(z)
+            return
+        # the far end is where the nearest ring is in the buffer. move it by the difference in z
+        self.shift[()] = z - Cube_size - self.z.item(i)
+        np.add(self.depths[i], self.shift, out=self.depths[i])
+        self.z[i] = z - Cube_size
+        self.head = (i + 1) % self.rings
+        self.changed[i] = True
+
+    def move(self, shift):
+        """Move all rings in z, when the origin moves.
+        :param shift: 0-d array of the distance to move by.
+        :return: nothing."""
+
+        np.add(self.all_depths, shift, out=self.all_depths)
+        np.add(self.z, shift, out=self.z)
+        # all rings are uploaded again
+        self.changed.fill(True)
+
+    def nearest(self):
+        """Position of the nearest ring, the first one to be passed.
+        :return: z of the ring, -inf if there are no rings."""
+
+        return self.z.item(self.head)
+
+
+class World:
+    """State of a game: player position and speed, the tunnel, the obstacles and the color.
+    Advances one tick at a time and never touches the display, so it can run headless.
+    Positions are kept near the player: when it is Origin_shift past the origin, the origin moves forward by as much
+    and so does everything in the game. The score is the distance travelled, kept apart from z."""
+
+    def __init__(self, seed=None, rings=Rings, density=1, patterns=None, solvable=True, floating=True, swept=True):
+        # random number generator for obstacles, seeded on every reset
+        self.random = random.Random()
+        self.bits = self.random.getrandbits
+        # colors have a generator of their own, so the menu does not change the obstacles
+        self.palette = Palette(random.Random(seed))
+        # boundaries of the tunnel
+        self.tunnel = Tunnel(rings)
+        # obstacles in a distance, relative to the normal game. Gaps between obstacles are divided by it
+        self.density = density
+        # shapes of obstacles, and rows of bounds each obstacle has
+        self.patterns = Patterns if patterns is None else patterns
+        self.cubes = self.patterns.rows
+        # True to check that every obstacle can be passed, False to make them as they come like old games did
+        self.solvable = solvable
+        # True to move the origin with the player, False to keep it at the start like old games did
+        self.floating = floating
+        # True to test the whole way the player moved in a tick, False to test where it is at the end like old games
+        self.swept = swept
+        # makes the obstacles of games ahead of time, from the first tick of a game
+        self.lookahead = None
+        # obstacles ahead, nearest first
+        self.obstacles = deque()
+        # obstacles that have been passed or not used yet, to reuse
+        self.deleted_obstacles = deque()
+        # blocks of rows handed out to obstacles, each obstacle keeps its block
+        self.blocks = []
+        # single numbers given to numpy as arrays, a python number would be converted on every call
+        self.scalar = np.zeros(())
+        self.zero = np.zeros(())
+        self.third = np.array(Cube_size / 3.0)
+        self.shift = np.array(Origin_shift)
+        self.one = np.ones(())
+        self.tiny = np.array(Tiny)
+        self.infinity = np.array(np.inf)
+        # index of the first collision found
+        self.index = np.zeros(1, np.intp)
+        self.allocate(Boxes)
+        # obstacles for all rows there are, more are added if more are needed
+        while len(self.deleted_obstacles) < Boxes // self.cubes:
+            self.deleted_obstacles.append(Obstacle(self))
+        self.reset(seed)
+
+    def allocate(self, n):
+        """Make room for the bounds of n cubes, keeping the cubes there are. Also sets up the buffers
+        for place and collide, so that they do all their work in place.
+        :param n: number of cubes.
+        :return: nothing."""
+
+        if self.blocks:
+            # the cubes of the obstacles there are
+            kept = (self.boxes, self.before, self.base, self.velocity, self.start_move, self.live)
+        # bounds of all obstacle cubes at the current tick, one row for each cube: x1, x2, y1, y2, z1, z2
+        self.boxes = np.zeros((n, 6))
+        # bounds of the cubes at the previous tick, for the swept collision test
+        self.before = np.zeros((n, 6))
+        # bounds of the cubes before they start to move
+        self.base = np.zeros((n, 6))
+        # change in bounds in every tick after the cubes start to move
+        self.velocity = np.zeros((n, 6))
+        # tick at which the cubes start to move, the same in each column
+        self.start_move = np.zeros((n, 6))
+        # True for rows of cubes that are in the game
+        self.live = np.zeros(n, bool)
+        if self.blocks:
+            for new, old in zip((self.boxes, self.before, self.base, self.velocity, self.start_move, self.live), kept):
+                new[:len(old)] = old
+            for block in self.blocks:
+                block.bind(self)
+        # buffer for the number of ticks each cube has moved
+        self.moved = np.zeros((n, 6))
+        # buffers for the collision test
+        self.bound = np.zeros(n)
+        self.near, self.hit, self.inside, self.test, self.check = np.zeros((5, n), bool)
+        # buffers for the swept collision test: columns of the bounds of the previous tick, velocity of the cubes
+        # relative to the player, the times a bound is crossed, and the times the player enters and leaves each cube
+        # in z, in x and in y for each of the two probes, and all of them. Rows are made once, a row of a 2D array
+        # taken in every tick would be allocated
+        self.before_x1, self.before_x2, self.before_y1, self.before_y2, self.before_z1, self.before_z2 = self.before.T
+        self.relative, self.cross_times, self.entry, self.exit, self.impacts = np.zeros((5, n))
+        self.enter_z, self.leave_z = np.zeros((2, n))
+        self.enter_x, self.leave_x, self.enter_y, self.leave_y = [tuple(rows) for rows in np.zeros((4, 2, n))]
+        # columns of bounds, and the columns of bounds in z to move with the origin. Columns, as numpy buffers
+        # adding to a 2D view with strides
+        self.x1, self.x2, self.y1, self.y2, self.z1, self.z2 = self.boxes.T
+        self.depths = (self.z1, self.z2, self.before_z1, self.before_z2) + tuple(self.base.T[4:])
+        # finds the first cube that is hit, into index. argmax of a row does not allocate, any() does
+        self.first_hit = self.hit[None].argmax
+        self.first_near = self.near[None].argmax
+        # finds the cube hit first, into index. min with out allocates, argmin does not
+        self.first_impact = self.impacts[None].argmin
+
+    def reset(self, seed=None, rings=None):
+        """Set the default values for a new game.
+        :param seed: seed for the obstacles. A random seed is chosen if it is None.
+        :param rings: number of boundaries to set up, the rest are added by grow. All if None.
+        :return: nothing."""
+
+        # every game has a seed, so that it can be played again
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.random.seed(self.seed)
+        if self.lookahead is not None:
+            # the obstacles of the last game are not needed
+            self.lookahead.stop()
+        self.playing = False                            # obstacles are made from the first tick
+        self.speed = Speed                              # reset speed
+        self.next_obstacle = randint(self.bits, 0, 5)   # reset time for next obstacle
+        self.ring_x = self.ring_y = self.ring_z = 0     # reset boundary parameters
+        self.x = self.y = self.z = 0                    # reset player position
+        self.distance = 0                               # distance travelled, the score
+        self.gap_z = 0                                  # gap between beginning of the game and scoring
+        self.x_low = self.y_low = -Bound                # set bounds
+        self.x_high = self.y_high = Bound
+        self.ticks = 0                                  # ticks played
+        self.collision_tick = None                      # tick at which an obstacle was hit
+        self.impact = 1.0                               # fraction of that tick at which it was hit
+        self.save_position()                            # nothing to draw in between yet
+        # remove all boundaries and obstacles, they are reused later
+        self.tunnel.clear()
+        while self.obstacles:
+            self.delete_obstacle(self.obstacles.pop())
+        for i in range(self.tunnel.rings if rings is None else rings):
+            self.add_boundary()
+
+    def add_boundary(self):
+        """Add a boundary at the far end of the tunnel.
+        :return: nothing."""
+
+        # update location for current boundary
+        self.ring_z -= Ring_gap
+        self.tunnel.add(self.ring_z)
+
+    def add_block(self):
+        """Give the rows for the cubes of a new obstacle.
+        :return: the block of rows."""
+
+        first = len(self.blocks) * self.cubes
+        if first + self.cubes > len(self.boxes):
+            # no space left, double it
+            self.allocate(max(2 * len(self.boxes), first + self.cubes))
+        self.blocks.append(Block(self, first))
+        return self.blocks[-1]
+
+    def set_block(self, block, pattern, x, y, z1, z2, dz_move, start_move):
+        """Set the cubes of an obstacle for collision tests, from the bounds of its pattern. Works in the views
+        of the block, so nothing is allocated.
+        :param block: rows of the obstacle.
+        :param pattern: shape of the obstacle.
+        :param x: x of the center of the obstacle.
+        :param y: y of the center of the obstacle.
+        :param z1: lower z of the cubes.
+        :param z2: upper z of the cubes.
+        :param dz_move: distance moved in z in a tick once the cubes start to move.
+        :param start_move: tick at which the cubes start to move.
+        :return: nothing."""
+
+        np.copyto(block.base, pattern.bounds)
+        self.scalar[()] = x
+        np.add(block.x1, self.scalar, out=block.x1)
+        np.add(block.x2, self.scalar, out=block.x2)
+        self.scalar[()] = y
+        np.add(block.y1, self.scalar, out=block.y1)
+        np.add(block.y2, self.scalar, out=block.y2)
+        block.z1.fill(z1)
+        block.z2.fill(z2)
+        # not moved yet, nor in the tick before
+        np.copyto(block.boxes, block.base)
+        np.copyto(block.before, block.base)
+        self.scalar[()] = dz_move
+        np.multiply(self.patterns.forward, self.scalar, out=block.velocity)
+        block.start_move.fill(start_move)
+        np.copyto(block.live, pattern.live)
+
+    def place(self, ticks=None, out=None):
+        """Set the bounds of all cubes to their position at a tick. Cubes move at constant velocity,
+        so the position is computed directly from the number of ticks moved. The bounds there were in boxes are kept
+        in before, for the swept collision test of the next tick.
+        :param ticks: the tick, may be fractional. Current tick if None.
+        :param out: buffer for the bounds, boxes if None.
+        :return: nothing."""
+
+        if out is None:
+            out = self.boxes
+            np.copyto(self.before, out)
+        self.scalar[()] = self.ticks if ticks is None else ticks
+        np.subtract(self.scalar, self.start_move, out=self.moved)
+        np.maximum(self.moved, self.zero, out=self.moved)
+        np.multiply(self.velocity, self.moved, out=out)
+        np.add(out, self.base, out=out)
+
+    def cube_centers(self, ticks=None):
+        """Centers of all cubes of all obstacles, for drawing.
+        :param ticks: the tick to draw them at, may be fractional. Current position if None.
+        :return: array of shape (cubes, 3)."""
+
+        if ticks is None:
+            boxes = self.boxes[self.live]
+        else:
+            # same as place, without changing the bounds used for collision tests
+            live = self.live
+            boxes = self.base[live] + self.velocity[live] * np.maximum(ticks - self.start_move[live, :1], 0)
+        return (boxes[:, 0::2] + boxes[:, 1::2]) / 2
+
+    def cube_faces(self, ticks=None):
+        """Faces of all cubes of all obstacles, for drawing.
+        :param ticks: the tick to draw them at, may be fractional. Current position if None.
+        :return: array of shape (cubes, 6, 4, 3)."""
+
+        sizes = self.cube_sizes()[:, None, None, None]
+        return Cube[..., :3] / Cube_size * sizes + self.cube_centers(ticks)[:, None, None, :]
+
+    def cube_sizes(self):
+        """Sizes of all cubes of all obstacles, for drawing, in the order of cube_centers.
+        :return: half the size of each cube, Cube_size for cubes of a grid of 2."""
+
+        live = self.live
+        return (self.base[live, 1] - self.base[live, 0]) / 2
+
+    def delete_obstacle(self, obstacle):
+        """Remove an obstacle from collision tests and keep it to reuse.
+        :param obstacle: the obstacle, already removed from obstacles.
+        :return: nothing."""
+
+        obstacle.block.live.fill(False)
+        self.deleted_obstacles.append(obstacle)
+
+    def collide(self, slots=None):
+        """Test if the current position collides with any cube, all cubes at once. Works in buffers
+        set up by allocate, so nothing is allocated unless slots are given. A swept world tests the way to the
+        current position with sweep instead.
+        :param slots: rows of the cubes to test. All cubes in the game if None.
+        :return: True if any of the points corresponding to current position is inside a cube."""
+
+        if self.swept:
+            return self.sweep(slots)
+        if not self.within():
+            return False
+        near, test = self.near, self.test
+        # points to be tested are all pairs of these x and y values
+        # a point is in the square if its x and its y both are
+        self.between(self.x1, self.x2, -self.x + Probe_low, near, self.hit)
+        self.between(self.x1, self.x2, -self.x + Probe_high, near, self.inside)
+        np.logical_or(self.hit, self.inside, out=self.hit)
+        self.between(self.y1, self.y2, -self.y + Probe_low, self.hit, self.inside)
+        self.between(self.y1, self.y2, -self.y + Probe_high, self.hit, test)
+        np.logical_or(self.inside, test, out=self.hit)
+        if slots is not None:
+            return bool(self.hit[slots].any())
+        self.first_hit(1, self.index)
+        return self.hit.item(self.index.item(0))
+
+    def within(self):
+        """Find the cubes the current Z is within, the ones the collision test is relevant for, into the buffer near.
+        Nothing is allocated.
+        :return: True if there are any."""
+
+        near, bound, test = self.near, self.bound, self.test
+        # check if the current Z is relevant
+        self.scalar[()] = self.gap_z - self.z
+        np.add(self.z1, self.third, out=bound)
+        np.less_equal(bound, self.scalar, out=near)
+        np.subtract(self.z2, self.third, out=bound)
+        np.greater_equal(bound, self.scalar, out=test)
+        np.logical_and(near, test, out=near)
+        np.logical_and(near, self.live, out=near)
+        self.first_near(1, self.index)
+        return near.item(self.index.item(0))
+
+    def between(self, low, high, value, mask, out):
+        """Test which cubes have a value between their bounds on an axis, in place.
+        :param low: lower bounds, a column of boxes.
+        :param high: upper bounds, a column of boxes.
+        :param value: the value.
+        :param mask: only cubes that are True here can be True in out.
+        :param out: buffer for the result.
+        :return: nothing."""
+
+        self.scalar[()] = value
+        np.less_equal(low, self.scalar, out=out)
+        np.logical_and(out, mask, out=out)
+        np.greater_equal(high, self.scalar, out=self.check)
+        np.logical_and(out, self.check, out=out)
+
+    def sweep(self, slots=None):
+        """Test if the player hit any cube on its way from the previous tick to this one, all cubes at once. Both the
+        player and the cubes move in a straight line in a tick, so in the frame of a cube each probe of the player
+        moves in a straight line too. The probe is in the cube from the time it has crossed the first bound on every
+        axis to the time it crosses the first bound out again. Unlike the test at the end of the tick, a fast player
+        or cube cannot pass a cube between two ticks. The fraction of the tick of the first hit is kept in impact.
+        Works in buffers set up by allocate, so nothing is allocated unless slots are given.
+        :param slots: rows of the cubes to test. All cubes in the game if None.
+        :return: True if any of the probes hit a cube in the tick."""
+
+        near, test = self.near, self.test
+        x, y, z = self.previous
+        # z. The player is within a cube a third of the size of a cube from its bounds, the same as within. Cubes
+        # only move towards the player, so in the frame of a cube the player only moves towards its far end: it is
+        # within the cube on the way if it is short of the far end at the start and past the near end at the end
+        depth = -z
+        bound = self.bound
+        self.scalar[()] = depth
+        np.add(self.before_z1, self.third, out=bound)
+        np.less_equal(bound, self.scalar, out=near)
+        self.scalar[()] = self.gap_z - self.z
+        np.subtract(self.z2, self.third, out=bound)
+        np.greater_equal(bound, self.scalar, out=test)
+        np.logical_and(near, test, out=near)
+        np.logical_and(near, self.live, out=near)
+        self.first_near(1, self.index)
+        if not near.item(self.index.item(0)):
+            return False
+        # x and y. Only cubes whose bounds, swept in the tick, overlap the probes swept in the tick can be hit. Most
+        # ticks end here, the rest of the test is made when the player passes close to a cube
+        self.overlap(self.before_x1, self.before_x2, self.x1, self.x2, -x, -self.x)
+        self.overlap(self.before_y1, self.before_y2, self.y1, self.y2, -y, -self.y)
+        self.first_near(1, self.index)
+        if not near.item(self.index.item(0)):
+            return False
+        # the times it is within them
+        self.approach(self.before_z1, self.z1, self.gap_z - self.z - depth)
+        self.cross(self.before_z1, self.before_z2, depth - Cube_size / 3.0, depth + Cube_size / 3.0, self.enter_z,
+                   self.leave_z)
+        np.maximum(self.enter_z, self.zero, out=self.enter_z)
+        np.minimum(self.leave_z, self.one, out=self.leave_z)
+        # x and y of the two probes, written out as a loop would allocate. x is limited to the times in z
+        self.approach(self.before_x1, self.x1, x - self.x)
+        self.cross(self.before_x1, self.before_x2, -x + Probe_low, -x + Probe_low, self.enter_x[0], self.leave_x[0])
+        self.cross(self.before_x1, self.before_x2, -x + Probe_high, -x + Probe_high, self.enter_x[1],
+                   self.leave_x[1])
+        np.maximum(self.enter_x[0], self.enter_z, out=self.enter_x[0])
+        np.maximum(self.enter_x[1], self.enter_z, out=self.enter_x[1])
+        np.minimum(self.leave_x[0], self.leave_z, out=self.leave_x[0])
+        np.minimum(self.leave_x[1], self.leave_z, out=self.leave_x[1])
+        self.approach(self.before_y1, self.y1, y - self.y)
+        self.cross(self.before_y1, self.before_y2, -y + Probe_low, -y + Probe_low, self.enter_y[0], self.leave_y[0])
+        self.cross(self.before_y1, self.before_y2, -y + Probe_high, -y + Probe_high, self.enter_y[1],
+                   self.leave_y[1])
+        # a probe hits a cube if it is in it on all axes at once at some time of the tick, any of the four probes
+        self.meet(0, 0, near, self.hit)
+        self.meet(0, 1, near, test)
+        np.logical_or(self.hit, test, out=self.hit)
+        self.meet(1, 0, near, test)
+        np.logical_or(self.hit, test, out=self.hit)
+        self.meet(1, 1, near, test)
+        np.logical_or(self.hit, test, out=self.hit)
+        if slots is not None:
+            return bool(self.hit[slots].any())
+        self.first_hit(1, self.index)
+        if not self.hit.item(self.index.item(0)):
+            return False
+        # the first time any probe hit any cube
+        self.impacts.fill(np.inf)
+        self.earliest_hit(0, 0)
+        self.earliest_hit(0, 1)
+        self.earliest_hit(1, 0)
+        self.earliest_hit(1, 1)
+        self.first_impact(1, self.index)
+        self.impact = self.impacts.item(self.index.item(0))
+        return True
+
+    def overlap(self, low, high, now_low, now_high, start, end):
+        """Keep in near only the cubes whose bounds on an axis, from the start to the end of the tick, overlap the
+        probes on the axis from the start to the end of the tick, in place.
+        :param low: lower bounds at the start of the tick, a column.
+        :param high: upper bounds at the start of the tick, a column.
+        :param now_low: lower bounds at the end of the tick, a column of boxes.
+        :param now_high: upper bounds at the end of the tick, a column of boxes.
+        :param start: the player on the axis at the start of the tick, negated like the probes.
+        :param end: the player on the axis at the end of the tick, negated.
+        :return: nothing."""
+
+        near, bound, test = self.near, self.bound, self.test
+        # the probes are either side of the player. Not max() and min(), which allocate a tuple of their arguments
+        self.scalar[()] = (start if start > end else end) + Probe_reach
+        np.minimum(low, now_low, out=bound)
+        np.less_equal(bound, self.scalar, out=test)
+        np.logical_and(near, test, out=near)
+        self.scalar[()] = (end if start > end else start) - Probe_reach
+        np.maximum(high, now_high, out=bound)
+        np.greater_equal(bound, self.scalar, out=test)
+        np.logical_and(near, test, out=near)
+
+    def approach(self, low, now, moved):
+        """Velocity of a probe relative to each cube on an axis, into relative, in place. The bounds of a cube move
+        together, a probe that does not move relative to a cube is taken to move by Tiny.
+        :param low: lower bounds at the start of the tick, a column.
+        :param now: lower bounds at the end of the tick, a column of boxes.
+        :param moved: how far the probe moved in the tick.
+        :return: nothing."""
+
+        relative = self.relative
+        np.subtract(now, low, out=relative)
+        self.scalar[()] = moved
+        np.subtract(self.scalar, relative, out=relative)
+        np.equal(relative, self.zero, out=self.check)
+        np.putmask(relative, self.check, self.tiny)
+
+    def cross(self, low, high, value_low, value_high, enter, leave):
+        """Times in a tick at which a probe enters and leaves the bounds of the cubes on an axis, as fractions of
+        the tick, in place. The probe moves at the velocity in relative.
+        :param low: lower bounds at the start of the tick, a column.
+        :param high: upper bounds at the start of the tick, a column.
+        :param value_low: the probe at the start of the tick, taken for the lower bounds.
+        :param value_high: the probe at the start of the tick, taken for the upper bounds.
+        :param enter: buffer for the times the probe enters.
+        :param leave: buffer for the times the probe leaves.
+        :return: nothing."""
+
+        cross = self.cross_times
+        # times the probe is at each bound, it enters at the earlier one
+        self.scalar[()] = value_low
+        np.subtract(low, self.scalar, out=cross)
+        np.divide(cross, self.relative, out=cross)
+        self.scalar[()] = value_high
+        np.subtract(high, self.scalar, out=enter)
+        np.divide(enter, self.relative, out=enter)
+        np.maximum(cross, enter, out=leave)
+        np.minimum(cross, enter, out=enter)
+
+    def meet(self, i, j, mask, out):
+        """Test which cubes a probe hits in the tick, the ones it is in on every axis at once at some time, in place.
+        The time it is first in each cube is left in entry.
+        :param i: the probe in x, 0 or 1.
+        :param j: the probe in y, 0 or 1.
+        :param mask: only cubes that are True here can be True in out.
+        :param out: buffer for the result.
+        :return: nothing."""
+
+        np.maximum(self.enter_x[i], self.enter_y[j], out=self.entry)
+        np.minimum(self.leave_x[i], self.leave_y[j], out=self.exit)
+        np.less_equal(self.entry, self.exit, out=out)
+        np.logical_and(out, mask, out=out)
+
+    def earliest_hit(self, i, j):
+        """Keep the time a probe first hits a cube in impacts, for each cube, in place.
+        :param i: the probe in x, 0 or 1.
+        :param j: the probe in y, 0 or 1.
+        :return: nothing."""
+
+        self.meet(i, j, self.near, self.test)
+        np.logical_not(self.test, out=self.check)
+        np.putmask(self.entry, self.check, self.infinity)
+        np.minimum(self.impacts, self.entry, out=self.impacts)
+
+    @property
+    def score(self):
+        """Score of the current game.
+        :return: distance travelled as an integer."""
+
+        return int(self.distance)
+
+    def save_position(self):
+        """Keep the position before a tick, to draw positions in between ticks.
+        :return: nothing."""
+
+        self.previous = (self.x, self.y, self.z - self.gap_z)
+
+    def position(self, alpha=1.0, ahead=None):
+        """Position of the player for drawing, between the previous tick and the current one.
+        :param alpha: fraction of the way from the previous tick to the current one.
+        :param ahead: input of the next tick read just now, to draw x and y that fraction of the way from the current
+            tick to the next one instead, in bounds. None to draw them between the previous tick and the current one.
+        :return: x, y and z - gap_z, the translation of the view."""
+
+        x, y, z = self.previous
+        if ahead is not None:
+            # as far as the input moves the player in the fraction of a tick, the next tick moves it all the way
+            return (min(max(self.x + ahead[0] * alpha, self.x_low), self.x_high),
+                    min(max(self.y + ahead[1] * alpha, self.y_low), self.y_high),
+                    z + (self.z - self.gap_z - z) * alpha)
+        return (x + (self.x - x) * alpha,
+                y + (self.y - y) * alpha,
+                z + (self.z - self.gap_z - z) * alpha)
+
+    def steer(self, dx, dy):
+        """Move the player, keeping the position in bounds.
+        :param dx: distance to move in x direction.
+        :param dy: distance to move in y direction.
+        :return: dx, dy actually moved."""
+
+        # keep x and y in bounds
+        # moving left
+        if dx < 0 and self.x + dx < self.x_low:
+            dx = self.x_low - self.x
+        # moving right
+        if dx > 0 and self.x + dx > self.x_high:
+            dx = self.x_high - self.x
+        # moving down
+        if dy < 0 and self.y + dy < self.y_low:
+            dy = self.y_low - self.y
+        # moving up
+        if dy > 0 and self.y + dy > self.y_high:
+            dy = self.y_high - self.y
+
+        # update current position
+        self.x += dx
+        self.y += dy
+        return dx, dy
+
+    def tick(self, dx, dy):
+        """Play one tick of the game.
+        :param dx: input in x direction.
+        :param dy: input in y direction.
+        :return: True if an obstacle is hit, False otherwise."""
+
+        self.save_position()
+        # increase speed with time
+        self.speed += Acceleration
+        # get new color
+        self.palette.step()
+        profiler.mark("palette")
+        # move. always move in Z direction
+        self.steer(dx, dy)
+        self.z += self.speed
+        self.distance += self.speed
+        # update boundaries and obstacles
+        self.update_boundaries()
+        profiler.mark("boundaries")
+        collided = self.update_obstacles()
+        self.ticks += 1
+        # move the obstacles that are moving
+        self.place()
+        profiler.mark("obstacles")
+        if collided:
+            # collided with an obstacle :'(
+            self.collision_tick = self.ticks
+        return collided
+
+    def idle(self):
+        """Move through the tunnel without playing, used in the menu.
+        :return: nothing."""
+
+        self.save_position()
+        self.palette.step()
+        # move, set gap_z so that scoring does not change
+        self.gap_z -= self.speed
+        self.update_boundaries()
+
+    def coast(self, dx, dy):
+        """Move through the tunnel after the game is over. Obstacles are ignored.
+        :param dx: input in x direction.
+        :param dy: input in y direction.
+        :return: nothing."""
+
+        self.save_position()
+        self.palette.step()
+        self.steer(dx, dy)
+        self.z += self.speed
+        self.distance += self.speed
+        self.update_boundaries()
+
+    def grow(self):
+        """Add a boundary and move forward, used to set up the tunnel on restart.
+        :return: True if a boundary was added, False if the tunnel is already complete."""
+
+        if self.tunnel.count >= self.tunnel.rings:
+            return False
+        self.save_position()
+        self.add_boundary()
+        # move, set gap_z so that scoring starts only when the tunnel is complete
+        self.gap_z -= self.speed
+        self.update_boundaries()
+        return True
+
+    def update_boundaries(self):
+        """Update the boundaries, delete passed boundaries and initialize them to new ones. Moves the origin if the
+        player is far enough from it.
+        :return: nothing."""
+
+        # check which boundaries the player has crossed, they are the nearest ones
+        while self.tunnel.nearest() > self.gap_z - self.z:
+            # move them to the far end
+            self.ring_z -= Ring_gap
+            self.tunnel.recycle(self.ring_z)
+        if self.floating and self.gap_z - self.z < -Origin_shift:
+            self.rebase()
+
+    def rebase(self):
+        """Move the origin forward by Origin_shift, and everything with it, so that positions stay small and as
+        precise however far the game goes. The shift is a power of two and positions are within a few times of it,
+        so every position moves exactly and no distance in the game changes. Nothing is allocated.
+        :return: nothing."""
+
+        # the player moves by z while playing, and by gap_z in the menu. The larger of them is made smaller
+        if self.z > -self.gap_z:
+            self.z -= Origin_shift
+        else:
+            self.gap_z += Origin_shift
+        x, y, z = self.previous
+        self.previous = (x, y, z - Origin_shift)
+        self.ring_z += Origin_shift
+        self.tunnel.move(self.shift)
+        # by index, an iterator of the deque would be allocated
+        i = len(self.obstacles)
+        while i:
+            i -= 1
+            self.obstacles[i].z += Origin_shift
+        # bounds of cubes not in the game are set again when they are used. By index, like the obstacles
+        i = len(self.depths)
+        while i:
+            i -= 1
+            np.add(self.depths[i], self.shift, out=self.depths[i])
+
+    def update_obstacles(self):
+        """Add the obstacle of this tick if there is one, delete the ones that are behind and check if any obstacle
+        is hit. Obstacles are made ahead by the lookahead, started in the first tick of a game.
+        :return: True if any obstacle is hit, False otherwise."""
+
+        if not self.playing:
+            # the first tick of a game
+            if self.lookahead is None:
+                self.lookahead = Lookahead(self)
+            self.lookahead.begin(self)
+            self.playing = True
+        spawn = self.lookahead.take(self.ticks)
+        if spawn is not None:
+            self.add_obstacle(spawn)
+        profiler.mark("obstacles")
+        # check if current position collides with any obstacle
+        k = self.collide()
+        profiler.mark("collision")
+        self.remove_passed()
+        return k
+
+    def countdown(self):
+        """Count down to the next obstacle. When it is due, the time to the one after it is set.
+        :return: True if an obstacle is due in this tick."""
+
+        if self.next_obstacle < self.speed / 2:
+            # set timer for next obstacle
+            self.next_obstacle = randint(self.bits, Gap_low, Gap_high) / float(self.density)
+            return True
+        # reduce waiting time
+        self.next_obstacle -= self.speed
+        return False
+
+    def add_obstacle(self, spawn):
+        """Add an obstacle at the far end of the tunnel, reusing a deleted one.
+        :param spawn: the pattern and motion of the obstacle.
+        :return: nothing."""
+
+        if not self.deleted_obstacles:
+            # no obstacle available to reuse, create new
+            self.deleted_obstacles.append(Obstacle(self))
+        # reset and use a deleted obstacle
+        self.deleted_obstacles[-1].reset(self, spawn)
+        self.obstacles.append(self.deleted_obstacles.pop())
+
+    def remove_passed(self):
+        """Delete the obstacles that have been passed.
+        :return: nothing."""
+
+        while self.obstacles:
+            # update the nearest obstacle, only the nearest ones can have been passed
+            obstacle = self.obstacles[0]
+            obstacle.update(self)
+            if not obstacle.has_passed:
+                break
+            # it's out of the field of view, delete
+            self.delete_obstacle(self.obstacles.popleft())
+
+
+class Lookahead:
+    """Makes the obstacles of a game ahead of time in a thread, and hands them to the game a segment of ticks at a
+    time through a bounded queue. The thread plays a copy of the game from its first tick without a player.
+    Obstacles do not depend on the player, so they are the same as the game would make them itself.
+    In a solvable world each new obstacle is checked before it is handed over. The check follows the positions the
+    player can be at on a grid, moving at most Step in a tick and never within a cube. If none of them is left
+    before the obstacle is passed, the obstacle is drawn again. The thread and its copy are kept for the next games
+    of the world, and segments start short so that the first tick of a game hardly waits."""
+
+    def __init__(self, world, segments=Segments):
+        self.solvable = world.solvable
+        self.swept = world.swept
+        self.segments = segments
+        # number of the game obstacles are made for, and the state of the world at its first tick, None for no game
+        self.game, self.state = 0, None
+        # segments made for the game and not taken yet, as (first tick after the segment, spawns in the segment)
+        self.queue = deque()
+        # the segment being taken, and the next spawn in it
+        self.end, self.spawns, self.next = 0, [], 0
+        # obstacles drawn again, and obstacles handed over that could not be checked to be passable
+        self.rerolls = self.unsolved = 0
+        self.error = None
+        # copy of the game, made in the thread
+        self.scratch = None
+        # guards the game and the queue. The thread waits on it for a new game or space in the queue, the game for
+        # a segment. Each is only woken when it is waiting, as waking allocates
+        self.condition = threading.Condition()
+        self.idle = self.waiting = self.closed = False
+        # the thread ends when the world is gone, without keeping it
+        self.owner = weakref.ref(world)
+        weakref.finalize(world, self.close)
+        self.thread = threading.Thread(target=self.run, name="lookahead")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def begin(self, world):
+        """Start making the obstacles of a game, in its first tick.
+        :param world: the world, after the first move of the game.
+        :return: nothing."""
+
+        tunnel = world.tunnel
+        state = dict(seed=world.seed, random=world.random.getstate(), queue=deque(), depths=tunnel.z.copy(),
+                     head=tunnel.head, count=tunnel.count, values=dict((name, getattr(world, name)) for name in (
+                         "speed", "next_obstacle", "ring_x", "ring_y", "ring_z", "x", "y", "z", "gap_z", "ticks")))
+        with self.condition:
+            # the thread adds the segments of this game to its queue, older segments go to queues no one reads
+            self.queue = state["queue"]
+            self.end, self.spawns, self.next = world.ticks, [], 0
+            self.state = state
+            self.game += 1
+            self.condition.notify_all()
+
+    def stop(self):
+        """Stop making obstacles, the game they were for is over.
+        :return: nothing."""
+
+        with self.condition:
+            self.state = None
+            self.game += 1
+
+    def close(self):
+        """End the thread, the world is gone.
+        :return: nothing."""
+
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def resize(self, segments):
+        """Change the number of segments kept ready, waking the thread if there is space for more.
+        :param segments: number of segments.
+        :return: nothing."""
+
+        with self.condition:
+            self.segments = segments
+            self.condition.notify_all()
+
+    def run(self):
+        """Make segments of the game until its queue is full, then wait for space or a new game.
+        Ends when the world is gone.
+        :return: nothing."""
+
+        try:
+            game = 0
+            state = None
+            while True:
+                with self.condition:
+                    while not self.closed and self.game == game and (
+                            state is None or len(state["queue"]) >= self.segments):
+                        self.idle = True
+                        self.condition.wait()
+                    self.idle = False
+                    if self.closed:
+                        return
+                    new = self.game != game
+                    game, state = self.game, self.state
+                if new:
+                    # a new game, or the game is over
+                    if state is not None:
+                        self.setup(state)
+                    continue
+                segment = self.segment()
+                with self.condition:
+                    state["queue"].append(segment)
+                    if self.waiting:
+                        self.condition.notify_all()
+        except Exception as e:
+            # raised in the game when it waits for the next segment
+            with self.condition:
+                self.error = e
+                self.condition.notify_all()
+
+    def setup(self, state):
+        """Set the copy of the game to the state of a game at its first tick. The copy and the grid of positions are
+        made for the first game.
+        :param state: the state copied by begin.
+        :return: nothing."""
+
+        if self.scratch is None:
+            world = self.owner()
+            self.scratch = World(state["seed"], world.tunnel.rings, world.density, world.patterns, False,
+                                 world.floating, world.swept)
+            # positions of the player on each axis, and the x or y of its two probes at each
+            self.grid_x = np.linspace(world.x_low, world.x_high, Cells)
+            self.grid_y = np.linspace(world.y_low, world.y_high, Cells)
+            self.probes_x = -self.grid_x[:, None, None] + np.array((Probe_low, Probe_high))[None, :, None]
+            self.probes_y = -self.grid_y[:, None, None] + np.array((Probe_low, Probe_high))[None, :, None]
+            # positions reachable from each position in n ticks, as matrices to dilate with. All of them in the last
+            distance_x = abs(self.grid_x[:, None] - self.grid_x[None, :])
+            distance_y = abs(self.grid_y[:, None] - self.grid_y[None, :])
+            self.bands = []
+            while not self.bands or not (self.bands[-1][0].all() and self.bands[-1][1].all()):
+                n = len(self.bands)
+                self.bands.append(((distance_x <= n * Step + 1e-9).astype(float),
+                                   (distance_y <= n * Step + 1e-9).astype(float)))
+        scratch = self.scratch
+        # no rings, the tunnel is copied
+        scratch.reset(state["seed"], 0)
+        scratch.random.setstate(state["random"])
+        for name, value in state["values"].items():
+            setattr(scratch, name, value)
+        scratch.tunnel.z[:] = state["depths"]
+        scratch.tunnel.head, scratch.tunnel.count = state["head"], state["count"]
+        # positions the player can be at in the last collision test followed, where it starts
+        self.reachable, self.last = self.nearest(), scratch.ticks - 1
+        # free positions in the ticks ahead in which the player is within some cube in z, and the positions the
+        # player can be at in them, by tick
+        self.layers, self.reached = {}, {}
+        # ticks of the next segment, the first ones are short
+        self.length = 1
+
+    def nearest(self):
+        """The position of the grid nearest to the player.
+        :return: boolean array of shape (Cells, Cells), True only there."""
+
+        near = np.zeros((Cells, Cells), bool)
+        near[np.argmin(abs(self.grid_x - self.scratch.x)), np.argmin(abs(self.grid_y - self.scratch.y))] = True
+        return near
+
+    def segment(self):
+        """Play the copy of the game for a segment of ticks, the way World.tick plays them.
+        :return: first tick after the segment, and the spawns in it."""
+
+        scratch = self.scratch
+        spawns = []
+        end = scratch.ticks + self.length
+        self.length = min(2 * self.length, Segment)
+        while scratch.ticks < end:
+            if scratch.countdown():
+                spawns.append(self.spawn())
+            self.test()
+            scratch.remove_passed()
+            scratch.ticks += 1
+            # move to the next tick
+            scratch.speed += Acceleration
+            scratch.z += scratch.speed
+            scratch.update_boundaries()
+        return end, spawns
+
+    def spawn(self):
+        """Draw the obstacle of this tick and add it to the copy of the game. In a solvable world it is drawn again
+        until it can be passed, up to Attempts times.
+        :return: the spawn."""
+
+        scratch = self.scratch
+        for attempt in range(Attempts):
+            spawn = Spawn(scratch.ticks, scratch.patterns, scratch.random)
+            scratch.add_obstacle(spawn)
+            if not self.solvable:
+                break
+            layers = self.predict(scratch.obstacles[-1].block)
+            reached = self.passable(layers)
+            if reached is not None:
+                self.reached.update(reached)
+                break
+            if attempt == Attempts - 1:
+                # keep it, the player may still get through between the positions checked. Positions reached from
+                # its first tick on are not known
+                self.unsolved += 1
+                start = min(layers)
+                for tick in [tick for tick in self.reached if tick >= start]:
+                    del self.reached[tick]
+                break
+            scratch.delete_obstacle(scratch.obstacles.pop())
+            self.rerolls += 1
+        if self.solvable:
+            self.layers.update(layers)
+        motion = spawn.pattern.motion
+        if spawn.moving:
+            # add gap after current object
+            scratch.next_obstacle += motion.gap / scratch.density
+        return spawn
+
+    def test(self):
+        """Follow the positions the player can be at through the collision test of this tick, if the player is
+        within some cube in z in it.
+        :return: nothing."""
+
+        tick = self.scratch.ticks
+        free = self.layers.pop(tick, None)
+        if free is not None:
+            self.reachable = self.dilate(self.reachable, tick - self.last) & free
+            self.last = tick
+            self.reached.pop(tick, None)
+            if not self.reachable.any():
+                # an obstacle that could not be solved, go on as if the player could be anywhere
+                self.reachable = np.ones((Cells, Cells), bool)
+                self.reached.clear()
+
+    def predict(self, block):
+        """Free positions of the player in the ticks in which it is within some cube in z, from this tick until a
+        new obstacle is passed, with the obstacle added to the ones before it. The cubes of the obstacle are moved to
+        each tick the way World.place moves them.
+        :param block: block of the new obstacle.
+        :return: dictionary of tick to boolean array of free positions of shape (Cells, Cells), for the ticks the
+            obstacle is in."""
+
+        scratch = self.scratch
+        live = block.live
+        speed, depth = scratch.speed, scratch.gap_z - scratch.z
+        # ticks until the player is past the far end of the obstacle, it only moves towards the player. From the
+        # tick before this one, where the way into this one starts
+        far = block.z1[live].min()
+        ahead = np.arange(-1, max(int((depth - far + Cube_size) / speed) + 2, 1))
+        depths = depth - speed * ahead - Acceleration * ahead * (ahead + 1) / 2.0
+        # bounds of the cubes in each of these ticks
+        base, velocity = block.base[live], block.velocity[live]
+        moved = np.maximum(scratch.ticks + ahead[None, :] - block.start_move[live, :1], 0)
+        third = Cube_size / 3.0
+        z1 = base[:, 4:5] + velocity[:, 4:5] * moved
+        z2 = base[:, 5:6] + velocity[:, 5:6] * moved
+        if self.swept:
+            # within a cube on the way from the tick before, cubes move towards the player so the way in the frame
+            # of a cube only goes towards its far end. x and y are checked at the end of the way, on the grid
+            relevant = (z1[:, :-1] + third <= depths[:-1]) & (depths[1:] <= z2[:, 1:] - third)
+        else:
+            relevant = (z1[:, 1:] + third <= depths[1:]) & (depths[1:] <= z2[:, 1:] - third)
+        moved = moved[:, 1:]
+        layers = {}
+        for k in np.flatnonzero(relevant.any(0)).tolist():
+            cubes = relevant[:, k]
+            free = self.free(base[cubes] + velocity[cubes] * moved[cubes, k:k + 1])
+            tick = scratch.ticks + k
+            if tick in self.layers:
+                # other obstacles in the same tick
+                free &= self.layers[tick]
+            layers[tick] = free
+        return layers
+
+    def passable(self, layers):
+        """Check that the player can get through the obstacles ahead from the positions it can be at now.
+        :param layers: free positions in the ticks of a new obstacle, from predict, in place of the ones before.
+        :return: dictionary of tick to the positions reached in it, from the first tick of the obstacle on, or None
+            if no position is left in some tick."""
+
+        # ticks before the obstacle do not change, go on from the last one of them followed before
+        start = min(layers) if layers else self.last + 1
+        before = [tick for tick in self.reached if tick < start]
+        last = max(before) if before else self.last
+        positions = self.reached[last] if before else self.reachable
+        reached = {}
+        for tick in sorted(tick for tick in set(self.layers).union(layers) if tick > last):
+            free = layers[tick] if tick in layers else self.layers[tick]
+            positions = self.dilate(positions, tick - last) & free
+            if not positions.any():
+                return None
+            reached[tick] = positions
+            last = tick
+        return reached
+
+    def free(self, bounds):
+        """Positions of the player that are not in any of some cubes.
+        :param bounds: bounds of the cubes, one row for each: x1, x2, y1, y2, and z1, z2 which are not used.
+        :return: boolean array of free positions of shape (Cells, Cells)."""
+
+        # a position is hit in x if any of its two probes is within the cube, the same in y
+        x = ((bounds[:, 0] <= self.probes_x) & (self.probes_x <= bounds[:, 1])).any(1)
+        y = ((bounds[:, 2] <= self.probes_y) & (self.probes_y <= bounds[:, 3])).any(1)
+        return ~(x[:, None, :] & y[None, :, :]).any(2)
+
+    def dilate(self, positions, ticks):
+        """Positions reachable from a set of positions.
+        :param positions: boolean array of shape (Cells, Cells).
+        :param ticks: ticks to move.
+        :return: boolean array of the positions reachable."""
+
+        band_x, band_y = self.bands[min(ticks, len(self.bands) - 1)]
+        return np.dot(np.dot(band_x, positions), band_y) > 0
+
+    def take(self, tick):
+        """The obstacle to add in a tick, if there is one. Waits for the thread if it has not made the tick yet,
+        which only happens at the start of a game, and wakes it when there is space for another segment.
+        :param tick: the tick. Ticks are taken in order.
+        :return: the spawn, or None."""
+
+        while tick >= self.end:
+            # acquired and released by hand, a with statement allocates
+            self.condition.acquire()
+            try:
+                while not self.queue:
+                    if self.error is not None:
+                        raise self.error
+                    self.waiting = True
+                    self.condition.wait()
+                self.waiting = False
+                self.end, self.spawns = self.queue.popleft()
+                if self.idle and len(self.queue) < self.segments:
+                    # space for another segment
+                    self.condition.notify_all()
+            finally:
+                self.condition.release()
+            self.next = 0
+        if self.next < len(self.spawns) and self.spawns[self.next].tick == tick:
+            self.next += 1
+            return self.spawns[self.next - 1]
+        return None
+
+
+def collide_cube(cube, world):
+    """Test if the current position collides with an obstacle, one cube at a time.
+    The game uses World.collide, this is kept to check and compare it with.
+    :parameter cube: the boundary of an obstacle.
+    :parameter world: the world with the current position.
+    :return: boolean value which is true if any of the points corresponding to current position is inside cube."""
+
+    # points to be tested
+    points = [(-world.x + x, -world.y + y)
+              for x in [Cube_size * 2 - Bound, Bound - Cube_size * 2]
+              for y in [Cube_size * 2 - Bound, Bound - Cube_size * 2]]
+
+    # get min and max values of x, y, z
+    x, y, z = set(), set(), set()
+    for face in cube:
+        for vertex in face:
+            x.add(vertex[0])
+            y.add(vertex[1])
+            z.add(vertex[2])
+    x1, x2 = sorted(x)
+    y1, y2 = sorted(y)
+    z1, z2 = sorted(z)
+
+    # check if the current Z is relevant
+    if z1 + Cube_size / 3.0 <= world.gap_z - world.z <= z2 - Cube_size / 3.0:
+        # test if points are in the square
+        for x, y in points:
+            if x1 <= x <= x2 and y1 <= y <= y2:
+                return True
+    return False